@@ -0,0 +1 @@
+"""Kokoro ONNX text-to-speech served over the Wyoming protocol."""
@@ -0,0 +1,130 @@
+"""Caches of rendered audio and of phonemes."""
+
+import asyncio
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+
+class AudioCache:
+    """
+    Process-wide LRU cache of synthesized sentence audio.
+
+    Entries are int16 PCM arrays keyed by the normalized sentence and the
+    voice settings it was rendered with. The total size is bounded by a
+    byte budget; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+
+    @staticmethod
+    def make_key(sentence: str, voice_name: str, speed: float, lang: str) -> tuple:
+        return ' '.join(sentence.split()), voice_name, speed, lang
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        audio = self._entries.get(key)
+        if audio is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return audio
+
+    def put(self, key: tuple, audio: np.ndarray) -> None:
+        if audio.nbytes > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.nbytes
+
+        self._entries[key] = audio
+        self.size += audio.nbytes
+
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"{len(self)} entries, {self.size}/{self.max_bytes} bytes, "
+                f"{self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate)")
+
+
+class PhonemeCache:
+    """
+    Memoizing front end for the Kokoro tokenizer's phonemizer.
+
+    Text is split into phrases at punctuation followed by whitespace, the
+    same boundaries at which espeak phonemizes independently, and each
+    phrase is looked up in an LRU memo of at most ``max_entries`` phrases.
+    Only phrases that were not seen before are phonemized, so repeated
+    vocabulary such as device and room names costs almost nothing.
+
+    Phonemization runs on a dedicated thread, which also keeps the memo
+    and espeak single-threaded.
+    """
+
+    # Sentence periods only after words of four letters or more, to keep abbreviations intact
+    _PHRASE_BOUNDARY = re.compile(r'(?<=[,;:!?])\s+|(?<=\w{4}\.)\s+')
+
+    def __init__(self, tokenizer, max_entries: int = 4096):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phonemize")
+
+    def phonemize(self, text: str, lang: str) -> str:
+        """Phonemize text, reusing the phonemes of known phrases."""
+        if self.max_entries <= 0:
+            return self.tokenizer.phonemize(text, lang)
+
+        parts = []
+        for phrase in self._PHRASE_BOUNDARY.split(' '.join(text.split())):
+            key = (phrase, lang)
+            phonemes = self._entries.get(key)
+            if phonemes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                phonemes = self.tokenizer.phonemize(phrase, lang)
+                self._entries[key] = phonemes
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            if phonemes:
+                parts.append(phonemes)
+
+        return ' '.join(parts)
+
+    async def run(self, text: str, lang: str) -> str:
+        """Phonemize text on the phonemization thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.phonemize, text, lang)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"{len(self)}/{self.max_entries} phrases, {self.hits} hits, "
+                f"{self.misses} misses ({hit_rate:.1%} hit rate)")
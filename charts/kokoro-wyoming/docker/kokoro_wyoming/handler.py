@@ -0,0 +1,578 @@
+"""Wyoming event handler of one client connection."""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Optional
+
+import kokoro_onnx.config
+import numpy as np
+from kokoro_onnx.log import log
+from kokoro_onnx.trim import trim as trim_audio
+from wyoming.audio import AudioChunk, AudioStart, AudioStop
+from wyoming.error import Error
+from wyoming.event import Event
+from wyoming.info import Describe, Info
+from wyoming.server import AsyncEventHandler
+from wyoming.tts import Synthesize, SynthesizeChunk, SynthesizeStart, SynthesizeStop, SynthesizeStopped
+
+from wyoming_tts.audio import AudioFramer, Resampler, float_to_int16, time_stretch
+from wyoming_tts.streaming import SendQueue
+from wyoming_tts.text import SentenceBuffer, TextSegmenter, split_into_sentences
+from wyoming_tts.tracing import RequestTrace
+
+from .caches import AudioCache, PhonemeCache
+from .inference import SessionPool
+from .metrics import METRICS
+from .pipeline import SentencePipeline
+from .voices import VoiceTable
+from .workers import WorkerPool
+
+_LOGGER = log.getChild(__name__)
+
+
+class KokoroEventHandler(AsyncEventHandler):
+    def __init__(self, wyoming_info: Info, kokoro_instance,
+                 cli_args,
+                 audio_cache: Optional[AudioCache],
+                 phoneme_cache: PhonemeCache,
+                 voice_table: VoiceTable,
+                 session_pool: Optional[SessionPool],
+                 worker_pool: Optional[WorkerPool],
+                 *args,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.kokoro = kokoro_instance
+        self.audio_cache = audio_cache
+        self.phoneme_cache = phoneme_cache
+        self.voice_table = voice_table
+        self.session_pool = session_pool
+        self.worker_pool = worker_pool
+        self.cli_args = cli_args
+        self.args = args
+        self.wyoming_info_event = wyoming_info.event()
+
+        # Events are written by a separate task, so synthesis never waits for a slow client
+        self.send_queue = SendQueue(self.write_event,
+                                    cli_args.send_high_watermark * 1024,
+                                    cli_args.send_low_watermark * 1024,
+                                    METRICS)
+
+        # Background synthesis of a legacy request or of the end of a stream
+        self.synthesis_task: Optional[asyncio.Task] = None
+        # Trace of the latest request, which socket writes are attributed to
+        self.active_trace: Optional[RequestTrace] = None
+        # Whether audio start was sent without the matching audio stop yet
+        self.audio_open = False
+
+        # Streaming state
+        self.streaming_task: Optional[asyncio.Task] = None
+        self._reset_streaming_state()
+
+    async def write_event(self, event: Event) -> None:
+        start = time.perf_counter()
+        await super().write_event(event)
+        METRICS.events.inc(1, event.type)
+        if self.active_trace is not None and not self.active_trace.finished:
+            self.active_trace.add("write", time.perf_counter() - start)
+
+    def _start_trace(self, request: str, voice_name: Optional[str], speed: Optional[float]) -> RequestTrace:
+        self.active_trace = RequestTrace(request, voice=voice_name, speed=speed)
+        return self.active_trace
+
+    async def send_event(self, event: Event) -> None:
+        """Queue an event for the writer task of this connection."""
+        await self.send_queue.put(event)
+
+    def _parse_voice_settings(self, voice_obj):
+        """
+        Parse voice settings from Wyoming voice object.
+
+        Returns:
+            tuple: (voice_name, speed, lang)
+
+        The voice name may be a model voice, a declared blend or a blend
+        spec such as "af_heart:0.7+bf_emma:0.3"; it is returned in its
+        canonical form.
+
+        Speed can be specified via speaker parameter, e.g.:
+        - speaker="speed_1.5" -> 1.5x speed
+        - speaker="1.2" -> 1.2x speed
+        - speaker=None -> default speed from CLI args
+        """
+        voice_name = "af_heart"  # default voice
+        speed = self.cli_args.speed if hasattr(self.cli_args, 'speed') else 1.0
+
+        if voice_obj:
+            if voice_obj.name:
+                voice_name = voice_obj.name
+
+            # Check if speaker parameter contains speed override
+            if hasattr(voice_obj, 'speaker') and voice_obj.speaker:
+                speaker = voice_obj.speaker
+                # Try to extract speed from speaker parameter
+                # Supports formats: "speed_1.5", "1.5", "speed:1.5"
+                try:
+                    if speaker.startswith("speed_") or speaker.startswith("speed:"):
+                        speed_str = speaker.split("_")[-1].split(":")[-1]
+                        speed = float(speed_str)
+                    else:
+                        # Try direct float parsing
+                        speed = float(speaker)
+                except (ValueError, AttributeError):
+                    # If parsing fails, use default speed
+                    pass
+
+        voice_name = self.voice_table.resolve(voice_name)
+
+        # Determine language from the (heaviest) voice name
+        lang = "en-us" if self.voice_table.primary(voice_name).startswith("a") else "en-gb"
+
+        return voice_name, speed, lang
+
+    def _output_rate(self) -> int:
+        """Sample rate of the audio sent to clients."""
+        return self.cli_args.output_rate or kokoro_onnx.config.SAMPLE_RATE
+
+    def _create_segmenter(self) -> TextSegmenter:
+        return TextSegmenter(
+            first_chars=self.cli_args.first_segment_chars,
+            target_chars=self.cli_args.segment_chars,
+            max_chars=self.cli_args.max_segment_chars,
+        )
+
+    def _cached_check(self, voice_name: Optional[str], speed: Optional[float],
+                      lang: Optional[str]) -> Optional[Callable[[str], bool]]:
+        """Check whether a sentence's audio is cached, for the segmenter to keep such sentences whole."""
+        cache = self.audio_cache
+        if cache is None or voice_name is None or speed is None:
+            return None
+        render_speed = self._render_speed(speed)
+        return lambda sentence: AudioCache.make_key(sentence, voice_name, render_speed, lang) in cache
+
+    def _render_speed(self, speed: float) -> float:
+        """Speed to run the model at; speeds in the time-stretch range are rendered at 1.0."""
+        stretch = self.cli_args.time_stretch
+        if stretch is not None and stretch[0] <= speed <= stretch[1] and 0.5 <= speed <= 2.0:
+            return 1.0
+        return speed
+
+    def _create_pipeline(self, voice_name: str, speed: float, lang: str,
+                         trace: RequestTrace) -> SentencePipeline:
+        """Create a sentence pipeline bound to the given voice settings."""
+        cache = self.audio_cache
+        # Audio rendered at another speed is cached as rendered and stretched on the way out
+        render_speed = self._render_speed(speed)
+        sample_rate = kokoro_onnx.config.SAMPLE_RATE
+
+        def stretch(audio: np.ndarray) -> np.ndarray:
+            if render_speed == speed:
+                return audio
+            with trace.span("stretch"):
+                return time_stretch(audio, speed / render_speed, sample_rate)
+
+        async def prepare(sentence: str) -> Optional[str]:
+            if cache is not None and AudioCache.make_key(sentence, voice_name, render_speed, lang) in cache:
+                return None
+            with trace.span("phonemize"):
+                return await self.phoneme_cache.run(sentence, lang)
+
+        async def synthesize(sentence: str, phonemes: Optional[str]) -> AsyncIterator[np.ndarray]:
+            if cache is not None:
+                key = AudioCache.make_key(sentence, voice_name, render_speed, lang)
+                cached = cache.get(key)
+                if cached is not None:
+                    _LOGGER.debug("Audio cache hit: %s", repr(sentence))
+                    trace.add("cache_hit", 0.0)
+                    yield stretch(cached)
+                    return
+
+            parts = []
+            async for audio in self._synthesize_sentence(sentence, voice_name, render_speed, lang,
+                                                         trace, phonemes):
+                parts.append(audio)
+                yield stretch(audio)
+
+            if cache is not None and parts:
+                cache.put(key, float_to_int16(np.concatenate(parts)))
+                _LOGGER.debug("Audio cache: %s", cache)
+
+        # Worker processes phonemize for themselves
+        return SentencePipeline(synthesize, lookahead=self.cli_args.lookahead,
+                                prepare=prepare if self.worker_pool is None else None)
+
+    async def _synthesize_sentence(self, sentence: str, voice_name: str, speed: float, lang: str,
+                                   trace: RequestTrace, phonemes: Optional[str] = None) -> AsyncIterator[np.ndarray]:
+        """Phonemize a sentence unless already done and run each phoneme batch through the session pool."""
+        if not 0.5 <= speed <= 2.0:
+            raise ValueError("Speed should be between 0.5 and 2.0")
+
+        if self.worker_pool is not None:
+            # Phonemization and trimming happen in the worker as well
+            with trace.span("inference"):
+                audio = await self.worker_pool.synthesize(sentence, voice_name, speed, lang)
+            yield audio
+            return
+
+        voice_style = self.voice_table.style(voice_name)
+        if phonemes is None:
+            with trace.span("phonemize"):
+                phonemes = await self.phoneme_cache.run(sentence, lang)
+        _LOGGER.debug("Phoneme cache: %s", self.phoneme_cache)
+
+        for batch in self.kokoro._split_phonemes(phonemes):
+            with trace.span("inference"):
+                audio = await self.session_pool.infer(batch, voice_style, speed)
+            # Trim leading and trailing silence for natural concatenation
+            with trace.span("trim"):
+                audio, _ = trim_audio(audio)
+            yield audio
+
+    async def _write_audio(self, pipeline: SentencePipeline, voice_name: str, trace: RequestTrace) -> int:
+        """Send audio from the pipeline as it becomes available; returns the byte count."""
+        rate = self._output_rate()
+        framer = AudioFramer(max(1, rate * self.cli_args.chunk_ms // 1000))
+        resampler = None
+        if rate != kokoro_onnx.config.SAMPLE_RATE:
+            resampler = Resampler(kokoro_onnx.config.SAMPLE_RATE, rate)
+        total_bytes = 0
+        start_time = time.perf_counter()
+        first_audio_time = None
+
+        async def send(frames: list[bytes]) -> None:
+            nonlocal total_bytes, first_audio_time
+            for audio_bytes in frames:
+                if first_audio_time is None:
+                    first_audio_time = time.perf_counter() - start_time
+                    trace.mark("first_audio")
+                total_bytes += len(audio_bytes)
+                METRICS.audio_bytes.inc(len(audio_bytes))
+                with trace.span("queue"):
+                    await self.send_event(
+                        AudioChunk(
+                            audio=audio_bytes,
+                            rate=rate,
+                            width=2,
+                            channels=1,
+                        ).event()
+                    )
+
+        def convert(audio: np.ndarray) -> list[bytes]:
+            if resampler is not None:
+                with trace.span("resample"):
+                    audio = resampler.process(audio)
+            with trace.span("convert"):
+                return list(framer.feed(audio))
+
+        METRICS.requests_in_flight.inc()
+        try:
+            async for audio in pipeline:
+                await send(convert(audio))
+
+            if resampler is not None:
+                with trace.span("resample"):
+                    audio = resampler.flush()
+                with trace.span("convert"):
+                    frames = list(framer.feed(audio))
+                await send(frames)
+            audio_bytes = framer.flush()
+            if audio_bytes:
+                await send([audio_bytes])
+        finally:
+            # Don't leave lookahead synthesis running if sending failed or was cancelled
+            unfinished = await pipeline.cancel()
+            if unfinished:
+                METRICS.cancelled_sentences.inc(unfinished)
+            METRICS.requests_in_flight.dec()
+
+        METRICS.observe_synthesis(
+            self.voice_table.label(voice_name),
+            time.perf_counter() - start_time,
+            first_audio_time,
+            total_bytes / 2 / rate,
+        )
+
+        return total_bytes
+
+    async def handle_event(self, event: Event) -> bool:
+        """Handle Wyoming protocol events."""
+        if Describe.is_type(event.type):
+            await self.send_event(self.wyoming_info_event)
+            _LOGGER.debug("Sent info")
+            return True
+
+        # Handle streaming TTS events (Wyoming 1.7.0+)
+        if SynthesizeStart.is_type(event.type):
+            # A new request replaces whatever is still being spoken
+            await self._cancel_synthesis("superseded")
+            try:
+                return await self._handle_synthesize_start(event)
+            except Exception as err:
+                await self._fail(err)
+                raise err
+
+        if SynthesizeChunk.is_type(event.type):
+            try:
+                return await self._handle_synthesize_chunk(event)
+            except Exception as err:
+                await self._fail(err)
+                raise err
+
+        if SynthesizeStop.is_type(event.type):
+            try:
+                return await self._handle_synthesize_stop(event)
+            except Exception as err:
+                await self._fail(err)
+                raise err
+
+        # Handle legacy non-streaming synthesis (backward compatibility)
+        if Synthesize.is_type(event.type):
+            if self.streaming_active:
+                # Streaming clients also send the full text for compatibility,
+                # it is already being synthesized from the chunks
+                _LOGGER.debug("Ignoring synthesize event during streaming synthesis")
+                return True
+
+            await self._cancel_synthesis("superseded")
+            # Synthesize in the background so a disconnect or a new request is noticed
+            self.synthesis_task = asyncio.create_task(self._handle_synthesize(event))
+            return True
+
+        _LOGGER.warning("Unexpected event: %s", event)
+        return True
+
+    async def disconnect(self) -> None:
+        """Stop synthesis nobody is listening to anymore."""
+        await self._cancel_synthesis("disconnect")
+        await self.send_queue.close()
+
+    async def _cancel_synthesis(self, reason: str) -> None:
+        """Stop synthesis still running for this connection and free its inference slots."""
+        tasks = [task for task in (self.synthesis_task, self.streaming_task)
+                 if task is not None and not task.done()]
+        self.synthesis_task = None
+        self._reset_streaming_state()
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.active_trace is not None:
+            # No-op if the request already ended
+            self.active_trace.finish("cancelled")
+        # Audio the client hasn't read yet is not needed anymore either
+        discarded = self.send_queue.discard(lambda event: AudioChunk.is_type(event.type))
+        if not tasks and not discarded:
+            return
+
+        METRICS.cancelled_requests.inc(1, reason)
+        _LOGGER.debug("Cancelled synthesis: %s", reason)
+
+        if self.audio_open and reason != "disconnect":
+            # End the audio of the interrupted request before the next one starts
+            self.audio_open = False
+            await self.send_event(AudioStop().event())
+
+    async def _send_error(self, err: Exception) -> None:
+        """Report a failed background request to the client, if it is still connected."""
+        try:
+            await self.send_event(Error(text=str(err), code=err.__class__.__name__).event())
+        except ConnectionError:
+            pass
+
+    async def _fail(self, err: Exception) -> None:
+        """Report an error that ends the connection, after the events queued before it."""
+        await self._send_error(err)
+        try:
+            await self.send_queue.drain()
+        except ConnectionError:
+            pass
+
+    async def _handle_synthesize(self, event: Event) -> None:
+        """Handle text to speech synthesis request."""
+        trace = None
+        try:
+            synthesize = Synthesize.from_event(event)
+
+            # Get voice settings with speed adjustment
+            voice_name, speed, lang = self._parse_voice_settings(synthesize.voice)
+            trace = self._start_trace("synthesize", voice_name, speed)
+
+            with trace.span("split"):
+                # Cached sentences stay whole, so partly cached replies still hit the cache
+                segments = self._create_segmenter().segment(split_into_sentences(synthesize.text),
+                                                            self._cached_check(voice_name, speed, lang))
+
+            # Send audio start
+            await self.send_event(
+                AudioStart(
+                    rate=self._output_rate(),
+                    width=2,
+                    channels=1,
+                ).event()
+            )
+            self.audio_open = True
+
+            pipeline = self._create_pipeline(voice_name, speed, lang, trace)
+            for segment in segments:
+                pipeline.add(segment)
+            pipeline.close()
+
+            t_bytes = await self._write_audio(pipeline, voice_name, trace)
+
+            # Send audio stop
+            await self.send_event(
+                AudioStop().event())
+            self.audio_open = False
+
+            _LOGGER.debug('Synthesized %d bytes from %s', t_bytes, repr(synthesize))
+
+            # The trace ends once the client has received all of the audio
+            await self.send_queue.drain()
+            trace.finish()
+
+        except Exception as e:
+            _LOGGER.exception("Error synthesizing: %s", e)
+            if trace is not None:
+                trace.finish("error")
+            await self._send_error(e)
+
+    async def _handle_synthesize_start(self, event: Event) -> bool:
+        """Handle start of streaming synthesis."""
+        synthesize_start = SynthesizeStart.from_event(event)
+
+        # Reset streaming state
+        self._reset_streaming_state()
+
+        # Parse and store voice settings with speed
+        voice_name, speed, lang = self._parse_voice_settings(synthesize_start.voice)
+        self.streaming_voice = voice_name
+        self.streaming_speed = speed
+        self.streaming_lang = lang
+        self.streaming_active = True
+        self.streaming_trace = self._start_trace("stream", voice_name, speed)
+
+        _LOGGER.debug("Started streaming synthesis with voice: %s, speed: %.2f",
+                     self.streaming_voice, self.streaming_speed)
+        return True
+
+    async def _handle_synthesize_chunk(self, event: Event) -> bool:
+        """Handle streaming text chunk, synthesizing each sentence as soon as it is finished."""
+        synthesize_chunk = SynthesizeChunk.from_event(event)
+
+        if not self.streaming_active:
+            # Chunk without a start event, fall back to default voice settings
+            await self._cancel_synthesis("superseded")
+            voice_name, speed, lang = self._parse_voice_settings(None)
+            self.streaming_voice = voice_name
+            self.streaming_speed = speed
+            self.streaming_lang = lang
+            self.streaming_active = True
+            self.streaming_trace = self._start_trace("stream", voice_name, speed)
+
+        self.streaming_text_chunks.append(synthesize_chunk.text)
+        _LOGGER.debug("Received text chunk: %s", repr(synthesize_chunk.text))
+
+        with self.streaming_trace.span("split"):
+            sentences = self.streaming_buffer.feed(synthesize_chunk.text)
+            if not sentences and not self.streaming_segmenter.started:
+                # Start speaking at the first clause instead of waiting for the sentence
+                clause = self.streaming_buffer.take_first_clause(self.streaming_segmenter)
+                if clause:
+                    sentences = [clause]
+            segments = self.streaming_segmenter.segment(sentences, self._cached_check(
+                self.streaming_voice, self.streaming_speed, self.streaming_lang))
+
+        for segment in segments:
+            await self._queue_streaming_sentence(segment)
+
+        return True
+
+    async def _queue_streaming_sentence(self, sentence: str) -> None:
+        """Start synthesis of a finished sentence, sending audio start on the first one."""
+        if not self.streaming_audio_started:
+            # Send audio start on first sentence
+            await self.send_event(
+                AudioStart(
+                    rate=self._output_rate(),
+                    width=2,
+                    channels=1,
+                ).event()
+            )
+            self.audio_open = True
+            self.streaming_audio_started = True
+
+            self.streaming_pipeline = self._create_pipeline(
+                self.streaming_voice, self.streaming_speed, self.streaming_lang, self.streaming_trace
+            )
+            # Audio is written in the background so later chunks keep being read
+            self.streaming_task = asyncio.create_task(
+                self._write_audio(self.streaming_pipeline, self.streaming_voice, self.streaming_trace)
+            )
+
+        _LOGGER.debug("Synthesizing streamed sentence: %s", repr(sentence))
+        self.streaming_pipeline.add(sentence)
+
+    async def _handle_synthesize_stop(self, event: Event) -> bool:
+        """Handle end of streaming synthesis and flush the remaining text."""
+        if self.streaming_trace is None:
+            # Stop without a start event or chunks
+            self.streaming_trace = self._start_trace("stream", None, None)
+
+        # Synthesize whatever is left after the last sentence boundary
+        with self.streaming_trace.span("split"):
+            segments = self.streaming_segmenter.segment(self.streaming_buffer.flush(), self._cached_check(
+                self.streaming_voice, self.streaming_speed, self.streaming_lang))
+        for segment in segments:
+            await self._queue_streaming_sentence(segment)
+
+        if self.streaming_pipeline is not None:
+            self.streaming_pipeline.close()
+
+        # The rest of the audio is sent in the background, so a new request can replace it
+        self.synthesis_task = asyncio.create_task(
+            self._finish_streaming(self.streaming_task, len(self.streaming_text_chunks), self.streaming_trace)
+        )
+        self.streaming_task = None
+        self._reset_streaming_state()
+        return True
+
+    async def _finish_streaming(self, write_task: Optional[asyncio.Task], chunk_count: int,
+                                trace: RequestTrace) -> None:
+        """Wait until the audio of a stream is sent, then confirm its end."""
+        try:
+            total_bytes = 0
+            if write_task is not None:
+                total_bytes = await write_task
+
+                # Send audio stop
+                await self.send_event(AudioStop().event())
+                self.audio_open = False
+
+            # Send synthesize stopped confirmation
+            await self.send_event(SynthesizeStopped().event())
+
+            _LOGGER.debug('Streaming synthesis completed: %d bytes from %d chunks',
+                          total_bytes, chunk_count)
+
+            # The trace ends once the client has received all of the audio
+            await self.send_queue.drain()
+            trace.finish()
+
+        except Exception as e:
+            _LOGGER.exception("Error in streaming synthesis: %s", e)
+            trace.finish("error")
+            await self._send_error(e)
+
+    def _reset_streaming_state(self) -> None:
+        """Clear all per-stream state; a running stream must be cancelled or detached first."""
+        self.streaming_text_chunks = []
+        self.streaming_buffer = SentenceBuffer()
+        self.streaming_segmenter = self._create_segmenter()
+        self.streaming_pipeline = None
+        self.streaming_task = None
+        self.streaming_voice = None
+        self.streaming_speed = None
+        self.streaming_lang = None
+        self.streaming_audio_started = False
+        self.streaming_active = False
+        self.streaming_trace: Optional[RequestTrace] = None
@@ -0,0 +1,160 @@
+"""Inference sessions of this process and the scheduler that feeds them."""
+
+import asyncio
+import os
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+import onnxruntime as rt
+from kokoro_onnx import Kokoro
+from kokoro_onnx.log import log
+
+from wyoming_tts.futures import set_future_exception, set_future_result
+
+_LOGGER = log.getChild(__name__)
+
+
+class InferenceScheduler:
+    """
+    Central queue for ONNX inference requests from all connections.
+
+    Requests run one at a time on the session in the order they arrive,
+    so concurrent connections share it instead of contending for its
+    threads. They are not batched: the published Kokoro export takes one
+    token sequence per run and returns a flat waveform without per-item
+    lengths, so requests cannot be padded into a single tensor.
+
+    The queue task is restarted by the next request if it ever stops, so
+    callers never wait forever.
+    """
+
+    def __init__(self, kokoro: Kokoro):
+        self.kokoro = kokoro
+        self.pending = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def infer(self, phonemes: str, voice_style: np.ndarray, speed: float) -> np.ndarray:
+        """Queue a phoneme batch for inference and wait for its audio."""
+        if self._task is None or self._task.done():
+            if self._task is not None and not self._task.cancelled() and self._task.exception() is not None:
+                _LOGGER.error("Inference queue stopped, restarting it", exc_info=self._task.exception())
+            self._task = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending += 1
+        try:
+            await self._queue.put((phonemes, voice_style, speed, future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            phonemes, voice_style, speed, future = await self._queue.get()
+            # Callers that went away don't need their audio
+            if future.done():
+                continue
+
+            try:
+                audio, _sample_rate = await loop.run_in_executor(
+                    None, self.kokoro._create_audio, phonemes, voice_style, speed)
+            except Exception as err:
+                set_future_exception(future, err)
+            else:
+                set_future_result(future, audio)
+
+
+class SessionPool:
+    """
+    Dispatch inference to the least-loaded of several schedulers.
+
+    Each scheduler drives its own ONNX inference session, so one long
+    announcement only occupies one session while other connections are
+    served by the rest.
+    """
+
+    def __init__(self, schedulers: list[InferenceScheduler]):
+        self.schedulers = schedulers
+
+    async def infer(self, phonemes: str, voice_style: np.ndarray, speed: float) -> np.ndarray:
+        """Run inference on the session with the fewest pending requests."""
+        index, scheduler = min(enumerate(self.schedulers), key=lambda item: item[1].pending)
+        if len(self.schedulers) > 1:
+            _LOGGER.debug("Dispatching to session %d, queue depths: %s",
+                          index, [s.pending for s in self.schedulers])
+        return await scheduler.infer(phonemes, voice_style, speed)
+
+
+def create_sessions(model_path: str, count: int, threads: int,
+                    cache_dir: Optional[str] = None) -> list[rt.InferenceSession]:
+    """
+    Create independent ONNX inference sessions for the model.
+
+    Args:
+        model_path: Path to the ONNX model
+        count: Number of sessions
+        threads: Intra-op threads per session (0 lets ONNX Runtime decide)
+        cache_dir: Directory where compiled models are kept across restarts
+
+    Returns:
+        List of inference sessions
+    """
+    # Same provider selection as kokoro_onnx
+    env_provider = os.getenv("ONNX_PROVIDER")
+    providers = [env_provider] if env_provider else ["CPUExecutionProvider"]
+
+    provider_options = None
+    if cache_dir and providers[0] == "OpenVINOExecutionProvider":
+        # OpenVINO stores the compiled model blob here and loads it on the next start
+        os.makedirs(cache_dir, exist_ok=True)
+        provider_options = [{"cache_dir": cache_dir}]
+
+    sessions = []
+    for _ in range(max(1, count)):
+        options = rt.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        sessions.append(rt.InferenceSession(model_path, sess_options=options, providers=providers,
+                                            provider_options=provider_options))
+
+    return sessions
+
+
+def load_without_session(model_path: str, voices_path: str) -> Kokoro:
+    """
+    Load the voices and tokenizer of the model without an inference session.
+
+    In worker mode only the worker processes run inference, so the front
+    process skips creating and compiling a session of its own.
+    Kokoro.from_session() only reads the model path of the session it is
+    given, so a stand-in is enough.
+
+    Args:
+        model_path: Path to the ONNX model, checked for existence
+        voices_path: Path to the voices archive
+
+    Returns:
+        Kokoro instance without a session, it cannot synthesize
+    """
+    kokoro = Kokoro.from_session(SimpleNamespace(_model_path=model_path), voices_path)
+    kokoro.sess = None
+    return kokoro
+
+
+def warm_up_voice(kokoro: Kokoro) -> str:
+    """Voice the warm-up synthesis is run with."""
+    return "af_heart" if "af_heart" in kokoro.voices else next(iter(kokoro.voices))
+
+
+def warm_up(kokoro: Kokoro, phonemes: str, voice_style: np.ndarray) -> None:
+    """Run an inference so lazy initialization happens before the first request.
+
+    The caller phonemizes the warm-up text: sessions may be warmed up
+    concurrently, while espeak must only run on one thread, see PhonemeCache.
+    """
+    for batch in kokoro._split_phonemes(phonemes):
+        kokoro._create_audio(batch, voice_style, 1.0)
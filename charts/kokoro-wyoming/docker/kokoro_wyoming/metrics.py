@@ -0,0 +1,20 @@
+"""Metrics of the Kokoro server."""
+
+from wyoming_tts.metrics import Counter, Gauge, Metrics
+
+
+class KokoroMetrics(Metrics):
+    """Metrics of the Kokoro server, in addition to the ones every server has."""
+
+    def __init__(self):
+        super().__init__()
+        self.session_queue_depth = Gauge(
+            "wyoming_tts_session_queue_depth", "Inference jobs waiting for or running on each session",
+            ("session",))
+        self.cancelled_sentences = Counter(
+            "wyoming_tts_cancelled_sentences_total",
+            "Sentences dropped or stopped mid-synthesis by cancelled requests")
+
+
+# Metrics of this process, shared by all connections
+METRICS = KokoroMetrics()
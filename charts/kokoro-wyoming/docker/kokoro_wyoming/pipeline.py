@@ -0,0 +1,102 @@
+"""Pipelined synthesis of the sentences of one request."""
+
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import numpy as np
+
+
+class SentencePipeline:
+    """
+    Synthesize sentences ahead of playback with a bounded lookahead.
+
+    Sentences are started in order as soon as fewer than ``lookahead + 1``
+    of them are in flight, so upcoming sentences are already being rendered
+    while the audio of the current one is written to the client. A
+    lookahead of 0 keeps the original strictly serial behaviour.
+
+    An optional ``prepare`` coroutine is started for every sentence as soon
+    as it is added, regardless of the lookahead, and its result is passed to
+    ``synthesize`` together with the sentence. This lets cheap preparation
+    such as phonemization run ahead of inference.
+
+    Example:
+        >>> pipeline = SentencePipeline(synthesize, lookahead=2)
+        >>> for sentence in split_into_sentences(text):
+        ...     pipeline.add(sentence)
+        >>> pipeline.close()
+        >>> async for audio in pipeline:
+        ...     ...
+    """
+
+    def __init__(self, synthesize: Callable[[str, Any], AsyncIterator[np.ndarray]], lookahead: int = 1,
+                 prepare: Optional[Callable[[str], Awaitable[Any]]] = None):
+        self._synthesize = synthesize
+        self._lookahead = max(0, lookahead)
+        self._prepare = prepare
+        self._pending: deque[tuple[str, Optional[asyncio.Future]]] = deque()
+        self._running: deque[tuple[asyncio.Queue, asyncio.Task]] = deque()
+        self._closed = False
+        self._wakeup = asyncio.Event()
+
+    def add(self, sentence: str) -> None:
+        """Queue a sentence for synthesis."""
+        prepared = asyncio.ensure_future(self._prepare(sentence)) if self._prepare is not None else None
+        self._pending.append((sentence, prepared))
+        self._fill()
+        self._wakeup.set()
+
+    def close(self) -> None:
+        """Mark the end of input; iteration stops once all sentences are played."""
+        self._closed = True
+        self._wakeup.set()
+
+    async def cancel(self) -> int:
+        """Stop all in-flight synthesis and drop pending sentences; returns how many were unfinished."""
+        self._closed = True
+        unfinished = len(self._pending) + len(self._running)
+        tasks = [prepared for _, prepared in self._pending if prepared is not None]
+        self._pending.clear()
+        tasks += [task for _, task in self._running]
+        self._running.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._wakeup.set()
+        return unfinished
+
+    def _fill(self) -> None:
+        while self._pending and len(self._running) <= self._lookahead:
+            sentence, prepared = self._pending.popleft()
+            queue: asyncio.Queue = asyncio.Queue()
+            task = asyncio.create_task(self._produce(sentence, prepared, queue))
+            self._running.append((queue, task))
+
+    async def _produce(self, sentence: str, prepared: Optional[asyncio.Future],
+                       queue: asyncio.Queue) -> None:
+        try:
+            prepared_result = await prepared if prepared is not None else None
+            async for audio in self._synthesize(sentence, prepared_result):
+                await queue.put(audio)
+        except Exception as err:
+            await queue.put(err)
+        await queue.put(None)
+
+    async def __aiter__(self):
+        while True:
+            self._fill()
+            if not self._running:
+                if self._closed and not self._pending:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            queue, _ = self._running[0]
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+            self._running.popleft()
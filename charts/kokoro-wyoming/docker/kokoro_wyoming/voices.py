@@ -0,0 +1,183 @@
+"""Voices of the model, voice blends and their Wyoming descriptions."""
+
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from kokoro_onnx import Kokoro
+from wyoming.info import Attribution, TtsVoice, TtsVoiceSpeaker
+
+
+class VoiceTable:
+    """
+    Style vectors of plain and blended voices.
+
+    A blend is written as voices with weights joined by ``+``, e.g.
+    ``af_heart:0.7+bf_emma:0.3``; a missing weight counts as 1 and the
+    weights are normalized. Specs are parsed into a canonical form, so
+    equivalent spellings share one style tensor, which is computed once
+    and kept in an LRU cache of at most ``max_entries`` blends. Named
+    blends declared at startup are built right away and never evicted.
+    """
+
+    def __init__(self, kokoro: Kokoro, blends: Optional[dict[str, str]] = None, max_entries: int = 64):
+        self.kokoro = kokoro
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._styles: dict[str, np.ndarray] = {}
+        self._blends: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.named: dict[str, str] = {}
+
+        for name, spec in (blends or {}).items():
+            if name in kokoro.voices:
+                raise ValueError(f"Voice blend {name} shadows a model voice")
+            canonical = self.resolve(spec)
+            self.named[name] = canonical
+            self._styles[canonical] = self._blend(self.parse(canonical))
+
+    @staticmethod
+    def parse(spec: str) -> list[tuple[str, float]]:
+        """Split a voice spec into (voice, weight) pairs, heaviest first, with weights summing to 1."""
+        components: dict[str, float] = {}
+        for part in spec.split("+"):
+            name, _, weight = part.strip().partition(":")
+            try:
+                value = float(weight) if weight else 1.0
+            except ValueError:
+                raise ValueError(f"Invalid weight in voice spec {spec!r}") from None
+            if not name or value < 0:
+                raise ValueError(f"Invalid voice spec {spec!r}")
+            components[name] = components.get(name, 0.0) + value
+
+        total = sum(components.values())
+        if total <= 0:
+            raise ValueError(f"Voice spec {spec!r} has no positive weight")
+        return sorted(((name, value / total) for name, value in components.items() if value > 0),
+                      key=lambda item: (-item[1], item[0]))
+
+    def resolve(self, voice: str) -> str:
+        """Canonical name of a voice, named blend or blend spec."""
+        if voice in self.named:
+            return self.named[voice]
+        if voice in self.kokoro.voices:
+            return voice
+
+        components = self.parse(voice)
+        for name, _ in components:
+            if name not in self.kokoro.voices:
+                raise ValueError(f"Voice {name} not found in available voices")
+        if len(components) == 1:
+            return components[0][0]
+        return "+".join(f"{name}:{weight:.4g}" for name, weight in components)
+
+    def label(self, voice: str) -> str:
+        """Metrics label of a canonical voice: model voices and named blends keep their name, other blends share one."""
+        if voice in self.kokoro.voices:
+            return voice
+        for name, canonical in self.named.items():
+            if canonical == voice:
+                return name
+        return "blend"
+
+    def primary(self, voice: str) -> str:
+        """Heaviest model voice of a voice or blend, which decides the language."""
+        return self.parse(self.named.get(voice, voice))[0][0]
+
+    def style(self, voice: str) -> np.ndarray:
+        """Style tensor of a canonical voice name, see resolve()."""
+        style = self._styles.get(voice)
+        if style is not None:
+            return style
+
+        if voice in self.kokoro.voices:
+            # Loading from the voices archive decompresses the array every time
+            style = self._styles[voice] = self.kokoro.get_voice_style(voice)
+            return style
+
+        style = self._blends.get(voice)
+        if style is not None:
+            self._blends.move_to_end(voice)
+            self.hits += 1
+            return style
+
+        self.misses += 1
+        style = self._blend(self.parse(voice))
+        if self.max_entries > 0:
+            self._blends[voice] = style
+            if len(self._blends) > self.max_entries:
+                self._blends.popitem(last=False)
+        return style
+
+    def _blend(self, components: list[tuple[str, float]]) -> np.ndarray:
+        style = None
+        for name, weight in components:
+            part = self.style(name) * np.float32(weight)
+            style = part if style is None else style + part
+        return style
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"{len(self.named)} named blends, {len(self._blends)}/{self.max_entries} cached blends, "
+                f"{self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate)")
+
+
+def parse_voice_blends(values: list[str]) -> dict[str, str]:
+    """Parse NAME=SPEC command line values into a mapping of blend names to specs."""
+    blends = {}
+    for value in values:
+        name, sep, spec = value.partition("=")
+        if not sep or not name.strip() or not spec.strip():
+            raise ValueError(f"Invalid voice blend {value!r}, expected NAME=SPEC")
+        blends[name.strip()] = spec.strip()
+    return blends
+
+
+def _voice_language(voice_id: str) -> str:
+    return (
+        "en" if voice_id.startswith("a") else
+        "it" if voice_id.startswith("i") else
+        "jp" if voice_id.startswith('j') else
+        "cn" if voice_id.startswith('z') else
+        "es" if voice_id.startswith('e') else
+        "fr" if voice_id.startswith('f') else
+        "hi" if voice_id.startswith("h") else "en"
+    )
+
+
+def get_model_voices(model: Kokoro, voice_table: Optional[VoiceTable] = None) -> list[TtsVoice]:
+    voices = [
+        TtsVoice(
+            name=voice_id,
+            description=voice_id,
+            attribution=Attribution(
+                name="", url=""
+            ),
+            installed=True,
+            version=None,
+            languages=[_voice_language(voice_id)],
+            speakers=[
+                TtsVoiceSpeaker(name=voice_id.split("_")[1])
+            ]
+        )
+        for voice_id in model.voices.keys()
+    ]
+
+    # Blends declared at startup are offered like model voices
+    if voice_table is not None:
+        voices += [
+            TtsVoice(
+                name=name,
+                description=spec,
+                attribution=Attribution(
+                    name="", url=""
+                ),
+                installed=True,
+                version=None,
+                languages=[_voice_language(voice_table.primary(name))],
+            )
+            for name, spec in voice_table.named.items()
+        ]
+
+    return voices
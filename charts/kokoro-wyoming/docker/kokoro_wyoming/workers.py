@@ -0,0 +1,145 @@
+"""Worker processes that each run a model with its own sessions."""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+from kokoro_onnx import Kokoro
+from kokoro_onnx.log import log
+from kokoro_onnx.trim import trim as trim_audio
+
+from .caches import PhonemeCache
+from .inference import create_sessions, warm_up, warm_up_voice
+from .voices import VoiceTable
+
+_LOGGER = log.getChild(__name__)
+
+
+# Kokoro instance, phoneme memo and voice table of a worker process, see WorkerPool
+_worker_kokoro: Optional[Kokoro] = None
+_worker_phonemes: Optional[PhonemeCache] = None
+_worker_voices: Optional[VoiceTable] = None
+
+
+def _init_worker(model_path: str, voices_path: str, threads: int,
+                 cache_dir: Optional[str], warmup_text: str, phoneme_cache_size: int,
+                 voice_blends: dict[str, str], voice_cache_size: int) -> None:
+    """Load and warm up the model in a freshly started worker process."""
+    global _worker_kokoro, _worker_phonemes, _worker_voices
+    session = create_sessions(model_path, 1, threads, cache_dir)[0]
+    _worker_kokoro = Kokoro.from_session(session, voices_path)
+    _worker_phonemes = PhonemeCache(_worker_kokoro.tokenizer, phoneme_cache_size)
+    _worker_voices = VoiceTable(_worker_kokoro, voice_blends, voice_cache_size)
+    if warmup_text:
+        warm_up(_worker_kokoro, _worker_phonemes.phonemize(warmup_text, "en-us"),
+                _worker_voices.style(warm_up_voice(_worker_kokoro)))
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def _worker_synthesize(sentence: str, voice_name: str, speed: float, lang: str) -> tuple[str, int]:
+    """
+    Synthesize a sentence in a worker process.
+
+    The audio is placed in a new shared memory block instead of being
+    pickled back through the result pipe. The front process reads and
+    unlinks the block, see _read_shared_audio().
+
+    Returns:
+        tuple: (shared memory name, number of float32 samples)
+    """
+    kokoro = _worker_kokoro
+    voice_style = _worker_voices.style(voice_name)
+    phonemes = _worker_phonemes.phonemize(sentence, lang)
+
+    parts = []
+    for batch in kokoro._split_phonemes(phonemes):
+        audio, _sample_rate = kokoro._create_audio(batch, voice_style, speed)
+        audio, _ = trim_audio(audio)
+        parts.append(audio.astype(np.float32, copy=False))
+    audio = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+    np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+    shm.close()
+    return shm.name, len(audio)
+
+
+def _read_shared_audio(name: str, length: int) -> np.ndarray:
+    """Copy the audio out of a worker's shared memory block and unlink the block.
+
+    The front process owns the blocks its workers create: spawned workers
+    register them with the front process's resource tracker, and unlinking
+    here releases that registration. Blocks of workers that died before
+    handing them over are removed by the tracker when the server exits.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray((length,), dtype=np.float32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _discard_worker_result(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        _read_shared_audio(*future.result())
+
+
+class WorkerPool:
+    """
+    Synthesize sentences in a pool of worker processes.
+
+    Phonemization, inference and post-processing run outside of the
+    asyncio process, which only keeps the Wyoming protocol handling.
+    Each worker loads its own inference session and builds the declared
+    voice blends at startup.
+    """
+
+    def __init__(self, workers: int, model_path: str, voices_path: str, threads: int,
+                 cache_dir: Optional[str] = None, warmup_text: str = "", phoneme_cache_size: int = 4096,
+                 voice_blends: Optional[dict[str, str]] = None, voice_cache_size: int = 64):
+        self.workers = workers
+        self.pending = 0
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            # Forking a process with ONNX Runtime threads running is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path, voices_path, threads, cache_dir, warmup_text, phoneme_cache_size,
+                      voice_blends or {}, voice_cache_size),
+        )
+
+    async def start(self) -> None:
+        """Start the worker processes so the model is loaded before the first request."""
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _worker_ping) for _ in range(self.workers)
+        ))
+        _LOGGER.info("Started %d worker process(es): %s", len(set(pids)), sorted(set(pids)))
+
+    async def synthesize(self, sentence: str, voice_name: str, speed: float, lang: str) -> np.ndarray:
+        """Synthesize a whole sentence in the next free worker."""
+        future = self._executor.submit(_worker_synthesize, sentence, voice_name, speed, lang)
+        self.pending += 1
+        try:
+            name, length = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Drop the job if no worker has picked it up yet, otherwise
+            # free the shared memory once the worker is done with it
+            if not future.cancel():
+                future.add_done_callback(_discard_worker_result)
+            raise
+        finally:
+            self.pending -= 1
+
+        return _read_shared_audio(name, length)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -5,364 +5,43 @@
 
 import argparse
 import asyncio
+import copy
 import logging
+import os
 import signal
+import time
 from functools import partial
-from typing import Optional
 
-import kokoro_onnx.config
-from wyoming.error import Error
-from wyoming.server import AsyncEventHandler
 from kokoro_onnx import Kokoro
 from kokoro_onnx.log import log
-import numpy as np
-
-from wyoming.info import Attribution, TtsProgram, TtsVoice, TtsVoiceSpeaker, Describe, Info
+from wyoming.info import Attribution, Info, TtsProgram
 from wyoming.server import AsyncServer
-from wyoming.tts import Synthesize, SynthesizeStart, SynthesizeChunk, SynthesizeStop, SynthesizeStopped
-from wyoming.audio import AudioChunk, AudioStart, AudioStop
-from wyoming.event import Event
-import re
+
+from kokoro_wyoming.caches import AudioCache, PhonemeCache
+from kokoro_wyoming.handler import KokoroEventHandler
+from kokoro_wyoming.inference import (InferenceScheduler, SessionPool, create_sessions, load_without_session,
+                                      warm_up, warm_up_voice)
+from kokoro_wyoming.metrics import METRICS
+from kokoro_wyoming.voices import VoiceTable, get_model_voices, parse_voice_blends
+from kokoro_wyoming.workers import WorkerPool
+from wyoming_tts.metrics import start_metrics_server
+from wyoming_tts.text import TextSegmenter
+from wyoming_tts.tracing import PROFILER, TRACE_LOGGER, RequestTrace, monitor_event_loop
 
 _LOGGER = log.getChild(__name__)
 VERSION = "0.6.6" # x-release-please-version
 
 
-def split_into_sentences(text: str) -> list[str]:
-    """
-    Split text into sentences using punctuation boundaries.
-    
-    Args:
-        text: Input text to split
-        
-    Returns:
-        List of sentences
-        
-    Example:
-        >>> text = "Hello world! How are you? I'm doing great."
-        >>> split_into_sentences(text)
-        ['Hello world!', 'How are you?', "I'm doing great."]
-    """
-    # First normalize whitespace and clean the text
-    text = ' '.join(text.strip().split())
-
-    # Split on sentence boundaries
-    pattern = r'(?<=[.!?])\s+'
-    sentences = re.split(pattern, text)
-
-    # Filter out empty strings and strip whitespace
-    sentences = [s.strip() for s in sentences if s.strip()]
-
-    return sentences
-
-
-def get_model_voices(model: Kokoro) -> list[TtsVoice]:
-    return [
-        TtsVoice(
-            name=voice_id,
-            description=voice_id,
-            attribution=Attribution(
-                name="", url=""
-            ),
-            installed=True,
-            version=None,
-            languages=[
-                "en" if voice_id.startswith("a") else
-                "it" if voice_id.startswith("i") else
-                "jp" if voice_id.startswith('j') else
-                "cn" if voice_id.startswith('z') else
-                "es" if voice_id.startswith('e') else
-                "fr" if voice_id.startswith('f') else
-                "hi" if voice_id.startswith("h") else "en"
-            ],
-            speakers=[
-                TtsVoiceSpeaker(name=voice_id.split("_")[1])
-            ]
-        )
-        for voice_id in model.voices.keys()
-    ]
-
-
-class KokoroEventHandler(AsyncEventHandler):
-    def __init__(self, wyoming_info: Info, kokoro_instance,
-                 cli_args,
-                 *args,
-                 **kwargs):
-        super().__init__(*args, **kwargs)
-
-        self.kokoro = kokoro_instance
-        self.cli_args = cli_args
-        self.args = args
-        self.wyoming_info_event = wyoming_info.event()
-
-        # Streaming state
-        self.streaming_text_chunks = []
-        self.streaming_voice = None
-        self.streaming_speed = None
-        self.streaming_lang = None
-        self.streaming_audio_started = False
-
-    def _parse_voice_settings(self, voice_obj):
-        """
-        Parse voice settings from Wyoming voice object.
-
-        Returns:
-            tuple: (voice_name, speed, lang)
-
-        Speed can be specified via speaker parameter, e.g.:
-        - speaker="speed_1.5" -> 1.5x speed
-        - speaker="1.2" -> 1.2x speed
-        - speaker=None -> default speed from CLI args
-        """
-        voice_name = "af_heart"  # default voice
-        speed = self.cli_args.speed if hasattr(self.cli_args, 'speed') else 1.0
-
-        if voice_obj:
-            if voice_obj.name:
-                voice_name = voice_obj.name
-
-            # Check if speaker parameter contains speed override
-            if hasattr(voice_obj, 'speaker') and voice_obj.speaker:
-                speaker = voice_obj.speaker
-                # Try to extract speed from speaker parameter
-                # Supports formats: "speed_1.5", "1.5", "speed:1.5"
-                try:
-                    if speaker.startswith("speed_") or speaker.startswith("speed:"):
-                        speed_str = speaker.split("_")[-1].split(":")[-1]
-                        speed = float(speed_str)
-                    else:
-                        # Try direct float parsing
-                        speed = float(speaker)
-                except (ValueError, AttributeError):
-                    # If parsing fails, use default speed
-                    pass
-
-        # Determine language from voice name
-        lang = "en-us" if voice_name.startswith("a") else "en-gb"
-
-        return voice_name, speed, lang
-
-    async def handle_event(self, event: Event) -> bool:
-        """Handle Wyoming protocol events."""
-        if Describe.is_type(event.type):
-            await self.write_event(self.wyoming_info_event)
-            _LOGGER.debug("Sent info")
-            return True
-
-        # Handle streaming TTS events (Wyoming 1.7.0+)
-        if SynthesizeStart.is_type(event.type):
-            try:
-                return await self._handle_synthesize_start(event)
-            except Exception as err:
-                await self.write_event(
-                    Error(text=str(err), code=err.__class__.__name__).event()
-                )
-                raise err
-
-        if SynthesizeChunk.is_type(event.type):
-            try:
-                return await self._handle_synthesize_chunk(event)
-            except Exception as err:
-                await self.write_event(
-                    Error(text=str(err), code=err.__class__.__name__).event()
-                )
-                raise err
-
-        if SynthesizeStop.is_type(event.type):
-            try:
-                return await self._handle_synthesize_stop(event)
-            except Exception as err:
-                await self.write_event(
-                    Error(text=str(err), code=err.__class__.__name__).event()
-                )
-                raise err
-
-        # Handle legacy non-streaming synthesis (backward compatibility)
-        if Synthesize.is_type(event.type):
-            try:
-                return await self._handle_synthesize(event)
-            except Exception as err:
-                await self.write_event(
-                    Error(text=str(err), code=err.__class__.__name__).event()
-                )
-                raise err
-
-        _LOGGER.warning("Unexpected event: %s", event)
-        return True
-
-    """Handle text to speech synthesis request."""
-
-    async def _handle_synthesize(self, event: Event) -> Optional[bool]:
-        try:
-            synthesize = Synthesize.from_event(event)
-
-            # Get voice settings with speed adjustment
-            voice_name, speed, lang = self._parse_voice_settings(synthesize.voice)
-
-            sentences = split_into_sentences(synthesize.text)
-
-            i = 0
-            t_bytes = 0
-            for sentence in sentences:
-                # Create audio stream with adjustable speed
-                stream = self.kokoro.create_stream(
-                    sentence,
-                    voice=voice_name,
-                    speed=speed,
-                    lang=lang
-                )
-
-                if i == 0:
-                    # Send audio start
-                    await self.write_event(
-                        AudioStart(
-                            rate=kokoro_onnx.config.SAMPLE_RATE,
-                            width=2,
-                            channels=1,
-                        ).event()
-                    )
-                    i += 1
-
-                # Process each chunk from the stream
-                async for audio, sample_rate in stream:
-                    # Convert float32 to int16
-                    audio_int16 = (audio * 32767).astype(np.int16)
-                    audio_bytes = audio_int16.tobytes()
-
-                    t_bytes += len(audio_bytes)
-
-                    # Send audio chunk
-                    await self.write_event(
-                        AudioChunk(
-                            audio=audio_bytes,
-                            rate=kokoro_onnx.config.SAMPLE_RATE,
-                            width=2,
-                            channels=1,
-                        ).event()
-                    )
-
-            # Send audio stop
-            await self.write_event(
-                AudioStop().event())
-
-            _LOGGER.debug('Synthesized %d bytes from %s', t_bytes, repr(synthesize))
-
-            return True
-
-        except Exception as e:
-            _LOGGER.exception("Error synthesizing: %s", e)
-
-    async def _handle_synthesize_start(self, event: Event) -> bool:
-        """Handle start of streaming synthesis."""
-        synthesize_start = SynthesizeStart.from_event(event)
-
-        # Reset streaming state
-        self.streaming_text_chunks = []
-        self.streaming_audio_started = False
-
-        # Parse and store voice settings with speed
-        voice_name, speed, lang = self._parse_voice_settings(synthesize_start.voice)
-        self.streaming_voice = voice_name
-        self.streaming_speed = speed
-        self.streaming_lang = lang
-
-        _LOGGER.debug("Started streaming synthesis with voice: %s, speed: %.2f",
-                     self.streaming_voice, self.streaming_speed)
-        return True
-
-    async def _handle_synthesize_chunk(self, event: Event) -> bool:
-        """Handle streaming text chunk."""
-        synthesize_chunk = SynthesizeChunk.from_event(event)
-
-        # Accumulate text chunks
-        self.streaming_text_chunks.append(synthesize_chunk.text)
-
-        _LOGGER.debug("Received text chunk: %s", repr(synthesize_chunk.text))
-        return True
-
-    async def _handle_synthesize_stop(self, event: Event) -> bool:
-        """Handle end of streaming synthesis and process accumulated text."""
-        try:
-            # Combine all text chunks
-            full_text = "".join(self.streaming_text_chunks)
-
-            if not full_text.strip():
-                # No text to synthesize
-                await self.write_event(SynthesizeStopped().event())
-                return True
-
-            _LOGGER.debug("Processing streaming synthesis with full text: %s", repr(full_text))
-
-            # Split into sentences for streaming
-            sentences = split_into_sentences(full_text)
-
-            total_bytes = 0
-            for i, sentence in enumerate(sentences):
-                # Create audio stream with stored speed settings
-                stream = self.kokoro.create_stream(
-                    sentence,
-                    voice=self.streaming_voice,
-                    speed=self.streaming_speed,
-                    lang=self.streaming_lang
-                )
-
-                if i == 0 and not self.streaming_audio_started:
-                    # Send audio start on first sentence
-                    await self.write_event(
-                        AudioStart(
-                            rate=kokoro_onnx.config.SAMPLE_RATE,
-                            width=2,
-                            channels=1,
-                        ).event()
-                    )
-                    self.streaming_audio_started = True
-
-                # Process each chunk from the stream
-                async for audio, sample_rate in stream:
-                    # Convert float32 to int16
-                    audio_int16 = (audio * 32767).astype(np.int16)
-                    audio_bytes = audio_int16.tobytes()
-
-                    total_bytes += len(audio_bytes)
-
-                    # Send audio chunk
-                    await self.write_event(
-                        AudioChunk(
-                            audio=audio_bytes,
-                            rate=kokoro_onnx.config.SAMPLE_RATE,
-                            width=2,
-                            channels=1,
-                        ).event()
-                    )
-
-            # Send audio stop
-            if self.streaming_audio_started:
-                await self.write_event(AudioStop().event())
-
-            # Send synthesize stopped confirmation
-            await self.write_event(SynthesizeStopped().event())
-
-            _LOGGER.debug('Streaming synthesis completed: %d bytes from %d chunks',
-                          total_bytes, len(self.streaming_text_chunks))
-
-            # Reset streaming state
-            self.streaming_text_chunks = []
-            self.streaming_voice = None
-            self.streaming_speed = None
-            self.streaming_lang = None
-            self.streaming_audio_started = False
-
-            return True
-
-        except Exception as e:
-            _LOGGER.exception("Error in streaming synthesis: %s", e)
-            # Reset state on error
-            self.streaming_text_chunks = []
-            self.streaming_voice = None
-            self.streaming_speed = None
-            self.streaming_lang = None
-            self.streaming_audio_started = False
-            raise
+def parse_speed_range(value: str) -> tuple[float, float]:
+    """Parse a MIN:MAX speed range command line value."""
+    low, sep, high = value.partition(":")
+    try:
+        speeds = (float(low), float(high))
+    except ValueError:
+        speeds = None
+    if not sep or speeds is None or not 0 < speeds[0] <= speeds[1]:
+        raise argparse.ArgumentTypeError(f"Invalid speed range {value!r}, expected MIN:MAX")
+    return speeds
 
 
 async def main():
@@ -389,19 +68,263 @@ async def main():
         action="store_true",
         help="Enable debug logging",
     )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve Prometheus metrics on this port at /metrics (default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="0.0.0.0",
+        help="Address the metrics endpoint listens on (default: 0.0.0.0)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Log the time spent in each stage of every request as one JSON line",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="Enable the sampling profiler: on SIGUSR1 or when a 'profile-now' file appears in "
+             "this directory, profile the next requests and write the stacks here",
+    )
+    parser.add_argument(
+        "--profile-requests",
+        type=int,
+        default=5,
+        help="Number of requests covered by a profile (default: 5)",
+    )
+    parser.add_argument(
+        "--profile-interval-ms",
+        type=float,
+        default=5.0,
+        help="Sampling interval of the profiler in milliseconds (default: 5)",
+    )
+    parser.add_argument(
+        "--loop-lag-warn-ms",
+        type=float,
+        default=100.0,
+        help="Log a warning when the event loop is blocked for longer than this (default: 100)",
+    )
     parser.add_argument(
         "--speed",
         type=float,
         default=1.0,
         help="Default speech speed (0.5-2.0, default: 1.0). Can be overridden per-request via voice.speaker parameter (e.g., 'speed_1.5')",
     )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=32,
+        help="Size of the in-memory synthesized audio cache in MiB (0 disables, default: 32)",
+    )
+    parser.add_argument(
+        "--phoneme-cache-size",
+        type=int,
+        default=4096,
+        help="Number of phonemized phrases to remember (0 disables, default: 4096)",
+    )
+    parser.add_argument(
+        "--voice-blend",
+        action="append",
+        default=[],
+        metavar="NAME=SPEC",
+        help="Offer a blended voice, e.g. 'heart_emma=af_heart:0.7+bf_emma:0.3' (can be repeated)",
+    )
+    parser.add_argument(
+        "--voice-cache-size",
+        type=int,
+        default=64,
+        help="Number of blended voices requested by spec to keep precomputed (default: 64)",
+    )
+    parser.add_argument(
+        "--time-stretch",
+        type=parse_speed_range,
+        default=None,
+        metavar="MIN:MAX",
+        help="Render speeds in this range at 1.0 and time-stretch the audio, sharing cached audio "
+             "across speeds, e.g. '0.8:1.25' (default: disabled, every speed is synthesized)",
+    )
+    parser.add_argument(
+        "--output-rate",
+        type=int,
+        default=0,
+        help="Sample rate of the audio sent to clients in Hz, e.g. 16000 (default: the model's rate)",
+    )
+    parser.add_argument(
+        "--chunk-ms",
+        type=int,
+        default=100,
+        help="Duration of each audio chunk sent to the client in milliseconds (default: 100)",
+    )
+    parser.add_argument(
+        "--send-high-watermark",
+        type=int,
+        default=1024,
+        help="KiB of audio queued for a client before synthesis waits for it to read (default: 1024)",
+    )
+    parser.add_argument(
+        "--send-low-watermark",
+        type=int,
+        default=256,
+        help="KiB of queued audio below which synthesis resumes after waiting (default: 256)",
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        default=1,
+        help="Number of independent ONNX inference sessions (default: 1)",
+    )
+    parser.add_argument(
+        "--session-threads",
+        type=int,
+        default=0,
+        help="Intra-op threads per inference session (default: CPU count divided by --sessions)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Synthesize in N worker processes, each with its own inference session (default: 0, in-process)",
+    )
+    parser.add_argument(
+        "--model-cache-dir",
+        default=None,
+        help="Directory to keep compiled models in across restarts (OpenVINO execution provider)",
+    )
+    parser.add_argument(
+        "--warmup-text",
+        default="Hello, how can I help you today?",
+        help="Text synthesized on every inference session before the server starts listening (empty disables)",
+    )
+    parser.add_argument(
+        "--first-segment-chars",
+        type=int,
+        default=60,
+        help="End the first segment of a response within this many characters, at a clause boundary if possible (0 disables, default: 60)",
+    )
+    parser.add_argument(
+        "--segment-chars",
+        type=int,
+        default=200,
+        help="Target segment size in characters; short sentences are merged and long ones split (0 keeps sentences, default: 200)",
+    )
+    parser.add_argument(
+        "--max-segment-chars",
+        type=int,
+        default=400,
+        help="Maximum segment size in characters, kept below the model context (default: 400)",
+    )
+    parser.add_argument(
+        "--lookahead",
+        type=int,
+        default=1,
+        help="Number of sentences to synthesize ahead of the one being sent (0 disables pipelining, default: 1)",
+    )
     args = parser.parse_args()
 
     if args.debug:
         log.setLevel(level=logging.DEBUG)
+    # The modules shared with the other servers log like this one
+    shared_log = logging.getLogger("wyoming_tts")
+    shared_log.setLevel(log.level)
+    for handler in log.handlers:
+        shared_log.addHandler(handler)
+
+    if args.trace:
+        # Traces are written as bare JSON lines, without the log prefix
+        trace_handler = logging.StreamHandler()
+        trace_handler.setFormatter(logging.Formatter("%(message)s"))
+        TRACE_LOGGER.addHandler(trace_handler)
+        TRACE_LOGGER.setLevel(logging.INFO)
+        TRACE_LOGGER.propagate = False
+        RequestTrace.enabled = True
+    PROFILER.configure(args.profile_dir, args.profile_requests, args.profile_interval_ms)
+
+    try:
+        # Rejects segment sizes the segmenter can't work with before anything is loaded
+        TextSegmenter(args.first_segment_chars, args.segment_chars, args.max_segment_chars)
+    except ValueError as err:
+        parser.error(str(err))
+
+    voice_blends = parse_voice_blends(args.voice_blend)
+
+    # Sessions run in the worker processes in worker mode, else in this process
+    session_count = args.workers if args.workers > 0 else args.sessions
+    session_threads = args.session_threads
+    if session_threads <= 0 and session_count > 1:
+        session_threads = max(1, (os.cpu_count() or 1) // session_count)
+
+    load_start = time.perf_counter()
+
+    worker_pool = None
+    if args.workers > 0:
+        worker_pool = WorkerPool(args.workers, "kokoro-v1.0.onnx", "voices-v1.0.bin", session_threads,
+                                 args.model_cache_dir, args.warmup_text, args.phoneme_cache_size,
+                                 voice_blends, args.voice_cache_size)
+        await worker_pool.start()
+        _LOGGER.info("Started and warmed up %d worker process(es) in %.2fs",
+                     args.workers, time.perf_counter() - load_start)
+
+    instances = []
+    if worker_pool is None:
+        phase_start = time.perf_counter()
+        sessions = create_sessions("kokoro-v1.0.onnx", session_count, session_threads, args.model_cache_dir)
+        _LOGGER.info("Created %d inference session(s) with %s threads each in %.2fs",
+                     len(sessions), session_threads or "default", time.perf_counter() - phase_start)
+
+        phase_start = time.perf_counter()
+        kokoro_instance = Kokoro.from_session(sessions[0], "voices-v1.0.bin")
+
+        # Additional sessions share the voice table and tokenizer of the first one
+        instances.append(kokoro_instance)
+        for session in sessions[1:]:
+            instance = copy.copy(kokoro_instance)
+            instance.sess = session
+            instances.append(instance)
+    else:
+        # The front process only resolves voices and handles the protocol
+        phase_start = time.perf_counter()
+        kokoro_instance = load_without_session("kokoro-v1.0.onnx", "voices-v1.0.bin")
+    voice_table = VoiceTable(kokoro_instance, voice_blends, args.voice_cache_size)
+    _LOGGER.info("Loaded %d voices and %d blends in %.2fs", len(kokoro_instance.voices),
+                 len(voice_table.named), time.perf_counter() - phase_start)
+
+    # Shared by all connections; phonemization always runs on its single thread
+    phoneme_cache = PhonemeCache(kokoro_instance.tokenizer, args.phoneme_cache_size)
+
+    if args.warmup_text and worker_pool is None:
+        phase_start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # The sessions share one tokenizer and espeak, so only inference runs concurrently
+        phonemes = await phoneme_cache.run(args.warmup_text, "en-us")
+        voice_style = voice_table.style(warm_up_voice(kokoro_instance))
+        await asyncio.gather(*(
+            loop.run_in_executor(None, warm_up, instance, phonemes, voice_style) for instance in instances
+        ))
+        _LOGGER.info("Warmed up %d inference session(s) in %.2fs",
+                     len(instances), time.perf_counter() - phase_start)
+
+    session_pool = SessionPool([
+        InferenceScheduler(instance)
+        for instance in instances
+    ]) if instances else None
+
+    METRICS.model_load_seconds.set(time.perf_counter() - load_start)
+    METRICS.queue_depth.set_function(
+        lambda: worker_pool.pending if worker_pool is not None
+        else sum(scheduler.pending for scheduler in session_pool.schedulers)
+    )
+    if session_pool is not None:
+        METRICS.session_queue_depth.set_function(lambda: {
+            (str(index),): scheduler.pending for index, scheduler in enumerate(session_pool.schedulers)
+        })
 
-    kokoro_instance = Kokoro("kokoro-v1.0.onnx", "voices-v1.0.bin")
-    wyoming_voices = get_model_voices(kokoro_instance)
+    # Shared by all connections
+    audio_cache = AudioCache(args.cache_size * 1024 * 1024) if args.cache_size > 0 else None
+    wyoming_voices = get_model_voices(kokoro_instance, voice_table)
 
     wyoming_info = Info(
         tts=[TtsProgram(
@@ -414,9 +337,15 @@ async def main():
             installed=True,
             voices=sorted(wyoming_voices, key=lambda v: v.name),
             version=VERSION,
+            supports_synthesize_streaming=True,
         )]
     )
 
+    if args.metrics_port > 0:
+        await start_metrics_server(METRICS, args.metrics_host, args.metrics_port)
+        _LOGGER.info('Serving metrics on port %d', args.metrics_port)
+
+    _LOGGER.info('Startup finished in %.2fs', time.perf_counter() - load_start)
     _LOGGER.info('Kokoro ONNX server starting on %s', args.uri)
     server = AsyncServer.from_uri(args.uri)
 
@@ -424,9 +353,19 @@ async def main():
     loop = asyncio.get_event_loop()
     for s in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(s, lambda: asyncio.create_task(server.stop()))
+    if args.profile_dir:
+        loop.add_signal_handler(signal.SIGUSR1, PROFILER.arm)
+
+    lag_monitor = asyncio.create_task(monitor_event_loop(METRICS, warn_seconds=args.loop_lag_warn_ms / 1000))
 
     # Start server with kokoro instance and CLI args
-    await server.run(partial(KokoroEventHandler, wyoming_info, kokoro_instance, args))
+    try:
+        await server.run(partial(KokoroEventHandler, wyoming_info, kokoro_instance, args,
+                                 audio_cache, phoneme_cache, voice_table, session_pool, worker_pool))
+    finally:
+        lag_monitor.cancel()
+        if worker_pool is not None:
+            worker_pool.shutdown()
 
 
 if __name__ == "__main__":
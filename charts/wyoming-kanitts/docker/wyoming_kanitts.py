@@ -3,9 +3,15 @@
 
 import argparse
 import asyncio
+import hashlib
+import json
 import logging
 import os
+import signal
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from pathlib import Path
 from typing import Optional
@@ -13,10 +19,18 @@ from typing import Optional
 import torch
 import numpy as np
 
+from wyoming.error import Error
 from wyoming.info import Attribution, Describe, Info, TtsProgram, TtsVoice
 from wyoming.server import AsyncServer, AsyncEventHandler
-from wyoming.tts import Synthesize
-from wyoming.audio import AudioChunk, AudioStop
+from wyoming.tts import Synthesize, SynthesizeChunk, SynthesizeStart, SynthesizeStop, SynthesizeStopped
+from wyoming.audio import AudioChunk, AudioStart, AudioStop
+
+from wyoming_tts.audio import AudioFramer, Limiter, Resampler
+from wyoming_tts.futures import set_future_exception, set_future_result
+from wyoming_tts.metrics import Counter, Histogram, Metrics, start_metrics_server
+from wyoming_tts.streaming import SendQueue
+from wyoming_tts.text import SentenceBuffer, split_into_sentences
+from wyoming_tts.tracing import PROFILER, TRACE_LOGGER, RequestTrace, monitor_event_loop
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,6 +43,572 @@ KaniTTS = None
 _shared_model = None
 _model_lock = asyncio.Lock()
 
+# Cancellation flag of the generation running on the current executor thread
+_generation = threading.local()
+
+
+class GenerationCancelled(Exception):
+    """Raised inside the model when the request of a running generation was cancelled."""
+
+
+def _check_cancelled(module, args) -> None:
+    """Forward pre-hook that aborts a generation whose request was cancelled."""
+    cancelled = getattr(_generation, "cancelled", None)
+    if cancelled is not None and cancelled.is_set():
+        raise GenerationCancelled()
+
+
+def find_modules(model, max_depth: int = 3) -> list:
+    """Find the torch modules held by the model wrapper through its attributes.
+
+    KaniTTS wraps a language model and an audio codec without exposing
+    them, so they are looked up in the attributes of the wrapper. Modules
+    nested inside a found module are not returned separately.
+
+    Args:
+        model: KaniTTS model instance
+        max_depth: How many attribute levels to search for modules
+
+    Returns:
+        List of torch modules
+    """
+    modules = []
+    seen = set()
+    level = [model]
+    for _ in range(max_depth):
+        next_level = []
+        for obj in level:
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            if isinstance(obj, torch.nn.Module):
+                modules.append(obj)
+            elif hasattr(obj, "__dict__"):
+                next_level.extend(vars(obj).values())
+        level = next_level
+    return modules
+
+
+def install_cancel_hooks(model, max_depth: int = 3) -> int:
+    """Make running generations of the model stop at the next forward pass once cancelled.
+
+    KaniTTS has no cancellation API, so a pre-hook is registered on the torch
+    modules held by the model wrapper, see find_modules().
+
+    Args:
+        model: KaniTTS model instance
+        max_depth: How many attribute levels to search for modules
+
+    Returns:
+        Number of modules the hook was registered on
+    """
+    modules = find_modules(model, max_depth)
+    for module in modules:
+        module.register_forward_pre_hook(_check_cancelled)
+    return len(modules)
+
+
+# Numeric precisions the model can run at, see optimize_model()
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def language_model(model):
+    """The causal language model inside the KaniTTS wrapper, None if it can't be found.
+
+    KaniTTS keeps it at ``model.model.model``: the wrapper holds a KaniModel,
+    which holds the transformers model next to its tokenizer. The audio
+    codec lives on the player and is not part of it.
+    """
+    module = getattr(getattr(model, "model", None), "model", None)
+    return module if isinstance(module, torch.nn.Module) else None
+
+
+def optimize_model(model, precision: str = "bf16", compile_model: bool = False) -> bool:
+    """Prepare the language model for faster inference.
+
+    KaniTTS loads the language model in bfloat16 and the audio codec in
+    float32. Only the language model is changed here, the codec decodes
+    a small share of the time and stays as loaded:
+
+    - fp32 converts the language model to float32.
+    - bf16 keeps it in bfloat16, which is fast on CPUs with AVX-512 BF16
+      or AMX and on GPUs, and slow on other CPUs.
+    - int8 converts it to float32 and replaces its torch.nn.Linear layers
+      with dynamically quantized ones: int8 weights, with activations
+      quantized on the fly (CPU only). Its other layers (embeddings,
+      norms) stay float32, as does the codec.
+
+    With compile_model the forward pass of the language model is compiled
+    by torch.compile on its first call, so a warm-up should follow.
+
+    Args:
+        model: KaniTTS model instance
+        precision: One of PRECISIONS
+        compile_model: Whether to compile the forward pass
+
+    Returns:
+        Whether the language model was found and prepared
+    """
+    module = language_model(model)
+    if module is None:
+        return False
+
+    module.eval()
+    if precision == "bf16":
+        module.to(torch.bfloat16)
+    else:
+        module.float()
+    if precision == "int8":
+        # torch.ao.quantization is deprecated in favour of torchao and removed in
+        # torch 2.10, pyproject.toml pins torch below that
+        torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if compile_model:
+        # Compiling forward rather than the module keeps methods like generate() working
+        module.forward = torch.compile(module.forward, dynamic=True)
+    return True
+
+
+def warm_up(model, text: str) -> None:
+    """Run a generation so lazy initialization and compilation happen before the first request."""
+    with torch.inference_mode():
+        generate_one(model, text)
+
+
+class KaniMetrics(Metrics):
+    """Metrics of the KaniTTS server, in addition to the ones every server has."""
+
+    def __init__(self):
+        super().__init__()
+        self.audio_cache_lookups = Counter(
+            "wyoming_tts_audio_cache_lookups_total", "Sentence lookups in the persistent audio cache", ("result",))
+        self.rejected_requests = Counter(
+            "wyoming_tts_rejected_requests_total", "Requests rejected because the generation queue was full")
+        self.batch_size = Histogram(
+            "wyoming_tts_batch_size", "Number of sentences generated together",
+            buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+
+
+# Metrics of this process, shared by all handlers
+_METRICS = KaniMetrics()
+
+
+def generate_one(model, text: str, speaker: Optional[str] = None) -> np.ndarray:
+    """Generate audio for one text.
+
+    Args:
+        model: KaniTTS model instance
+        text: Text to synthesize
+        speaker: Optional speaker name (e.g., "david", "jenny")
+
+    Returns:
+        Audio as float32 numpy array at the model's sample rate, peaks are left to the limiter
+    """
+    # KaniTTS API: audio, text = model(text, speaker_id=speaker_name)
+    if speaker:
+        audio, _ = model(text, speaker_id=speaker)
+    else:
+        audio, _ = model(text)
+    return np.asarray(audio, dtype=np.float32)
+
+
+def supports_batching(model) -> bool:
+    """Whether the KaniModel inside the wrapper exposes the separate steps needed to generate several texts at once."""
+    kani_model = getattr(model, "model", None)
+    player = getattr(kani_model, "player", None)
+    return (callable(getattr(kani_model, "get_input_ids", None))
+            and callable(getattr(kani_model, "model_request", None))
+            and callable(getattr(player, "get_waveform", None))
+            and hasattr(player, "pad_token")
+            and hasattr(player, "end_of_speech"))
+
+
+def generate_batch(model, texts: list[str], speakers: list[Optional[str]]) -> list[np.ndarray]:
+    """Generate audio for several texts in one padded generation.
+
+    The prompts are left-padded with the player's pad token to the longest
+    one, so all rows of the batch are decoded in the same forward passes.
+    Rows that finish early are filled up after their end of speech until
+    the longest row is done, so each row is cut after its first end of
+    speech and turned into audio separately.
+
+    Args:
+        model: KaniTTS model instance, see supports_batching()
+        texts: Texts to synthesize
+        speakers: Speaker name of each text, None for the default
+
+    Returns:
+        Audio of each text as float32 numpy array, in the order of texts
+    """
+    kani_model = model.model
+    player = kani_model.player
+    prompts = [kani_model.get_input_ids(text, speaker)[0] for text, speaker in zip(texts, speakers)]
+    length = max(prompt.shape[-1] for prompt in prompts)
+
+    input_ids = torch.full((len(prompts), length), player.pad_token, dtype=prompts[0].dtype)
+    attention_mask = torch.zeros((len(prompts), length), dtype=torch.int64)
+    for row, prompt in enumerate(prompts):
+        input_ids[row, length - prompt.shape[-1]:] = prompt.reshape(-1)
+        attention_mask[row, length - prompt.shape[-1]:] = 1
+
+    output = kani_model.model_request(input_ids, attention_mask)
+    audios = []
+    for row, prompt in enumerate(prompts):
+        # Drop the padding in front of the prompt and the filler after the end of speech,
+        # the row then looks like the output of an unbatched generation
+        tokens = output[row, length - prompt.shape[-1]:]
+        ends = (tokens[prompt.shape[-1]:] == player.end_of_speech).nonzero(as_tuple=True)[0]
+        if len(ends):
+            tokens = tokens[:prompt.shape[-1] + int(ends[0]) + 1]
+        audio, _ = player.get_waveform(tokens.unsqueeze(0))
+        audios.append(np.asarray(audio, dtype=np.float32))
+    return audios
+
+
+class _BatchCancelled:
+    """Cancellation flag of a generation that is set once all of its requests were cancelled."""
+
+    def __init__(self, futures: list[asyncio.Future]):
+        self.futures = futures
+
+    def is_set(self) -> bool:
+        return all(future.cancelled() for future in self.futures)
+
+
+class DiskAudioCache:
+    """
+    Content-addressed cache of generated sentence audio on disk.
+
+    Every sentence is stored as raw float32 PCM at the model's sample rate
+    in a file named by the SHA-256 of the model, precision, sample rate,
+    speaker and normalized text, so identical phrases are generated once
+    and then served from disk, also after restarts. Reads are memory
+    mapped. Files are written to a temporary name and renamed into place,
+    so several replicas can share the directory on a ReadWriteMany volume
+    without ever reading a partial file.
+
+    The total size is kept below ``max_bytes`` by deleting the least
+    recently used files, i.e. the oldest modification times, since hits
+    touch their file. Each process tracks its own writes and rescans the
+    directory when evicting, so with several writers the cap is
+    approximate between evictions.
+
+    Example:
+        >>> cache = DiskAudioCache("/data/audio-cache", 1024 * 1024 * 1024, "kani-tts-370m/fp32/22050")
+        >>> key = cache.make_key("david", "Turned on the kitchen light.")
+        >>> audio = cache.get(key)
+        >>> if audio is None:
+        ...     cache.put(key, generate())
+    """
+
+    VERSION = 1
+    SUFFIX = ".pcm"
+    # Leftovers of writes interrupted by a crash are removed after this many seconds
+    STALE_SECONDS = 3600
+
+    def __init__(self, directory: str, max_bytes: int, namespace: str):
+        """Open the cache directory, creating it if needed.
+
+        Args:
+            directory: Directory of the cache files
+            max_bytes: Size the files may take up in total
+            namespace: Identifies the model and its settings, e.g. name, precision and sample rate
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._evict_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = self._scan()[0]
+
+    def make_key(self, speaker: Optional[str], text: str) -> str:
+        """Content address of a sentence spoken by a speaker."""
+        fields = [self.VERSION, self.namespace, speaker or "", ' '.join(text.split())]
+        return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        # Two levels of fan-out keep directories small
+        return os.path.join(self.directory, key[:2], key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Memory-map the audio of a key, None if it isn't cached."""
+        path = self._path(key)
+        try:
+            audio = np.memmap(path, dtype=np.float32, mode="r")
+            # Mark as recently used for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            # Missing, or evicted by another replica in the meantime
+            self.misses += 1
+            _METRICS.audio_cache_lookups.inc(1, "miss")
+            return None
+
+        self.hits += 1
+        _METRICS.audio_cache_lookups.inc(1, "hit")
+        return audio
+
+    def put(self, key: str, audio: np.ndarray) -> None:
+        """Store the audio of a key atomically; errors are logged, not raised."""
+        data = np.ascontiguousarray(audio, dtype=np.float32)
+        if not data.nbytes or data.nbytes > self.max_bytes:
+            return
+
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "wb") as file:
+                file.write(data.tobytes())
+            os.replace(temp_path, path)
+        except OSError as err:
+            _LOGGER.warning("Failed to write audio cache file %s: %s", path, err)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        self.size += data.nbytes
+        if self.size > self.max_bytes:
+            self._evict()
+
+    def _scan(self) -> tuple[int, list]:
+        """Total size and (mtime, size, path) of all cache files; removes stale temporary files."""
+        total = 0
+        files = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for file in os.scandir(entry.path):
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                if file.name.endswith(self.SUFFIX):
+                    total += stat.st_size
+                    files.append((stat.st_mtime, stat.st_size, file.path))
+                elif file.name.endswith(".tmp") and now - stat.st_mtime > self.STALE_SECONDS:
+                    try:
+                        os.remove(file.path)
+                    except OSError:
+                        pass
+        return total, files
+
+    def _evict(self) -> None:
+        """Delete the least recently used files until the cache is at 90% of its size."""
+        if not self._evict_lock.acquire(blocking=False):
+            # Another thread is already evicting
+            return
+        try:
+            total, files = self._scan()
+            target = self.max_bytes * 0.9
+            evicted = 0
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    # Readers that mapped the file keep their copy
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+            self.size = total
+            _LOGGER.debug("Evicted %d audio cache file(s), %d bytes left", evicted, total)
+        finally:
+            self._evict_lock.release()
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"{self.size}/{self.max_bytes} bytes, {self.hits} hits, {self.misses} misses "
+                f"({hit_rate:.1%} hit rate)")
+
+
+class GenerationRejected(Exception):
+    """Raised for a request that arrives while too many requests are waiting for generation."""
+
+
+class GenerationScheduler:
+    """
+    Central queue for generation requests from all connections.
+
+    Sentences that arrive within ``window_ms`` of the first pending one,
+    or while the previous batch is running, are gathered into a batch of
+    at most ``max_batch``. A batch runs as one padded generation on the
+    shared model, so concurrent satellites share its forward passes
+    instead of contending for it, and the audio of each sentence is
+    routed back to its caller.
+
+    Batches run on a dedicated pool of ``workers`` threads, at most one
+    batch per thread. New requests are rejected while ``max_queue``
+    requests are waiting or generating, so an overloaded server answers
+    at once instead of letting every client wait. Each request waits for
+    one sentence at a time, so this limits the requests in progress, not
+    the sentences they still have to speak.
+
+    Model wrappers that only offer the single-text call run the sentences
+    of a batch back-to-back instead, as does a batch whose batched
+    generation failed, e.g. because one of its rows produced no valid
+    audio. Cancelled requests are dropped before
+    their batch starts; a running batch is stopped once every request in
+    it was cancelled. A failure outside of the generation fails the
+    requests of its batch, and the queue task is restarted by the next
+    request if it ever stops, so callers never wait forever.
+
+    Example:
+        >>> scheduler = GenerationScheduler(model, window_ms=10, max_batch=4)
+        >>> audio = await scheduler.generate("Hello there.", "david")
+    """
+
+    def __init__(self, model, window_ms: float = 0.0, max_batch: int = 4, workers: int = 1,
+                 max_queue: int = 0):
+        """Initialize the scheduler.
+
+        Args:
+            model: Shared KaniTTS model instance
+            window_ms: Time to wait for more requests after the first one of a batch in milliseconds
+            max_batch: Maximum number of sentences generated together
+            workers: Number of batches that may run at the same time
+            max_queue: Requests waiting or generating at which new requests are rejected (0 for no limit)
+        """
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.batched = self.max_batch > 1 and supports_batching(model)
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="generate")
+        self.pending = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def admit(self) -> None:
+        """Check that a new request can be taken on.
+
+        Raises:
+            GenerationRejected: If the queue is full
+        """
+        if self.max_queue and self.pending >= self.max_queue:
+            _METRICS.rejected_requests.inc()
+            _LOGGER.warning("Rejecting request, %d requests are waiting for generation", self.pending)
+            raise GenerationRejected(f"Server busy: {self.pending} requests waiting for generation")
+
+    async def generate(self, text: str, speaker: Optional[str] = None) -> np.ndarray:
+        """Queue a sentence for generation and wait for its audio.
+
+        Args:
+            text: Sentence to synthesize
+            speaker: Optional speaker name (e.g., "david", "jenny")
+
+        Returns:
+            Audio as float32 numpy array
+        """
+        if self._task is None or self._task.done():
+            if self._task is not None and not self._task.cancelled() and self._task.exception() is not None:
+                _LOGGER.error("Generation queue stopped, restarting it", exc_info=self._task.exception())
+            self._task = asyncio.create_task(self._run())
+
+        # Cancelling the caller cancels the future, which drops or stops its generation
+        future = asyncio.get_running_loop().create_future()
+        self.pending += 1
+        try:
+            await self._queue.put((text, speaker, future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        idle_workers = asyncio.Semaphore(self.workers)
+        while True:
+            # Gather the next batch only once a thread can run it, so it can grow meanwhile
+            await idle_workers.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Callers that went away don't need their audio
+            batch = [job for job in batch if not job[2].done()]
+            if not batch:
+                idle_workers.release()
+                continue
+
+            _LOGGER.debug("Generating batch of %d, %d sentences in queue", len(batch), self.pending)
+            _METRICS.batch_size.observe(len(batch))
+            try:
+                running = loop.run_in_executor(self.executor, self._run_batch, loop, batch)
+            except Exception as err:
+                idle_workers.release()
+                self._fail_batch(batch, err)
+                continue
+            running.add_done_callback(partial(self._batch_finished, idle_workers, batch))
+
+    def _batch_finished(self, idle_workers: asyncio.Semaphore, batch: list, running: asyncio.Future) -> None:
+        idle_workers.release()
+        if not running.cancelled() and running.exception() is not None:
+            self._fail_batch(batch, running.exception())
+
+    @staticmethod
+    def _fail_batch(batch: list, err: BaseException) -> None:
+        """Fail the requests of a batch that failed outside of their generation, so none waits forever."""
+        _LOGGER.error("Failed to generate batch of %d sentence(s)", len(batch), exc_info=err)
+        for _, _, future in batch:
+            set_future_exception(future, err)
+
+    def _run_batch(self, loop: asyncio.AbstractEventLoop, batch: list) -> None:
+        with torch.inference_mode():
+            self._generate_batch(loop, batch)
+
+    def _generate_batch(self, loop: asyncio.AbstractEventLoop, batch: list) -> None:
+        if self.batched and len(batch) > 1:
+            futures = [future for _, _, future in batch]
+            _generation.cancelled = _BatchCancelled(futures)
+            try:
+                audios = generate_batch(self.model, [text for text, _, _ in batch],
+                                        [speaker for _, speaker, _ in batch])
+            except GenerationCancelled as err:
+                for future in futures:
+                    loop.call_soon_threadsafe(set_future_exception, future, err)
+                return
+            except Exception as err:
+                # Only this batch falls back, the next one is batched again
+                _LOGGER.warning("Batched generation of %d sentences failed (%s), generating them one by one",
+                                len(batch), err, exc_info=_LOGGER.isEnabledFor(logging.DEBUG))
+            else:
+                for future, audio in zip(futures, audios):
+                    loop.call_soon_threadsafe(set_future_result, future, audio)
+                return
+            finally:
+                _generation.cancelled = None
+
+        for text, speaker, future in batch:
+            if future.done():
+                continue
+            _generation.cancelled = _BatchCancelled([future])
+            try:
+                audio = generate_one(self.model, text, speaker)
+            except Exception as err:
+                loop.call_soon_threadsafe(set_future_exception, future, err)
+            else:
+                loop.call_soon_threadsafe(set_future_result, future, audio)
+            finally:
+                _generation.cancelled = None
+
 
 class KaniTTSEventHandler(AsyncEventHandler):
     """Event handler for Wyoming protocol TTS requests."""
@@ -39,6 +619,12 @@ class KaniTTSEventHandler(AsyncEventHandler):
         model_name: str,
         device: str = "cpu",
         sample_rate: int = 22050,
+        output_rate: int = 0,
+        send_high_watermark: int = 1024 * 1024,
+        send_low_watermark: int = 256 * 1024,
+        chunk_ms: int = 100,
+        scheduler: Optional[GenerationScheduler] = None,
+        audio_cache: Optional[DiskAudioCache] = None,
         *args,
         **kwargs
     ):
@@ -48,15 +634,34 @@ class KaniTTSEventHandler(AsyncEventHandler):
             wyoming_info: Wyoming server info
             model_name: Hugging Face model name (e.g., "nineninesix/kani-tts-370m")
             device: PyTorch device ("cpu", "cuda", "xpu")
-            sample_rate: Audio sample rate in Hz
+            sample_rate: Audio sample rate of the model in Hz
+            output_rate: Audio sample rate sent to clients in Hz (0 for the model's rate)
+            send_high_watermark: Bytes of queued audio at which synthesis waits for the client
+            send_low_watermark: Bytes of queued audio at which synthesis resumes
+            chunk_ms: Duration of each audio chunk sent to clients in milliseconds
+            scheduler: Generation scheduler shared by all handlers
+            audio_cache: Persistent cache of sentence audio, None to always generate
         """
         super().__init__(*args, **kwargs)
 
         self.wyoming_info_event = wyoming_info.event()
+        # Metrics are labelled with advertised voices only, any other name a client sends shares one label
+        self.voice_names = {voice.name for program in wyoming_info.tts for voice in program.voices}
         self.model_name = model_name
         self.device = device
         self.sample_rate = sample_rate
+        self.output_rate = output_rate or sample_rate
+        self.chunk_ms = chunk_ms
+        self.scheduler = scheduler
+        self.audio_cache = audio_cache
         self.model: Optional[object] = None
+        self._synthesis_task: Optional[asyncio.Task] = None
+        self.active_trace: Optional[RequestTrace] = None
+        # Whether audio start was sent without the matching audio stop yet
+        self.audio_open = False
+        self._reset_streaming_state()
+        # Events are written by a separate task, so synthesis never waits for a slow client
+        self.send_queue = SendQueue(self.write_event, send_high_watermark, send_low_watermark, _METRICS)
 
         _LOGGER.info("Initializing KaniTTS with model: %s on device: %s", model_name, device)
 
@@ -87,10 +692,23 @@ class KaniTTSEventHandler(AsyncEventHandler):
                 None,
                 lambda: KaniTTS(self.model_name)
             )
+            install_cancel_hooks(_shared_model)
             self.model = _shared_model
 
             _LOGGER.info("KaniTTS model loaded successfully")
 
+    async def write_event(self, event) -> None:
+        """Send an event to the client and count it."""
+        start = time.perf_counter()
+        await super().write_event(event)
+        _METRICS.events.inc(1, event.type)
+        if self.active_trace is not None and not self.active_trace.finished:
+            self.active_trace.add("write", time.perf_counter() - start)
+
+    async def send_event(self, event) -> None:
+        """Queue an event for the writer task of this connection."""
+        await self.send_queue.put(event)
+
     async def handle_event(self, event) -> bool:
         """Handle a Wyoming protocol event.
 
@@ -101,19 +719,83 @@ class KaniTTSEventHandler(AsyncEventHandler):
             True if event was handled, False otherwise
         """
         if Describe.is_type(event.type):
-            await self.write_event(self.wyoming_info_event)
+            await self.send_event(self.wyoming_info_event)
             _LOGGER.debug("Sent info")
             return True
 
+        if SynthesizeStart.is_type(event.type):
+            # A new request replaces whatever is still being spoken
+            await self._cancel_synthesis("superseded")
+            self._start_stream(SynthesizeStart.from_event(event).voice)
+            return True
+
+        if SynthesizeChunk.is_type(event.type):
+            await self.handle_synthesize_chunk(SynthesizeChunk.from_event(event))
+            return True
+
+        if SynthesizeStop.is_type(event.type):
+            await self.handle_synthesize_stop()
+            return True
+
         if Synthesize.is_type(event.type):
+            if self.streaming_active:
+                # Streaming clients also send the full text for compatibility,
+                # it is already being synthesized from the chunks
+                _LOGGER.debug("Ignoring synthesize event during streaming synthesis")
+                return True
+
             synthesize = Synthesize.from_event(event)
-            return await self.handle_synthesize(synthesize)
+            # A new request replaces the one still being synthesized
+            await self._cancel_synthesis("superseded")
+            # Synthesize in the background so a disconnect or a new request is noticed
+            self._synthesis_task = asyncio.create_task(self.handle_synthesize(synthesize))
+            return True
 
+        _LOGGER.warning("Unexpected event: %s", event.type)
         return True
 
+    async def disconnect(self) -> None:
+        """Stop synthesis nobody is listening to anymore."""
+        await self._cancel_synthesis("disconnect")
+        await self.send_queue.close()
+
+    async def _cancel_synthesis(self, reason: str) -> None:
+        """Cancel the synthesis running for this connection, if any.
+
+        Args:
+            reason: Why the synthesis is no longer needed, used as metric label
+        """
+        tasks = [task for task in (self._synthesis_task, self._streaming_task)
+                 if task is not None and not task.done()]
+        self._synthesis_task = None
+        self._reset_streaming_state()
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.active_trace is not None:
+            # No-op if the request already ended
+            self.active_trace.finish("cancelled")
+
+        # Audio the client hasn't read yet is not needed anymore either
+        discarded = self.send_queue.discard(lambda event: AudioChunk.is_type(event.type))
+        if not tasks and not discarded:
+            return
+
+        _METRICS.cancelled_requests.inc(1, reason)
+        _LOGGER.debug("Cancelled synthesis: %s", reason)
+
+        if self.audio_open and reason != "disconnect":
+            # End the audio of the interrupted request before the next one starts
+            self.audio_open = False
+            await self.send_event(AudioStop().event())
+
     async def handle_synthesize(self, synthesize: Synthesize) -> bool:
         """Handle TTS synthesis request.
 
+        The text is split into sentences, and the audio of each sentence is
+        sent as soon as it is generated.
+
         Args:
             synthesize: Synthesize event containing text to speak
 
@@ -122,75 +804,260 @@ class KaniTTSEventHandler(AsyncEventHandler):
         """
         _LOGGER.debug("Synthesizing: %s", synthesize.text)
 
-        # Ensure model is loaded
-        await self.load_model()
+        speaker = self._speaker(synthesize.voice)
+        trace = self.active_trace = RequestTrace("synthesize", voice=speaker, characters=len(synthesize.text))
 
         try:
-            # Generate audio
-            loop = asyncio.get_event_loop()
-            # Use voice name as speaker (e.g., "david", "jenny")
-            speaker = None
-            if hasattr(synthesize, 'voice') and synthesize.voice:
-                speaker = synthesize.voice.name if hasattr(synthesize.voice, 'name') else str(synthesize.voice)
-            audio_array = await loop.run_in_executor(
-                None,
-                lambda: self._generate_audio(synthesize.text, speaker)
-            )
+            # Ensure model is loaded
+            with trace.span("load_model"):
+                await self.load_model()
+            self.scheduler.admit()
 
-            # Convert to 16-bit PCM
-            audio_int16 = (audio_array * 32767).astype(np.int16)
-            audio_bytes = audio_int16.tobytes()
-
-            # Send audio chunk
-            await self.write_event(
-                AudioChunk(
-                    rate=self.sample_rate,
-                    width=2,  # 16-bit
-                    channels=1,  # mono
-                    audio=audio_bytes,
-                ).event()
-            )
+            sentences: asyncio.Queue = asyncio.Queue()
+            with trace.span("split"):
+                for sentence in split_into_sentences(synthesize.text):
+                    sentences.put_nowait(sentence)
+            sentences.put_nowait(None)
 
-            # Send stop event
-            await self.write_event(AudioStop().event())
+            await self.send_event(AudioStart(rate=self.output_rate, width=2, channels=1).event())
+            self.audio_open = True
 
-            _LOGGER.debug("Synthesis complete")
+            total_bytes = await self._write_audio(sentences, speaker, trace)
+
+            await self.send_event(AudioStop().event())
+            self.audio_open = False
+            _LOGGER.debug("Synthesis complete: %d bytes", total_bytes)
+
+            # The trace ends once the client has received all of the audio
+            await self.send_queue.drain()
+            trace.finish()
+
+        except GenerationRejected as err:
+            trace.finish("rejected")
+            await self.send_event(Error(text=str(err), code=err.__class__.__name__).event())
+            return False
 
         except Exception as err:
+            trace.finish("error")
             _LOGGER.exception("Error during synthesis: %s", err)
+            try:
+                await self.send_event(Error(text=str(err), code=err.__class__.__name__).event())
+            except ConnectionError:
+                pass
             return False
 
         return True
 
-    def _generate_audio(self, text: str, speaker: Optional[str] = None) -> np.ndarray:
-        """Generate audio from text using KaniTTS.
+    def _speaker(self, voice) -> Optional[str]:
+        """Speaker name of a requested voice, None for the model's default."""
+        # Use voice name as speaker (e.g., "david", "jenny")
+        if voice:
+            return voice.name if hasattr(voice, 'name') else str(voice)
+        return None
+
+    def _start_stream(self, voice) -> None:
+        """Begin a streaming request; audio starts with its first finished sentence."""
+        self.streaming_active = True
+        self.streaming_speaker = self._speaker(voice)
+        self.streaming_trace = self.active_trace = RequestTrace("stream", voice=self.streaming_speaker)
+        _LOGGER.debug("Started streaming synthesis with speaker: %s", self.streaming_speaker)
+
+    async def handle_synthesize_chunk(self, chunk: SynthesizeChunk) -> None:
+        """Add streamed text and generate every sentence it finishes.
 
         Args:
-            text: Text to synthesize
+            chunk: Next piece of the text, e.g. a few LLM tokens
+        """
+        if not self.streaming_active:
+            # Chunk without a start event, use the default speaker
+            await self._cancel_synthesis("superseded")
+            self._start_stream(None)
+
+        self.streaming_chunks += 1
+        with self.streaming_trace.span("split"):
+            sentences = self.streaming_buffer.feed(chunk.text)
+        for sentence in sentences:
+            await self._queue_streaming_sentence(sentence)
+
+    async def handle_synthesize_stop(self) -> None:
+        """End a streaming request: generate the remaining text and confirm when all audio is sent."""
+        if not self.streaming_active:
+            # Stop without a start event or chunks
+            self._start_stream(None)
+
+        # Whatever is left after the last sentence boundary is the last sentence
+        with self.streaming_trace.span("split"):
+            sentences = self.streaming_buffer.flush()
+        for sentence in sentences:
+            await self._queue_streaming_sentence(sentence)
+        if self.streaming_sentences is not None:
+            self.streaming_sentences.put_nowait(None)
+
+        # The rest of the audio is sent in the background, so a new request can replace it
+        self._synthesis_task = asyncio.create_task(
+            self._finish_stream(self._streaming_task, self.streaming_chunks, self.streaming_trace)
+        )
+        self._streaming_task = None
+        self._reset_streaming_state()
+
+    async def _queue_streaming_sentence(self, sentence: str) -> None:
+        """Queue a finished sentence for generation, starting the audio with the first one."""
+        if self.streaming_rejected:
+            return
+
+        if self.streaming_sentences is None:
+            await self.load_model()
+            try:
+                self.scheduler.admit()
+            except GenerationRejected as err:
+                # The rest of the stream is ignored, its stop is still confirmed
+                self.streaming_rejected = True
+                self.streaming_trace.finish("rejected")
+                await self.send_event(Error(text=str(err), code=err.__class__.__name__).event())
+                return
+
+            await self.send_event(AudioStart(rate=self.output_rate, width=2, channels=1).event())
+            self.audio_open = True
+
+            self.streaming_sentences = asyncio.Queue()
+            # Audio is written in the background so later chunks keep being read
+            self._streaming_task = asyncio.create_task(
+                self._write_audio(self.streaming_sentences, self.streaming_speaker, self.streaming_trace)
+            )
+
+        _LOGGER.debug("Synthesizing streamed sentence: %s", sentence)
+        self.streaming_sentences.put_nowait(sentence)
+
+    async def _finish_stream(self, write_task: Optional[asyncio.Task], chunk_count: int,
+                             trace: RequestTrace) -> None:
+        """Wait until the audio of a stream is sent, then confirm its end.
+
+        Args:
+            write_task: Task writing the audio of the stream, None if it had no text
+            chunk_count: Number of text chunks received, for logging
+            trace: Trace of the request
+        """
+        try:
+            total_bytes = 0
+            if write_task is not None:
+                total_bytes = await write_task
+                await self.send_event(AudioStop().event())
+                self.audio_open = False
+
+            await self.send_event(SynthesizeStopped().event())
+            _LOGGER.debug("Streaming synthesis complete: %d bytes from %d chunks", total_bytes, chunk_count)
+
+            # The trace ends once the client has received all of the audio
+            await self.send_queue.drain()
+            trace.finish()
+
+        except Exception as err:
+            trace.finish("error")
+            _LOGGER.exception("Error during streaming synthesis: %s", err)
+            try:
+                await self.send_event(Error(text=str(err), code=err.__class__.__name__).event())
+            except ConnectionError:
+                pass
+
+    def _reset_streaming_state(self) -> None:
+        """Clear all per-stream state; a running stream must be cancelled or detached first."""
+        self.streaming_active = False
+        self.streaming_rejected = False
+        self.streaming_speaker: Optional[str] = None
+        self.streaming_buffer = SentenceBuffer()
+        self.streaming_sentences: Optional[asyncio.Queue] = None
+        self.streaming_chunks = 0
+        self.streaming_trace: Optional[RequestTrace] = None
+        self._streaming_task: Optional[asyncio.Task] = None
+
+    async def _write_audio(self, sentences: asyncio.Queue, speaker: Optional[str], trace: RequestTrace) -> int:
+        """Generate sentences as they are queued and send their audio in chunks.
+
+        Args:
+            sentences: Sentences to speak, ended by None
             speaker: Optional speaker name (e.g., "david", "jenny")
+            trace: Trace of the request
 
         Returns:
-            Audio array as numpy array
+            Number of audio bytes sent
         """
-        # KaniTTS API: audio, text = model(text, speaker_id=speaker_name)
-        # Returns audio as numpy array at 22kHz
-        if speaker:
-            audio, _ = self.model(text, speaker_id=speaker)
-            _LOGGER.debug("Generated audio with speaker: %s", speaker)
-        else:
-            audio, _ = self.model(text)
-            _LOGGER.debug("Generated audio with default speaker")
+        loop = asyncio.get_running_loop()
+        framer = AudioFramer(max(1, self.output_rate * self.chunk_ms // 1000))
+        limiter = Limiter(self.sample_rate)
+        resampler = None
+        if self.output_rate != self.sample_rate:
+            resampler = Resampler(self.sample_rate, self.output_rate)
+        total_bytes = 0
+        start_time = time.perf_counter()
+        first_audio_time = None
 
-        # Ensure float32 range [-1, 1]
-        if audio.dtype != np.float32:
-            audio = audio.astype(np.float32)
+        async def send(frames: list[bytes]) -> None:
+            nonlocal total_bytes, first_audio_time
+            for audio_bytes in frames:
+                if first_audio_time is None:
+                    first_audio_time = time.perf_counter() - start_time
+                    trace.mark("first_audio")
+                total_bytes += len(audio_bytes)
+                _METRICS.audio_bytes.inc(len(audio_bytes))
+                with trace.span("queue"):
+                    await self.send_event(
+                        AudioChunk(
+                            rate=self.output_rate,
+                            width=2,  # 16-bit
+                            channels=1,  # mono
+                            audio=audio_bytes,
+                        ).event()
+                    )
 
-        # Normalize if needed
-        max_val = np.abs(audio).max()
-        if max_val > 1.0:
-            audio = audio / max_val
+        def convert(audio: np.ndarray) -> list[bytes]:
+            with trace.span("limit"):
+                audio = limiter.process(audio)
+            if resampler is not None:
+                with trace.span("resample"):
+                    audio = resampler.process(audio)
+            with trace.span("convert"):
+                return list(framer.feed(audio))
 
-        return audio
+        _METRICS.requests_in_flight.inc()
+        try:
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    break
+
+                audio = None
+                if self.audio_cache is not None:
+                    key = self.audio_cache.make_key(speaker, sentence)
+                    # Off the event loop, the volume may be on the network
+                    with trace.span("cache"):
+                        audio = await loop.run_in_executor(None, self.audio_cache.get, key)
+                if audio is None:
+                    with trace.span("inference"):
+                        audio = await self.scheduler.generate(sentence, speaker)
+                    if self.audio_cache is not None:
+                        # Written in the background while the audio is sent
+                        loop.run_in_executor(None, self.audio_cache.put, key, audio)
+                await send(convert(audio))
+
+            if resampler is not None:
+                with trace.span("resample"):
+                    audio = resampler.flush()
+                with trace.span("convert"):
+                    frames = list(framer.feed(audio))
+                await send(frames)
+            audio_bytes = framer.flush()
+            if audio_bytes:
+                await send([audio_bytes])
+        finally:
+            _METRICS.requests_in_flight.dec()
+
+        _METRICS.observe_synthesis(
+            "default" if speaker is None else speaker if speaker in self.voice_names else "other",
+            time.perf_counter() - start_time,
+            first_audio_time,
+            total_bytes / 2 / self.output_rate,
+        )
+        return total_bytes
 
 
 async def main():
@@ -218,6 +1085,134 @@ async def main():
         default=22050,
         help="Audio sample rate in Hz (KaniTTS generates 22kHz audio)",
     )
+    parser.add_argument(
+        "--output-rate",
+        type=int,
+        default=0,
+        help="Sample rate of the audio sent to clients in Hz, e.g. 16000 (default: --sample-rate)",
+    )
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=0.0,
+        help="Time to wait for sentences from other connections before running a generation batch",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=4,
+        help="Maximum number of sentences generated together in one batch",
+    )
+    parser.add_argument(
+        "--inference-workers",
+        type=int,
+        default=1,
+        help="Number of generation batches that may run at the same time",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=32,
+        help="Requests waiting for generation at which new requests are rejected with an error (0 for no limit)",
+    )
+    parser.add_argument(
+        "--torch-threads",
+        type=int,
+        default=0,
+        help="PyTorch intra-op threads (default: the cores divided between the inference workers)",
+    )
+    parser.add_argument(
+        "--torch-interop-threads",
+        type=int,
+        default=0,
+        help="PyTorch inter-op threads (default: PyTorch's choice)",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="bf16",
+        help="Numeric precision of the language model: fp32, bf16 (as loaded), or int8 dynamic quantization "
+             "of its Linear layers only (CPU only, other layers and the audio codec stay fp32)",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Compile the model with torch.compile; compilation happens during warm-up",
+    )
+    parser.add_argument(
+        "--audio-cache-dir",
+        default=None,
+        help="Directory of the persistent audio cache, may be shared by replicas (default: disabled)",
+    )
+    parser.add_argument(
+        "--audio-cache-mb",
+        type=int,
+        default=1024,
+        help="Size limit of the persistent audio cache in MiB",
+    )
+    parser.add_argument(
+        "--warmup-text",
+        default="Hello, how can I help you today?",
+        help="Text generated once at startup before the port opens (empty to skip)",
+    )
+    parser.add_argument(
+        "--chunk-ms",
+        type=int,
+        default=100,
+        help="Duration of each audio chunk sent to clients in milliseconds",
+    )
+    parser.add_argument(
+        "--send-high-watermark",
+        type=int,
+        default=1024,
+        help="KiB of audio queued for a client before synthesis waits for it to read",
+    )
+    parser.add_argument(
+        "--send-low-watermark",
+        type=int,
+        default=256,
+        help="KiB of queued audio below which synthesis resumes after waiting",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve Prometheus metrics on this port at /metrics (0 disables)",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="0.0.0.0",
+        help="Address the metrics endpoint listens on (default: 0.0.0.0)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Log the time spent in each stage of every request as one JSON line",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="Enable the sampling profiler: on SIGUSR1 or when a 'profile-now' file appears in "
+             "this directory, profile the next requests and write the stacks here",
+    )
+    parser.add_argument(
+        "--profile-requests",
+        type=int,
+        default=5,
+        help="Number of requests covered by a profile",
+    )
+    parser.add_argument(
+        "--profile-interval-ms",
+        type=float,
+        default=5.0,
+        help="Sampling interval of the profiler in milliseconds",
+    )
+    parser.add_argument(
+        "--loop-lag-warn-ms",
+        type=float,
+        default=100.0,
+        help="Log a warning when the event loop is blocked for longer than this",
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -232,11 +1227,25 @@ async def main():
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
 
+    if args.trace:
+        # Traces are written as bare JSON lines, without the log prefix
+        trace_handler = logging.StreamHandler()
+        trace_handler.setFormatter(logging.Formatter("%(message)s"))
+        TRACE_LOGGER.addHandler(trace_handler)
+        TRACE_LOGGER.setLevel(logging.INFO)
+        TRACE_LOGGER.propagate = False
+        RequestTrace.enabled = True
+    PROFILER.configure(args.profile_dir, args.profile_requests, args.profile_interval_ms)
+
     _LOGGER.info("Starting Wyoming KaniTTS server")
     _LOGGER.info("Model: %s", args.model)
     _LOGGER.info("Device: %s", args.device)
     _LOGGER.info("URI: %s", args.uri)
 
+    if args.precision == "int8" and args.device != "cpu":
+        _LOGGER.error("int8 precision is only supported on the CPU device")
+        sys.exit(1)
+
     # Configure PyTorch device
     if args.device == "xpu":
         # Check for Intel XPU (native PyTorch 2.7+ support)
@@ -266,6 +1275,7 @@ async def main():
                 ),
                 installed=True,
                 version=VERSION,
+                supports_synthesize_streaming=True,
                 voices=[
                     TtsVoice(
                         name="david",
@@ -351,6 +1361,19 @@ async def main():
             _LOGGER.error("Make sure kani-tts is installed: pip install kani-tts")
             sys.exit(1)
 
+    # Each inference worker runs its own intra-op thread team, so more
+    # threads in total than cores only makes every generation slower
+    threads = args.torch_threads
+    if not threads and args.inference_workers > 1:
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+        threads = max(1, cores // args.inference_workers)
+    if threads:
+        torch.set_num_threads(threads)
+    if args.torch_interop_threads:
+        torch.set_num_interop_threads(args.torch_interop_threads)
+    _LOGGER.info("PyTorch threads: %d intra-op per worker, %d inference worker(s)",
+                 torch.get_num_threads(), args.inference_workers)
+
     # Set PyTorch default device to XPU if requested
     if args.device == "xpu":
         torch.set_default_device("xpu")
@@ -360,11 +1383,44 @@ async def main():
         _LOGGER.info("Set PyTorch default device to CUDA")
 
     # Load model synchronously at startup
+    load_start = time.perf_counter()
     loop = asyncio.get_event_loop()
     _shared_model = await loop.run_in_executor(
         None,
         lambda: KaniTTS(args.model)
     )
+    _METRICS.model_load_seconds.set(time.perf_counter() - load_start)
+    optimized = optimize_model(_shared_model, args.precision, args.compile)
+    if optimized:
+        _LOGGER.info("Precision: %s%s", args.precision, ", compiled" if args.compile else "")
+    else:
+        _LOGGER.warning("Language model not found, running as loaded instead of %s", args.precision)
+
+    scheduler = GenerationScheduler(_shared_model, args.batch_window_ms, args.max_batch,
+                                    args.inference_workers, args.max_queue)
+    _METRICS.queue_depth.set_function(lambda: scheduler.pending)
+    if scheduler.batched:
+        _LOGGER.info("Generating up to %d sentences per batch", scheduler.max_batch)
+    elif args.max_batch > 1:
+        _LOGGER.info("Model doesn't support batched generation, batches run one sentence at a time")
+
+    hooked = install_cancel_hooks(_shared_model)
+    if hooked:
+        _LOGGER.debug("Cancelled requests stop generation in %d model module(s)", hooked)
+    else:
+        _LOGGER.warning("No model modules found, cancelled generations will run to completion")
+
+    audio_cache = None
+    if args.audio_cache_dir and args.audio_cache_mb > 0:
+        namespace = f"{args.model}/{args.precision}/{args.sample_rate}"
+        audio_cache = DiskAudioCache(args.audio_cache_dir, args.audio_cache_mb * 1024 * 1024, namespace)
+        _LOGGER.info("Audio cache in %s: %s", args.audio_cache_dir, audio_cache)
+
+    if args.warmup_text:
+        warmup_start = time.perf_counter()
+        # On a scheduler thread, which is where compiled code and thread pools are used
+        await loop.run_in_executor(scheduler.executor, warm_up, _shared_model, args.warmup_text)
+        _LOGGER.info("Warmed up in %.2fs", time.perf_counter() - warmup_start)
 
     # Check what device the model actually ended up on
     try:
@@ -383,21 +1439,38 @@ async def main():
 
     _LOGGER.info("Model loaded and ready")
 
+    if args.metrics_port > 0:
+        await start_metrics_server(_METRICS, args.metrics_host, args.metrics_port)
+        _LOGGER.info("Serving metrics on port %d", args.metrics_port)
+
     # Start server
     server = AsyncServer.from_uri(args.uri)
 
+    if args.profile_dir:
+        loop.add_signal_handler(signal.SIGUSR1, PROFILER.arm)
+    lag_monitor = asyncio.create_task(monitor_event_loop(_METRICS, warn_seconds=args.loop_lag_warn_ms / 1000))
+
     _LOGGER.info("Server ready")
 
     # Start server with handler factory
-    await server.run(
-        partial(
-            KaniTTSEventHandler,
-            wyoming_info,
-            args.model,
-            args.device,
-            args.sample_rate,
+    try:
+        await server.run(
+            partial(
+                KaniTTSEventHandler,
+                wyoming_info,
+                args.model,
+                args.device,
+                args.sample_rate,
+                args.output_rate,
+                args.send_high_watermark * 1024,
+                args.send_low_watermark * 1024,
+                args.chunk_ms,
+                scheduler,
+                audio_cache,
+            )
         )
-    )
+    finally:
+        lag_monitor.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Code shared by the Wyoming TTS servers in this repository."""
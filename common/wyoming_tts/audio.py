@@ -0,0 +1,269 @@
+"""Audio processing for streaming synthesized speech to clients."""
+
+import math
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+def float_to_int16(audio: np.ndarray) -> np.ndarray:
+    """Convert float audio in [-1, 1] to int16 PCM, passing int16 through."""
+    if audio.dtype == np.int16:
+        return audio
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class AudioFramer:
+    """Convert audio to int16 PCM and re-frame it into fixed-size chunks.
+
+    Samples are converted with saturation straight into a preallocated
+    frame buffer, so no intermediate arrays are created per model output
+    block. Only the payload of each finished frame is copied out.
+
+    Example:
+        >>> framer = AudioFramer(samples_per_frame=2400)
+        >>> for payload in framer.feed(audio):
+        ...     send(payload)
+        >>> send(framer.flush())
+    """
+
+    def __init__(self, samples_per_frame: int):
+        self._frame = np.empty(samples_per_frame, dtype=np.int16)
+        self._scratch = np.empty(samples_per_frame, dtype=np.float32)
+        self._filled = 0
+
+    def feed(self, audio: np.ndarray) -> Iterator[bytes]:
+        """Add audio and yield every frame that is now complete."""
+        frame_size = len(self._frame)
+        pos = 0
+        while pos < len(audio):
+            count = min(len(audio) - pos, frame_size - self._filled)
+            src = audio[pos:pos + count]
+            dst = self._frame[self._filled:self._filled + count]
+
+            if src.dtype == np.int16:
+                dst[:] = src
+            else:
+                scratch = self._scratch[:count]
+                np.multiply(src, 32767.0, out=scratch, casting='unsafe')
+                np.clip(scratch, -32768.0, 32767.0, out=scratch)
+                np.copyto(dst, scratch, casting='unsafe')
+
+            self._filled += count
+            pos += count
+
+            if self._filled == frame_size:
+                self._filled = 0
+                yield self._frame.tobytes()
+
+    def flush(self) -> bytes:
+        """Return the partially filled last frame, if any."""
+        payload = self._frame[:self._filled].tobytes()
+        self._filled = 0
+        return payload
+
+
+class Resampler:
+    """Streaming polyphase resampler for mono audio.
+
+    The rate change is reduced to an integer ratio ``up/down`` and applied
+    with a Kaiser-windowed sinc filter split into ``up`` phases, so each
+    output sample costs ``taps`` multiply-adds. The tail of the input is
+    kept between calls, so audio can be fed in chunks of any size without
+    discontinuities at the chunk boundaries.
+
+    Example:
+        >>> resampler = Resampler(24000, 16000)
+        >>> for audio in chunks:
+        ...     send(resampler.process(audio))
+        >>> send(resampler.flush())
+    """
+
+    def __init__(self, input_rate: int, output_rate: int, taps: int = 32):
+        divisor = math.gcd(input_rate, output_rate)
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        self.taps = taps + taps % 2
+
+        # Low-pass at the lower of both Nyquist frequencies, in cycles per upsampled sample
+        length = self.taps * self.up
+        cutoff = 0.5 * min(1.0 / self.up, 1.0 / self.down) * 0.94
+        t = np.arange(length) - length // 2
+        kernel = 2 * cutoff * self.up * np.sinc(2 * cutoff * t) * np.kaiser(length, 8.0)
+        # phases[p, k] weighs the input sample k positions before the one at phase p
+        self._phases = kernel.reshape(self.taps, self.up).T.astype(np.float32)
+        self._offsets = np.arange(self.taps)
+
+        # Input starts with a zero history, taps // 2 samples of lookahead center the filter
+        self._buffer = np.zeros(self.taps, dtype=np.float32)
+        self._buffer_start = -self.taps
+        self._input_length = 0
+        self._output_index = 0
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Resample the next chunk of float or int16 audio; returns float32 audio."""
+        if audio.dtype == np.int16:
+            audio = audio.astype(np.float32) / 32768.0
+        if self.up == self.down:
+            return audio.astype(np.float32, copy=False)
+
+        self._buffer = np.concatenate((self._buffer, audio.astype(np.float32, copy=False)))
+        self._input_length += len(audio)
+        return self._run(self._buffer_start + len(self._buffer))
+
+    def flush(self) -> np.ndarray:
+        """Return the remaining output once the input has ended."""
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+
+        self._buffer = np.concatenate((self._buffer, np.zeros(self.taps // 2, dtype=np.float32)))
+        end = self._buffer_start + len(self._buffer)
+        # Stop at the output sample matching the last input sample
+        last = -(-self._input_length * self.up // self.down)
+        audio = self._run(end, last)
+        self._buffer = self._buffer[-self.taps:]
+        self._buffer_start = end - len(self._buffer)
+        return audio
+
+    def _run(self, available: int, last: Optional[int] = None) -> np.ndarray:
+        # Output n reads input up to floor(n * down / up) + taps // 2
+        count = ((available - self.taps // 2) * self.up - 1) // self.down + 1 - self._output_index
+        if last is not None:
+            count = min(count, last - self._output_index)
+        if count <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        position = (self._output_index + np.arange(count)) * self.down
+        newest = position // self.up + self.taps // 2 - self._buffer_start
+        window = self._buffer[newest[:, None] - self._offsets[None, :]]
+        audio = np.einsum('nk,nk->n', self._phases[position % self.up], window)
+        self._output_index += count
+
+        # Keep only the input the next output sample can still reach
+        next_newest = self._output_index * self.down // self.up + self.taps // 2
+        drop = max(0, next_newest - self.taps + 1 - self._buffer_start)
+        self._buffer = self._buffer[drop:]
+        self._buffer_start += drop
+        return audio.astype(np.float32, copy=False)
+
+
+def time_stretch(audio: np.ndarray, speed: float, sample_rate: int,
+                 frame_ms: float = 30.0, tolerance_ms: float = 8.0) -> np.ndarray:
+    """Change the tempo of speech without changing its pitch (WSOLA).
+
+    Output frames overlap by half and are taken from around their nominal
+    input position ``speed`` times further along. Each frame is shifted
+    within ``tolerance_ms`` to the position that best continues the
+    previous frame, found with a single cross-correlation over all
+    candidate shifts, so the waveforms line up without phase artifacts.
+
+    Args:
+        audio: Float or int16 mono audio
+        speed: Tempo factor, e.g. 1.25 for 25% faster speech
+        sample_rate: Sample rate of the audio
+        frame_ms: Length of the overlapping frames
+        tolerance_ms: How far a frame may be shifted to align it
+
+    Returns:
+        Float32 audio about ``len(audio) / speed`` samples long
+    """
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768.0
+    audio = audio.astype(np.float32, copy=False)
+    if speed == 1.0 or len(audio) == 0:
+        return audio
+
+    frame = max(2, int(sample_rate * frame_ms / 1000) // 2 * 2)
+    hop = frame // 2
+    tolerance = int(sample_rate * tolerance_ms / 1000)
+    output_length = int(len(audio) / speed)
+    frame_count = output_length // hop + 1
+
+    # Padding keeps every candidate window and continuation inside the buffer
+    padded = np.concatenate((np.zeros(tolerance, dtype=np.float32), audio,
+                             np.zeros(tolerance + frame + hop, dtype=np.float32)))
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame) / frame)).astype(np.float32)
+    output = np.zeros(frame_count * hop + frame, dtype=np.float32)
+    weight = np.zeros_like(output)
+
+    # position is the start of the chosen frame in padded coordinates
+    position = tolerance
+    for k in range(frame_count):
+        if k > 0:
+            # Natural continuation of the previous frame, the best match for this one
+            target = padded[position + hop:position + hop + frame]
+            nominal = int(k * hop * speed)
+            correlation = np.correlate(padded[nominal:nominal + 2 * tolerance + frame], target, 'valid')
+            position = nominal + int(np.argmax(correlation))
+
+        start = k * hop
+        output[start:start + frame] += padded[position:position + frame] * window
+        weight[start:start + frame] += window
+
+    # Undo the window gain where the frames don't fully overlap (first half frame)
+    np.divide(output, weight, out=output, where=weight > 1e-3)
+    return output[:output_length]
+
+
+class Limiter:
+    """Peak limiter for audio that arrives piece by piece.
+
+    Replaces normalizing each utterance by its peak, which needs the whole
+    utterance before the first sample can be sent. The gain is computed
+    per block of a few milliseconds: it drops one block ahead of a peak
+    above the ceiling and recovers exponentially afterwards. Gain changes
+    are interpolated across each block, so limiting doesn't click, and the
+    gain carries over between calls, so sentences of one response are
+    limited consistently. Audio below the ceiling passes through unchanged.
+
+    Example:
+        >>> limiter = Limiter(22050)
+        >>> for audio in sentences:
+        ...     send(limiter.process(audio))
+    """
+
+    def __init__(self, sample_rate: int, ceiling: float = 0.98, block_ms: float = 5.0,
+                 release_ms: float = 100.0):
+        """Initialize the limiter.
+
+        Args:
+            sample_rate: Sample rate of the audio in Hz
+            ceiling: Highest allowed absolute sample value
+            block_ms: Length of the blocks the gain is computed for in milliseconds
+            release_ms: Time constant of the gain recovering after a peak in milliseconds
+        """
+        self.ceiling = ceiling
+        self.block = max(1, int(sample_rate * block_ms / 1000))
+        self.release = math.exp(-block_ms / release_ms)
+        self.gain = 1.0
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Limit the next piece of float audio; returns float32 audio."""
+        audio = audio.astype(np.float32, copy=False)
+        if len(audio) == 0:
+            return audio
+
+        starts = np.arange(0, len(audio), self.block)
+        peaks = np.maximum.reduceat(np.abs(audio), starts)
+        if self.gain >= 1.0 and peaks.max() <= self.ceiling:
+            return audio
+
+        targets = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-9))
+        # Reach the gain of a block by the end of the block before it
+        targets[:-1] = np.minimum(targets[:-1], targets[1:])
+
+        gains = np.empty(len(targets))
+        gain = self.gain
+        for i, target in enumerate(targets):
+            gain = target if target < gain else target + (gain - target) * self.release
+            gains[i] = gain
+        start_gain = min(self.gain, gains[0])
+        self.gain = gain
+
+        # Gain at the last sample of every block, interpolated in between
+        ends = np.minimum(starts + self.block, len(audio)) - 1
+        envelope = np.interp(np.arange(len(audio)), np.concatenate(([-1], ends)),
+                             np.concatenate(([start_gain], gains)))
+        return (audio * envelope).astype(np.float32)
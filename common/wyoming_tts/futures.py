@@ -0,0 +1,13 @@
+"""Helpers for resolving asyncio futures from scheduler tasks."""
+
+import asyncio
+
+
+def set_future_result(future: asyncio.Future, result) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def set_future_exception(future: asyncio.Future, err: Exception) -> None:
+    if not future.done():
+        future.set_exception(err)
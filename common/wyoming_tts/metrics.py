@@ -0,0 +1,186 @@
+"""Runtime metrics in the Prometheus text format."""
+
+import asyncio
+from typing import Any, Callable, Optional
+
+
+class _Metric:
+    """Base class for metrics in the Prometheus text format."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    @staticmethod
+    def _escape(value) -> str:
+        """Escape a label value for the text format."""
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    def _label_str(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{self._escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._label_str(key)} {value}" for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, *labels) -> None:
+        self.inc(-amount, *labels)
+
+    def set_function(self, function: Callable[[], Any]) -> None:
+        """Report the return value of function at scrape time.
+
+        For a gauge with labels, function returns a mapping of label values to values.
+        """
+        self._function = function
+
+    def samples(self) -> list[str]:
+        if self._function is not None:
+            if self.labels:
+                return [f"{self.name}{self._label_str(key)} {value}" for key, value in self._function().items()]
+            return [f"{self.name} {self._function()}"]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        self._counts: dict[tuple, list[int]] = {}
+        self._sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        counts = self._counts.setdefault(labels, [0] * (len(self.buckets) + 1))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self._sums[labels] = self._sums.get(labels, 0.0) + value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {count}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {counts[-1]}")
+        return lines
+
+
+class Metrics:
+    """Runtime metrics of the server, exposed on /metrics when enabled.
+
+    These are the metrics every server has; a server adds its own ones as
+    attributes in a subclass, they are rendered as well.
+    """
+
+    def __init__(self):
+        self.time_to_first_audio = Histogram(
+            "wyoming_tts_time_to_first_audio_seconds",
+            "Time from the start of synthesis to the first audio chunk", ("voice",))
+        self.synthesis_seconds = Histogram(
+            "wyoming_tts_synthesis_seconds",
+            "Time from the start of synthesis to the last audio chunk", ("voice",))
+        self.real_time_factor = Histogram(
+            "wyoming_tts_real_time_factor",
+            "Synthesis time divided by the duration of the audio", ("voice",),
+            buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0))
+        self.audio_bytes = Counter(
+            "wyoming_tts_audio_bytes_total", "PCM audio bytes sent to clients")
+        self.events = Counter(
+            "wyoming_tts_events_sent_total", "Wyoming events sent to clients", ("type",))
+        self.requests_in_flight = Gauge(
+            "wyoming_tts_requests_in_flight", "Synthesis requests currently being processed")
+        self.queue_depth = Gauge(
+            "wyoming_tts_inference_queue_depth", "Inference jobs waiting for or running on the executor")
+        self.model_load_seconds = Gauge(
+            "wyoming_tts_model_load_seconds", "Time taken to load the model at startup")
+        self.cancelled_requests = Counter(
+            "wyoming_tts_cancelled_requests_total",
+            "Synthesis requests stopped early because the client went away or sent a new request",
+            ("reason",))
+        self.send_queue_bytes = Gauge(
+            "wyoming_tts_send_queue_bytes", "Audio bytes produced and waiting to be written to clients")
+        self.send_stalls = Counter(
+            "wyoming_tts_send_stalls_total", "Times synthesis waited for a client to read queued audio")
+        self.event_loop_lag = Histogram(
+            "wyoming_tts_event_loop_lag_seconds", "Delay of the event loop in running a scheduled wake-up",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+    def observe_synthesis(self, voice: str, seconds: float, first_audio_seconds: Optional[float],
+                          audio_seconds: float) -> None:
+        """Record the timings of one finished synthesis request."""
+        self.synthesis_seconds.observe(seconds, voice)
+        if first_audio_seconds is not None:
+            self.time_to_first_audio.observe(first_audio_seconds, voice)
+        if audio_seconds > 0:
+            self.real_time_factor.observe(seconds / audio_seconds, voice)
+
+    def render(self) -> str:
+        metrics = [m for m in vars(self).values() if isinstance(m, _Metric)]
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+async def start_metrics_server(metrics: Metrics, host: str, port: int) -> asyncio.AbstractServer:
+    """Serve metrics in the Prometheus text format on http://host:port/metrics."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            # Skip the request headers
+            while (await reader.readline()).strip():
+                pass
+
+            parts = request_line.decode(errors="replace").split()
+            if len(parts) >= 2 and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
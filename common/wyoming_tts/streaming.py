@@ -0,0 +1,123 @@
+"""Writing of outgoing events to slow clients without blocking synthesis."""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from wyoming.event import Event
+
+from .metrics import Metrics
+
+
+class SendQueue:
+    """Bounded queue of outgoing events, drained by a separate writer task.
+
+    Producers only wait once more than ``high_watermark`` payload bytes
+    are queued, and then until the writer has brought the queue down to
+    ``low_watermark``, so a client that reads slowly only delays its own
+    connection. An event is always accepted into an empty queue, whatever
+    its size. A write error stops the writer and is raised by the next
+    put() or drain().
+    """
+
+    def __init__(self, write: Callable[[Event], Awaitable[None]], high_watermark: int, low_watermark: int,
+                 metrics: Metrics):
+        """Initialize the queue.
+
+        Args:
+            write: Coroutine function that writes one event to the client
+            high_watermark: Queued payload bytes at which producers wait
+            low_watermark: Queued payload bytes at which waiting producers resume
+            metrics: Metrics of the server, for the queued bytes and stalls
+        """
+        self._write = write
+        self._metrics = metrics
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.size = 0
+        self._events: deque[Event] = deque()
+        self._ready = asyncio.Event()
+        self._below_low = asyncio.Event()
+        self._below_low.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[Exception] = None
+
+    async def put(self, event: Event) -> None:
+        """Queue an event, waiting while the client is too far behind."""
+        if self._error is not None:
+            raise self._error
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        if self._events and self.size >= self.high_watermark:
+            self._metrics.send_stalls.inc()
+            self._below_low.clear()
+            await self._below_low.wait()
+            if self._error is not None:
+                raise self._error
+
+        size = len(event.payload or b"")
+        self._events.append(event)
+        self.size += size
+        self._metrics.send_queue_bytes.inc(size)
+        self._idle.clear()
+        self._ready.set()
+
+    async def drain(self) -> None:
+        """Wait until every queued event has been written."""
+        await self._idle.wait()
+        if self._error is not None:
+            raise self._error
+
+    def discard(self, predicate: Callable[[Event], bool] = lambda event: True) -> int:
+        """Drop queued events that were not written yet.
+
+        Args:
+            predicate: Selects the events to drop, all of them by default
+
+        Returns:
+            Number of dropped events
+        """
+        kept = deque(event for event in self._events if not predicate(event))
+        discarded = len(self._events) - len(kept)
+        size = sum(len(event.payload or b"") for event in kept)
+        self._metrics.send_queue_bytes.dec(self.size - size)
+        self._events, self.size = kept, size
+        if self.size <= self.low_watermark:
+            self._below_low.set()
+        return discarded
+
+    async def close(self) -> None:
+        """Stop the writer and drop whatever is still queued."""
+        self.discard()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._idle.set()
+
+    async def _run(self) -> None:
+        while True:
+            if not self._events:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            event = self._events.popleft()
+            size = len(event.payload or b"")
+            self.size -= size
+            self._metrics.send_queue_bytes.dec(size)
+            if self.size <= self.low_watermark:
+                self._below_low.set()
+
+            try:
+                await self._write(event)
+            except Exception as err:
+                self._error = err
+                self.discard()
+                self._below_low.set()
+                self._idle.set()
+                return
@@ -0,0 +1,212 @@
+"""Splitting of incoming text into the sentences and segments that are synthesized."""
+
+import re
+from typing import Callable, Optional
+
+
+def split_into_sentences(text: str) -> list[str]:
+    """Split text into sentences at punctuation boundaries.
+
+    Args:
+        text: Input text to split
+
+    Returns:
+        List of sentences with normalized whitespace
+
+    Example:
+        >>> split_into_sentences("Hello world! How are you? I'm doing great.")
+        ['Hello world!', 'How are you?', "I'm doing great."]
+    """
+    text = ' '.join(text.strip().split())
+    return [sentence for sentence in re.split(r'(?<=[.!?])\s+', text) if sentence]
+
+
+class TextSegmenter:
+    """Group sentences into segments sized for latency and throughput.
+
+    The first segment of a response is kept short so audio starts quickly:
+    a short first sentence is spoken on its own, and a longer one is cut at
+    its first clause boundary (comma, semicolon, colon, dash), or at a word
+    when it has none. Later sentences are packed together up to a target size to
+    avoid many tiny inferences, and long ones are split at clause
+    boundaries. No segment exceeds the maximum size. Sentences the caller
+    marks as standalone, e.g. because their audio is cached per sentence,
+    are kept as segments of their own.
+
+    Sizes are measured in characters as an inexpensive proxy for the
+    number of phonemes, which is only known after phonemization.
+
+    Example:
+        >>> segmenter = TextSegmenter(first_chars=30, target_chars=80)
+        >>> segmenter.segment(["Sure, here is the forecast for today.", "Ok.", "Sunny."])
+        ['Sure,', 'here is the forecast for today. Ok. Sunny.']
+    """
+
+    _CLAUSE_BOUNDARY = re.compile(r'(?<=[,;:])\s+|\s+(?=[-\u2013\u2014]\s)')
+    # A shorter first segment sounds clipped and gains little latency
+    MIN_FIRST_CHARS = 4
+
+    def __init__(self, first_chars: int = 60, target_chars: int = 200, max_chars: int = 400):
+        """Initialize the segmenter.
+
+        Args:
+            first_chars: Size within which the first segment ends, at a clause boundary if possible (0 disables)
+            target_chars: Size up to which sentences are merged and beyond which they are split (0 keeps sentences)
+            max_chars: Size no segment exceeds
+
+        Raises:
+            ValueError: If a size is negative, max_chars isn't positive or target_chars exceeds it
+        """
+        if max_chars <= 0:
+            raise ValueError(f"Maximum segment size must be positive, got {max_chars}")
+        if first_chars < 0 or target_chars < 0:
+            raise ValueError("Segment sizes must not be negative")
+        if target_chars > max_chars:
+            raise ValueError(f"Target segment size {target_chars} exceeds the maximum of {max_chars}")
+        self.first_chars = first_chars
+        self.target_chars = target_chars
+        self.max_chars = max_chars
+        self.started = False
+
+    def first_clause_end(self, text: str) -> Optional[int]:
+        """Return where a short first segment could end in text, if anywhere."""
+        for match in self._CLAUSE_BOUNDARY.finditer(text):
+            if match.start() > self.first_chars:
+                break
+            if match.start() >= self.MIN_FIRST_CHARS:
+                return match.start()
+        return None
+
+    def _first_word_end(self, text: str) -> Optional[int]:
+        """Return the last word boundary within the first segment size, if any."""
+        end = text.rfind(" ", 0, self.first_chars + 1)
+        return end if end >= self.MIN_FIRST_CHARS else None
+
+    def segment(self, sentences: list[str], standalone: Optional[Callable[[str], bool]] = None) -> list[str]:
+        """Turn finished sentences into segments; sentences are not held back for later calls.
+
+        Args:
+            sentences: Finished sentences in order
+            standalone: Tells which sentences become a segment of their own, neither merged nor cut
+
+        Returns:
+            Segments in order
+        """
+        segments = []
+        current = ""
+        for sentence in sentences:
+            if standalone is not None and standalone(sentence):
+                self.started = True
+                if current:
+                    segments.append(current)
+                    current = ""
+                segments.append(sentence)
+                continue
+
+            if not self.started:
+                self.started = True
+                if self.first_chars > 0 and len(sentence) <= self.first_chars:
+                    segments.append(sentence)
+                    continue
+                if self.first_chars > 0:
+                    end = self.first_clause_end(sentence)
+                    if end is None:
+                        end = self._first_word_end(sentence)
+                    if end is not None:
+                        segments.append(sentence[:end].strip())
+                        sentence = sentence[end:].strip()
+
+            for piece in self._split_long(sentence):
+                if current and len(current) + 1 + len(piece) <= self.target_chars:
+                    current += " " + piece
+                else:
+                    if current:
+                        segments.append(current)
+                    current = piece
+
+        if current:
+            segments.append(current)
+        return segments
+
+    def _split_long(self, text: str) -> list[str]:
+        """Split text longer than the target at clause boundaries, or at words where there are none."""
+        limit = self.target_chars if self.target_chars > 0 else self.max_chars
+        pieces = []
+        while len(text) > limit:
+            # Prefer the last clause boundary within the target, else the first beyond it
+            cut = None
+            for match in self._CLAUSE_BOUNDARY.finditer(text, 0, min(len(text), self.max_chars) + 1):
+                if match.start() <= self.MIN_FIRST_CHARS:
+                    continue
+                if cut is None or match.start() <= limit:
+                    cut = match.start()
+                if cut > limit or match.start() > limit:
+                    break
+
+            if cut is None:
+                # No clause boundary, fall back to the last word within the target
+                cut = text.rfind(" ", 0, limit + 1)
+                if cut <= 0:
+                    cut = text.find(" ", limit, self.max_chars + 1)
+                if cut <= 0:
+                    if len(text) <= self.max_chars:
+                        break
+                    cut = self.max_chars
+
+            pieces.append(text[:cut].strip())
+            text = text[cut:].strip()
+
+        if text:
+            pieces.append(text)
+        return pieces
+
+
+class SentenceBuffer:
+    """Incrementally detect finished sentences in streamed text.
+
+    Text is fed in arbitrary pieces (e.g. LLM tokens). A sentence is only
+    considered finished once its closing punctuation is followed by
+    whitespace, so "3." in "3.5" is never split early.
+
+    Example:
+        >>> buffer = SentenceBuffer()
+        >>> buffer.feed("Hello world! How")
+        ['Hello world!']
+        >>> buffer.feed(" are you?")
+        []
+        >>> buffer.flush()
+        ['How are you?']
+    """
+
+    _BOUNDARY = re.compile(r'[.!?]\s+')
+
+    def __init__(self):
+        self._text = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add text and return any sentences that are now complete."""
+        self._text += text
+
+        end = None
+        for match in self._BOUNDARY.finditer(self._text):
+            end = match.end()
+
+        if end is None:
+            return []
+
+        finished, self._text = self._text[:end], self._text[end:]
+        return split_into_sentences(finished)
+
+    def take_first_clause(self, segmenter: TextSegmenter) -> Optional[str]:
+        """Remove and return a leading clause that can be spoken before its sentence is finished."""
+        text = self._text.lstrip()
+        end = segmenter.first_clause_end(text)
+        if end is None:
+            return None
+        self._text = text[end:]
+        return ' '.join(text[:end].split())
+
+    def flush(self) -> list[str]:
+        """Return whatever text remains as the final sentences."""
+        remaining, self._text = self._text, ""
+        return split_into_sentences(remaining)
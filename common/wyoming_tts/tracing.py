@@ -0,0 +1,189 @@
+"""Request traces, sampling profiles and event loop monitoring."""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """Statistical profiler for the next few requests, armed at runtime.
+
+    Once armed, by SIGUSR1 or by creating the file ``profile-now`` in the
+    output directory, a background thread samples the stacks of all
+    threads every ``interval_ms`` from the start of the next request until
+    ``requests`` requests that started while profiling have ended. The
+    stacks are written to the output directory in the collapsed format
+    ("frame;frame;frame count" per line) read by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self):
+        self.output_dir: Optional[str] = None
+        self.requests = 5
+        self.interval = 0.005
+        self._armed = 0
+        self._remaining = 0
+        self._window = 0
+        self._samples: dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def configure(self, output_dir: Optional[str], requests: int, interval_ms: float) -> None:
+        self.output_dir = output_dir
+        self.requests = max(1, requests)
+        self.interval = interval_ms / 1000
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def arm(self) -> None:
+        """Profile the next requests."""
+        if self.output_dir and self._thread is None:
+            self._armed = self.requests
+            _LOGGER.info("Profiling the next %d request(s) into %s", self._armed, self.output_dir)
+
+    def request_started(self) -> int:
+        """Start sampling if armed; returns the profiling window of the request, 0 if none."""
+        if not self.output_dir:
+            return 0
+
+        if not self._armed and self._thread is None:
+            trigger = os.path.join(self.output_dir, "profile-now")
+            if os.path.exists(trigger):
+                os.remove(trigger)
+                self.arm()
+
+        if self._armed and self._thread is None:
+            self._remaining, self._armed = self._armed, 0
+            self._window += 1
+            self._samples = {}
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        return self._window if self._thread is not None and not self._stop.is_set() else 0
+
+    def request_finished(self, window: int) -> None:
+        """Count a profiled request as ended and stop sampling after the last one."""
+        if window != self._window:
+            return
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._stop.set()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        start = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+        path = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S.txt"))
+        with open(path, "w") as file:
+            for stack, count in sorted(self._samples.items()):
+                file.write(f"{stack} {count}\n")
+        _LOGGER.info("Wrote profile of %.1fs with %d samples to %s", time.perf_counter() - start,
+                     sum(self._samples.values()), path)
+        self._thread = None
+
+
+# Profiler of this process, shared by all connections
+PROFILER = SamplingProfiler()
+
+
+# Receives one JSON line per request when tracing is enabled
+TRACE_LOGGER = logging.getLogger("wyoming_tts.trace")
+
+
+class RequestTrace:
+    """Timing spans of the stages of one synthesis request.
+
+    Stages that run several times per request are summed up with a count.
+    With tracing enabled the trace is logged as one JSON line when the
+    request ends.
+
+    Example:
+        >>> trace = RequestTrace("synthesize", voice="david")
+        >>> with trace.span("inference"):
+        ...     audio = await generate()
+        >>> trace.finish()
+    """
+
+    enabled = False
+    _ids = itertools.count(1)
+
+    def __init__(self, request: str, **fields):
+        self.id = next(RequestTrace._ids)
+        self.request = request
+        self.fields = fields
+        self.start = time.perf_counter()
+        self.spans: dict[str, list] = {}
+        self.finished = False
+        self.profiled = PROFILER.request_started()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += seconds
+        span[1] += 1
+
+    def mark(self, name: str) -> None:
+        """Record the time since the start of the request, once."""
+        self.fields.setdefault(f"{name}_ms", round((time.perf_counter() - self.start) * 1000, 3))
+
+    def finish(self, status: str = "ok") -> None:
+        if self.finished:
+            return
+        self.finished = True
+        if self.profiled:
+            PROFILER.request_finished(self.profiled)
+        if not RequestTrace.enabled:
+            return
+
+        TRACE_LOGGER.info(json.dumps({
+            "trace_id": self.id,
+            "request": self.request,
+            "status": status,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            **self.fields,
+            "spans": {name: {"ms": round(seconds * 1000, 3), "count": count}
+                      for name, (seconds, count) in self.spans.items()},
+        }))
+
+
+async def monitor_event_loop(metrics: Metrics, interval: float = 0.5, warn_seconds: float = 0.1) -> None:
+    """Measure how late the event loop wakes up, i.e. how long callbacks block it."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        metrics.event_loop_lag.observe(lag)
+        if lag > warn_seconds:
+            _LOGGER.warning("Event loop was blocked for %.0f ms", lag * 1000)
@@ -0,0 +1,105 @@
+"""Stub of torch for running the KaniTTS server without PyTorch installed.
+
+Tensors are numpy arrays with the few torch methods the server and the
+kani_tts stub use; modules run their forward pre-hooks like torch does.
+"""
+
+import contextlib
+import os
+import types
+
+import numpy as np
+
+__version__ = "stub"
+
+int64 = np.int64
+float32 = np.float32
+bfloat16 = qint8 = None
+
+
+class Tensor(np.ndarray):
+    def nonzero(self, as_tuple=False):
+        indices = np.nonzero(np.asarray(self))
+        if as_tuple:
+            return tuple(index.view(Tensor) for index in indices)
+        return np.stack(indices, axis=-1).view(Tensor)
+
+    def unsqueeze(self, dim):
+        return np.expand_dims(self, dim)
+
+
+def tensor(data, dtype=None):
+    return np.array(data, dtype=dtype).view(Tensor)
+
+
+def full(size, fill_value, dtype=None):
+    return np.full(size, fill_value, dtype=dtype).view(Tensor)
+
+
+def zeros(*size, dtype=None):
+    return np.zeros(size[0] if len(size) == 1 else size, dtype=dtype).view(Tensor)
+
+
+def ones(*size, dtype=None):
+    return np.ones(size[0] if len(size) == 1 else size, dtype=dtype).view(Tensor)
+
+
+def cat(tensors, dim=0):
+    return np.concatenate(tensors, axis=dim).view(Tensor)
+
+
+class Module:
+    def __init__(self):
+        self._forward_pre_hooks = []
+
+    def __call__(self, *args):
+        for hook in self._forward_pre_hooks:
+            hook(self, args)
+        return self.forward(*args)
+
+    def register_forward_pre_hook(self, hook):
+        self._forward_pre_hooks.append(hook)
+
+    def eval(self):
+        return self
+
+    def float(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+
+nn = types.SimpleNamespace(Module=Module, Linear=type("Linear", (Module,), {}))
+ao = types.SimpleNamespace(quantization=types.SimpleNamespace(
+    quantize_dynamic=lambda module, *args, **kwargs: module))
+
+cuda = xpu = types.SimpleNamespace(is_available=lambda: False, device_count=lambda: 0)
+
+
+def inference_mode(*args, **kwargs):
+    return contextlib.nullcontext()
+
+
+def compile(function, **kwargs):
+    return function
+
+
+def set_default_device(device):
+    pass
+
+
+def set_num_threads(threads):
+    pass
+
+
+def set_num_interop_threads(threads):
+    pass
+
+
+def get_num_threads():
+    return os.cpu_count() or 1
+
+
+def manual_seed(seed):
+    pass
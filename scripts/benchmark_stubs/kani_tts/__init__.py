@@ -0,0 +1,105 @@
+"""Stub of kani_tts with the structure of kani-tts 0.0.4.
+
+The wrapper holds a KaniModel, which holds the language model and the
+player, so the server finds the same methods and modules as with the real
+package: batched generation, precision changes and cancellation hooks all
+run against it. The language model emits four codec tokens per audio
+frame in forward passes that sleep for their share of the inference time.
+"""
+
+import torch
+
+from stub_backend import CHARS_PER_SECOND, simulate_inference, tone
+
+TOKENISER_LENGTH = 64400
+FRAMES_PER_SECOND = 12.5
+CODEBOOKS = 4
+
+
+class NemoAudioPlayer:
+    def __init__(self):
+        self.sample_rate = 22050
+        self.end_of_text = 2
+        self.start_of_speech = TOKENISER_LENGTH + 1
+        self.end_of_speech = TOKENISER_LENGTH + 2
+        self.start_of_human = TOKENISER_LENGTH + 3
+        self.end_of_human = TOKENISER_LENGTH + 4
+        self.pad_token = TOKENISER_LENGTH + 7
+        self.audio_tokens_start = TOKENISER_LENGTH + 10
+        self.codebook_size = 4032
+
+    def get_waveform(self, out_ids):
+        out_ids = [int(token) for token in out_ids.reshape(-1)]
+        # Like the real player this fails unless there is exactly one start and end of speech
+        start = out_ids.index(self.start_of_speech)
+        end = out_ids.index(self.end_of_speech)
+        if out_ids.count(self.end_of_speech) != 1 or start >= end or (end - start - 1) % CODEBOOKS:
+            raise ValueError("Invalid audio codes sequence!")
+        frames = (end - start - 1) // CODEBOOKS
+        return tone(frames / FRAMES_PER_SECOND, self.sample_rate), None
+
+
+class LanguageModel(torch.nn.Module):
+    def __init__(self, player):
+        super().__init__()
+        self.player = player
+
+    def forward(self, input_ids):
+        # One decoding step of one codec token for all rows
+        simulate_inference(1 / FRAMES_PER_SECOND / CODEBOOKS)
+
+    def speech(self, text_length):
+        frames = max(1, round(max(text_length, 1) / CHARS_PER_SECOND * FRAMES_PER_SECOND))
+        codes = [self.player.audio_tokens_start + self.player.codebook_size * (i % CODEBOOKS) + i % 100
+                 for i in range(frames * CODEBOOKS)]
+        return [self.player.start_of_speech, *codes, self.player.end_of_speech]
+
+    def generate(self, input_ids, attention_mask, max_new_tokens=1200, eos_token_id=None, **kwargs):
+        # The prompt is start of human, the text, end of text and end of human
+        rows = [self.speech(int(attention_mask[row].sum()) - 3)[:max_new_tokens]
+                for row in range(input_ids.shape[0])]
+        steps = max(len(tokens) for tokens in rows)
+        for _ in range(steps):
+            self(input_ids)
+        # Rows that are done are filled up with the end of speech, like generate() pads with eos
+        generated = [tokens + [eos_token_id] * (steps - len(tokens)) for tokens in rows]
+        return torch.cat([input_ids, torch.tensor(generated, dtype=input_ids.dtype)], dim=1)
+
+
+class KaniModel:
+    def __init__(self, player):
+        self.player = player
+        self.model = LanguageModel(player)
+
+    def get_input_ids(self, text_prompt, speaker_id=None):
+        if speaker_id is not None:
+            text_prompt = f"{speaker_id.strip()}: {text_prompt}"
+        tokens = [self.player.start_of_human, *(100 + ord(c) % 60000 for c in text_prompt),
+                  self.player.end_of_text, self.player.end_of_human]
+        input_ids = torch.tensor([tokens], dtype=torch.int64)
+        return input_ids, torch.ones(1, len(tokens), dtype=torch.int64)
+
+    def model_request(self, input_ids, attention_mask):
+        return self.model.generate(input_ids=input_ids, attention_mask=attention_mask,
+                                   eos_token_id=self.player.end_of_speech)
+
+    def run_model(self, text, speaker_id=None):
+        input_ids, attention_mask = self.get_input_ids(text, speaker_id)
+        audio, _ = self.player.get_waveform(self.model_request(input_ids, attention_mask))
+        return audio, text
+
+
+class KaniTTS:
+    def __init__(self, model_name, *args, **kwargs):
+        self.model_name = model_name
+        self.player = NemoAudioPlayer()
+        self.model = KaniModel(self.player)
+        self.status = "singlspeaker"
+        self.speaker_list = []
+        self.sample_rate = self.player.sample_rate
+
+    def __call__(self, text, speaker_id=None):
+        return self.generate(text, speaker_id)
+
+    def generate(self, text, speaker_id=None):
+        return self.model.run_model(text, speaker_id)
@@ -0,0 +1,62 @@
+"""Stub of kokoro_onnx: same interface, audio is a tone of a plausible length."""
+
+import re
+
+import numpy as np
+from onnxruntime import InferenceSession
+
+from . import config, log, trim
+from .config import MAX_PHONEME_LENGTH, SAMPLE_RATE
+
+VOICES = ("af_heart", "af_bella", "am_adam", "bf_emma", "bm_george")
+
+
+class Tokenizer:
+    def phonemize(self, text, lang="en-us"):
+        return text.lower()
+
+    def tokenize(self, phonemes):
+        return [ord(c) % 178 for c in phonemes]
+
+
+class Kokoro:
+    def __init__(self, model_path="", voices_path="", espeak_config=None, vocab_config=None):
+        self.sess = InferenceSession(model_path)
+        rng = np.random.default_rng(0)
+        self.voices = {name: rng.random((MAX_PHONEME_LENGTH, 1, 256), dtype=np.float32) for name in VOICES}
+        self.tokenizer = Tokenizer()
+
+    @classmethod
+    def from_session(cls, session, voices_path, espeak_config=None, vocab_config=None):
+        instance = cls()
+        instance.sess = session
+        return instance
+
+    def get_voice_style(self, name):
+        return self.voices[name]
+
+    def get_voices(self):
+        return sorted(self.voices)
+
+    def _split_phonemes(self, phonemes):
+        batches, current = [], ""
+        for part in re.split(r"([.,!?;])", phonemes):
+            part = part.strip()
+            if not part:
+                continue
+            if len(current) + len(part) + 1 >= MAX_PHONEME_LENGTH:
+                batches.append(current.strip())
+                current = part
+            elif part in ".,!?;":
+                current += part
+            else:
+                current += (" " if current else "") + part
+        if current:
+            batches.append(current.strip())
+        return batches
+
+    def _create_audio(self, phonemes, voice, speed):
+        phonemes = phonemes[:MAX_PHONEME_LENGTH]
+        tokens = self.tokenizer.tokenize(phonemes)
+        inputs = {"input_ids": [[0, *tokens, 0]], "style": voice[len(tokens)], "speed": speed}
+        return self.sess.run(None, inputs)[0], SAMPLE_RATE
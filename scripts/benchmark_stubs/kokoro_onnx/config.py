@@ -0,0 +1,2 @@
+MAX_PHONEME_LENGTH = 510
+SAMPLE_RATE = 24000
@@ -0,0 +1,4 @@
+import logging
+
+log = logging.getLogger("kokoro_onnx")
+logging.basicConfig(format="%(levelname)s [%(name)s] %(message)s")
@@ -0,0 +1,5 @@
+import numpy as np
+
+
+def trim(audio, *args, **kwargs):
+    return audio, np.array([0, len(audio)])
@@ -0,0 +1,31 @@
+"""Stub of onnxruntime: sessions return a tone as long as the input would speak."""
+
+from stub_backend import fake_audio
+
+
+class Input:
+    def __init__(self, name):
+        self.name = name
+
+
+class SessionOptions:
+    pass
+
+
+class InferenceSession:
+    def __init__(self, model_path, sess_options=None, providers=None, provider_options=None):
+        self._model_path = model_path
+        self._providers = providers or ["CPUExecutionProvider"]
+
+    def get_inputs(self):
+        return [Input("input_ids"), Input("style"), Input("speed")]
+
+    def get_providers(self):
+        return self._providers
+
+    def run(self, output_names, inputs):
+        return [fake_audio(len(inputs["input_ids"][0]) - 2, 24000)]
+
+
+def get_available_providers():
+    return ["CPUExecutionProvider"]
@@ -0,0 +1,40 @@
+"""Shared pieces of the stub model backends used by tts-benchmark.py
+
+The stub packages in this directory stand in for kokoro_onnx, onnxruntime,
+kani_tts and (when it isn't installed) torch. They are plain modules on
+sys.path rather than entries in sys.modules, so worker processes spawned by
+a server import them as well. The simulated real-time factor is read from
+the environment for the same reason.
+"""
+
+import os
+import time
+
+import numpy as np
+
+# Seconds of inference per second of audio, set by tts-benchmark.py --stub-rtf
+RTF_VARIABLE = "TTS_BENCHMARK_STUB_RTF"
+
+# Speaking rate the stubs turn text into audio at
+CHARS_PER_SECOND = 15.0
+
+
+def stub_rtf() -> float:
+    return float(os.environ.get(RTF_VARIABLE, "0"))
+
+
+def simulate_inference(audio_seconds: float) -> None:
+    """Sleep for the inference time of audio_seconds; sleeping releases the GIL like ONNX Runtime and torch do."""
+    time.sleep(audio_seconds * stub_rtf())
+
+
+def tone(seconds: float, sample_rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32)
+    return (0.3 * np.sin(2 * np.pi * 220 * t / sample_rate)).astype(np.float32)
+
+
+def fake_audio(length: int, sample_rate: int) -> np.ndarray:
+    """Audio for a text of length characters, after the simulated inference time."""
+    seconds = max(length, 1) / CHARS_PER_SECOND
+    simulate_inference(seconds)
+    return tone(seconds, sample_rate)
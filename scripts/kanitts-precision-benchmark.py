@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Speed and output similarity of KaniTTS inference modes
+
+Every mode (a precision, optionally with torch.compile) loads the model,
+prepares it the way the server's --precision/--compile options do, warms
+it up and generates a set of texts. Reported per mode as JSON: warm-up
+time, process CPU and wall time, real-time factor (wall time per second
+of audio) and how close the audio is to the fp32 output. The precision
+applies to the language model, which KaniTTS loads in bfloat16; fp32
+converts it to float32, so the reference is a real float32 run.
+
+KaniTTS samples its audio tokens, so waveforms of two runs never match,
+not even at fp32. Generation is seeded identically per text in every
+mode, and the audio is compared by the correlation of its long-term
+spectra (the timbre of the voice) and its duration. The fp32 entry is
+compared with fp32 under other seeds; a mode that stays close to that
+baseline is as good as fp32 can tell.
+
+Run it where the model is available, e.g. in the wyoming-kanitts image:
+    python kanitts-precision-benchmark.py --modes fp32,bf16,int8,int8+compile --output results.json
+    python kanitts-precision-benchmark.py --stub
+
+With --stub the model is replaced by the stub backend of tts-benchmark.py,
+which only checks that the script runs; none of the figures are meaningful.
+
+Requires: kani-tts, torch, wyoming, numpy
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SERVER = REPO_ROOT / "charts/wyoming-kanitts/docker/wyoming_kanitts.py"
+COMMON = REPO_ROOT / "common"
+
+TEXTS = [
+    "Turned on the kitchen light.",
+    "Good morning! It is 7 degrees and cloudy outside.",
+    "You have three events on your calendar, starting with a dentist appointment at ten.",
+]
+
+
+def load_module(name: str, path: Path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def long_term_spectrum(audio: np.ndarray, frame: int = 1024, hop: int = 256) -> np.ndarray:
+    """Average magnitude spectrum of the audio in dB."""
+    if len(audio) < frame:
+        audio = np.pad(audio, (0, frame - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame)[::hop] * np.hanning(frame)
+    magnitude = np.abs(np.fft.rfft(frames, axis=1)).mean(axis=0)
+    return 20 * np.log10(magnitude + 1e-9)
+
+
+def similarity(reference: np.ndarray, audio: np.ndarray) -> dict:
+    """Spectral correlation and duration ratio of audio compared to the reference."""
+    correlation = np.corrcoef(long_term_spectrum(reference), long_term_spectrum(audio))[0, 1]
+    return {
+        "spectral_correlation": float(correlation),
+        "duration_ratio": len(audio) / len(reference) if len(reference) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare speed and output of KaniTTS inference modes")
+    parser.add_argument("--model", default="nineninesix/kani-tts-370m", help="KaniTTS model name")
+    parser.add_argument("--speaker", default="david", help="Speaker name (default: david)")
+    parser.add_argument("--modes", default="fp32,bf16,int8",
+                        help="Comma separated modes, a precision with an optional +compile "
+                             "(default: fp32,bf16,int8)")
+    parser.add_argument("--sample-rate", type=int, default=22050, help="Sample rate of the model (default: 22050)")
+    parser.add_argument("--threads", type=int, default=0, help="PyTorch intra-op threads (default: PyTorch's)")
+    parser.add_argument("--seed", type=int, default=1, help="Base seed of the generations (default: 1)")
+    parser.add_argument("--stub", action="store_true", help="Use the stub model backend of tts-benchmark.py")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.stub:
+        load_module("tts_benchmark", REPO_ROOT / "scripts/tts-benchmark.py").install_stubs("kanitts", 0.0)
+
+    sys.path.insert(0, str(COMMON))
+    server = load_module("kanitts_server", SERVER)
+    torch = server.torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    from kani_tts import KaniTTS
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    if "fp32" not in modes:
+        modes.insert(0, "fp32")
+    for mode in modes:
+        if mode.split("+")[0] not in server.PRECISIONS:
+            parser.error(f"Unknown precision in mode {mode!r}, expected one of {', '.join(server.PRECISIONS)}")
+
+    def generate(model, seed: int, text: str) -> np.ndarray:
+        torch.manual_seed(seed)
+        with torch.inference_mode():
+            return server.generate_one(model, text, args.speaker)
+
+    reference = {}
+    results = []
+    for mode in sorted(modes, key=lambda mode: mode != "fp32"):
+        precision, _, option = mode.partition("+")
+        model = KaniTTS(args.model)
+        if not server.optimize_model(model, precision, option == "compile") and not args.stub:
+            sys.exit(f"Language model of {args.model} not found, cannot run it at {precision}")
+
+        start = time.perf_counter()
+        server.warm_up(model, TEXTS[0])
+        warmup_seconds = time.perf_counter() - start
+
+        cpu_seconds = wall_seconds = audio_seconds = 0.0
+        scores = []
+        for index, text in enumerate(TEXTS):
+            cpu, wall = time.process_time(), time.perf_counter()
+            audio = generate(model, args.seed + index, text)
+            cpu_seconds += time.process_time() - cpu
+            wall_seconds += time.perf_counter() - wall
+            audio_seconds += len(audio) / args.sample_rate
+
+            if mode == "fp32":
+                reference[text] = audio
+                # The same mode under another seed shows how much runs differ anyway
+                scores.append(similarity(audio, generate(model, args.seed + index + 1000, text)))
+            else:
+                scores.append(similarity(reference[text], audio))
+
+        results.append({
+            "mode": mode,
+            "compared_to": "fp32, other seeds" if mode == "fp32" else "fp32",
+            "warmup_seconds": warmup_seconds,
+            "cpu_seconds": cpu_seconds,
+            "wall_seconds": wall_seconds,
+            "audio_seconds": audio_seconds,
+            "rtf": wall_seconds / audio_seconds if audio_seconds else None,
+            "spectral_correlation": float(np.mean([score["spectral_correlation"] for score in scores])),
+            "duration_ratio": float(np.mean([score["duration_ratio"] for score in scores])),
+        })
+        del model
+
+    report = json.dumps({"model": args.model, "speaker": args.speaker, "texts": len(TEXTS),
+                         "threads": torch.get_num_threads(), "stub": args.stub, "results": results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
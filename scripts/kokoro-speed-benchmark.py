@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+CPU cost of Kokoro speed variants: native synthesis vs time-stretching
+
+For every speed, each text is synthesized by running the model at that
+speed (native) and by stretching audio that was rendered once at 1.0
+(stretch, the path taken by the server's --time-stretch mode). Process CPU
+time, which includes the ONNX Runtime threads, and wall time are reported
+per path as JSON.
+
+Run it where the model files are, e.g. in the kokoro-wyoming image:
+    python kokoro-speed-benchmark.py --speeds 0.8,1.2,1.5 --output results.json
+    python kokoro-speed-benchmark.py --stub
+
+With --stub the model is replaced by the stub backend of tts-benchmark.py,
+which spends no CPU on inference; only the stretch figures are meaningful.
+
+Requires: kokoro-onnx, wyoming, numpy
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Shared code of the servers, which has the time-stretching of the server
+COMMON = REPO_ROOT / "common"
+
+TEXTS = [
+    "Turned on the kitchen light.",
+    "Good morning! It is 7 degrees and cloudy outside. Expect light rain after noon.",
+    "Here is your daily briefing. The weather today will be mostly sunny with a high of 24 degrees "
+    "and a light breeze from the west. You have three events on your calendar, starting with a "
+    "dentist appointment at ten.",
+]
+
+
+def load_module(name: str, path: Path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func, repeat: int) -> tuple[float, float]:
+    """Mean process CPU time and wall time of func in seconds."""
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - cpu) / repeat, (time.perf_counter() - wall) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare native and time-stretched Kokoro speed variants")
+    parser.add_argument("--model", default="kokoro-v1.0.onnx", help="ONNX model path")
+    parser.add_argument("--voices", default="voices-v1.0.bin", help="Voices file path")
+    parser.add_argument("--voice", default="af_heart", help="Voice name (default: af_heart)")
+    parser.add_argument("--speeds", default="0.8,0.9,1.1,1.25,1.5",
+                        help="Comma separated speeds to compare (default: 0.8,0.9,1.1,1.25,1.5)")
+    parser.add_argument("--repeat", type=int, default=3, help="Measurements per text and path (default: 3)")
+    parser.add_argument("--stub", action="store_true", help="Use the stub model backend of tts-benchmark.py")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.stub:
+        load_module("tts_benchmark", REPO_ROOT / "scripts/tts-benchmark.py").install_stubs("kokoro", 0.0)
+
+    # Imported only now, so the stubs take the place of kokoro_onnx with --stub
+    sys.path.insert(0, str(COMMON))
+    import kokoro_onnx.config
+    from kokoro_onnx import Kokoro
+    from kokoro_onnx.trim import trim as trim_audio
+    from wyoming_tts.audio import time_stretch
+
+    kokoro = Kokoro(args.model, args.voices)
+    style = kokoro.get_voice_style(args.voice)
+    sample_rate = kokoro_onnx.config.SAMPLE_RATE
+
+    def render(phonemes: str, speed: float) -> list:
+        parts = []
+        for batch in kokoro._split_phonemes(phonemes):
+            audio, _ = kokoro._create_audio(batch, style, speed)
+            parts.append(trim_audio(audio)[0])
+        return parts
+
+    # Warm up the session so lazy initialization isn't measured
+    render(kokoro.tokenizer.phonemize(TEXTS[0], "en-us"), 1.0)
+
+    results = []
+    for speed in (float(value) for value in args.speeds.split(",")):
+        native_cpu = native_wall = stretch_cpu = stretch_wall = audio_seconds = 0.0
+        for text in TEXTS:
+            phonemes = kokoro.tokenizer.phonemize(text, "en-us")
+            cpu, wall = measure(lambda: render(phonemes, speed), args.repeat)
+            native_cpu += cpu
+            native_wall += wall
+
+            # The server renders at 1.0 once, later speed variants only pay for the stretch
+            rendered = render(phonemes, 1.0)
+            cpu, wall = measure(
+                lambda: [time_stretch(audio, speed, sample_rate) for audio in rendered], args.repeat)
+            stretch_cpu += cpu
+            stretch_wall += wall
+            audio_seconds += sum(len(audio) for audio in rendered) / sample_rate / speed
+
+        results.append({
+            "speed": speed,
+            "audio_seconds": audio_seconds,
+            "native": {"cpu_seconds": native_cpu, "wall_seconds": native_wall},
+            "stretch": {"cpu_seconds": stretch_cpu, "wall_seconds": stretch_wall},
+            "cpu_ratio": stretch_cpu / native_cpu if native_cpu else None,
+        })
+
+    report = json.dumps({"voice": args.voice, "texts": len(TEXTS), "repeat": args.repeat,
+                         "stub": args.stub, "results": results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
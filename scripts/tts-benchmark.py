@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Load generator and latency benchmark for the Wyoming TTS servers
+
+Drives a Wyoming TTS server over TCP with concurrent clients and reports
+time-to-first-audio, real-time factor and throughput as JSON. The server
+can be a running instance (--uri) or one of the servers in this repository
+started with a stub model backend (--stub), which needs no model downloads
+and runs on any CPU-only machine.
+
+Usage:
+    python tts-benchmark.py --stub kokoro --concurrency 4 --requests 100
+    python tts-benchmark.py --stub kanitts --mode legacy --mix short=1
+    python tts-benchmark.py --uri tcp://kokoro:10210 --voice af_heart --output results.json
+
+Requires: wyoming, numpy (for --stub)
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SERVERS = {
+    "kokoro": REPO_ROOT / "charts/kokoro-wyoming/docker/main.py",
+    "kanitts": REPO_ROOT / "charts/wyoming-kanitts/docker/wyoming_kanitts.py",
+}
+# Code shared by the servers, copied next to them in the images
+COMMON = REPO_ROOT / "common"
+STUBS = REPO_ROOT / "scripts/benchmark_stubs"
+DEFAULT_VOICES = {"kokoro": "af_heart", "kanitts": "david"}
+
+TEXTS = {
+    "short": [
+        "Turned on the kitchen light.",
+        "Turned off the living room lights.",
+        "The garage door is closed.",
+        "Set a timer for ten minutes.",
+        "It is currently 21 degrees inside.",
+        "Sorry, I couldn't understand that.",
+    ],
+    "medium": [
+        "Good morning! It is 7 degrees and cloudy outside. Expect light rain after noon.",
+        "I turned on the lights in the kitchen and the dining room. The hallway lights were already on.",
+        "Your next meeting starts in fifteen minutes. It is a video call with the design team.",
+        "The washing machine has finished. Don't forget to move the laundry to the dryer.",
+    ],
+    "long": [
+        "Here is your daily briefing. The weather today will be mostly sunny with a high of 24 degrees "
+        "and a light breeze from the west. You have three events on your calendar, starting with a "
+        "dentist appointment at ten. The front door has been locked since last night, and all windows "
+        "are closed. The dishwasher finished its cycle at 6 this morning. Traffic on your usual route "
+        "to work is light, so the drive should take about twenty minutes. Have a great day!",
+        "Sure, here is a short story. Once upon a time, in a small village at the edge of a great "
+        "forest, there lived a clockmaker who never slept. Every night he repaired the clocks of the "
+        "villagers, and every morning they woke to find them ticking perfectly. One winter, a child "
+        "asked him why he worked so hard. He smiled and said that time was the only gift everyone "
+        "receives in equal measure, and he simply wanted to keep it honest.",
+    ],
+}
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Linearly interpolated percentile of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parse a text length distribution such as "short=0.6,medium=0.3,long=0.1"."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in TEXTS:
+            raise argparse.ArgumentTypeError(f"Unknown text length '{name}', expected one of {list(TEXTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run_request(host: str, port: int, text: str, args) -> dict:
+    """Send one synthesis request and measure the response."""
+    from wyoming.audio import AudioChunk, AudioStart, AudioStop
+    from wyoming.client import AsyncTcpClient
+    from wyoming.error import Error
+    from wyoming.tts import (Synthesize, SynthesizeChunk, SynthesizeStart, SynthesizeStop,
+                             SynthesizeStopped, SynthesizeVoice)
+
+    voice = SynthesizeVoice(name=args.voice, speaker=args.speaker)
+    result = {"chars": len(text), "ttfa": None, "audio_bytes": 0, "chunks": 0, "rate": None, "width": 2}
+
+    async with AsyncTcpClient(host, port) as client:
+        start = time.perf_counter()
+
+        async def send():
+            if args.mode == "legacy":
+                await client.write_event(Synthesize(text=text, voice=voice).event())
+                return
+
+            # Stream words like an LLM producing tokens
+            await client.write_event(SynthesizeStart(voice=voice).event())
+            for word in text.split(" "):
+                await client.write_event(SynthesizeChunk(text=word + " ").event())
+                if args.chunk_delay_ms > 0:
+                    await asyncio.sleep(args.chunk_delay_ms / 1000)
+            await client.write_event(Synthesize(text=text, voice=voice).event())
+            await client.write_event(SynthesizeStop().event())
+
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                event = await asyncio.wait_for(client.read_event(), timeout=args.timeout)
+                if event is None:
+                    raise ConnectionError("Server closed the connection")
+
+                if AudioStart.is_type(event.type):
+                    audio_start = AudioStart.from_event(event)
+                    result["rate"], result["width"] = audio_start.rate, audio_start.width
+                elif AudioChunk.is_type(event.type):
+                    chunk = AudioChunk.from_event(event)
+                    if result["ttfa"] is None:
+                        result["ttfa"] = time.perf_counter() - start
+                    result["rate"] = result["rate"] or chunk.rate
+                    result["width"] = chunk.width
+                    result["audio_bytes"] += len(chunk.audio)
+                    result["chunks"] += 1
+                elif Error.is_type(event.type):
+                    raise RuntimeError(Error.from_event(event).text)
+                elif args.mode == "legacy" and AudioStop.is_type(event.type):
+                    break
+                elif SynthesizeStopped.is_type(event.type):
+                    break
+        finally:
+            sender.cancel()
+
+        result["total"] = time.perf_counter() - start
+
+    rate = result["rate"] or 1
+    result["audio_seconds"] = result["audio_bytes"] / result["width"] / rate
+    if result["audio_seconds"] > 0:
+        result["rtf"] = result["total"] / result["audio_seconds"]
+    return result
+
+
+async def supports_streaming(host: str, port: int) -> bool:
+    """Check whether the server advertises streaming synthesis."""
+    from wyoming.client import AsyncTcpClient
+    from wyoming.info import Describe, Info
+
+    async with AsyncTcpClient(host, port) as client:
+        await client.write_event(Describe().event())
+        while True:
+            event = await client.read_event()
+            if event is None:
+                return False
+            if Info.is_type(event.type):
+                info = Info.from_event(event)
+                return any(program.supports_synthesize_streaming for program in info.tts)
+
+
+async def run_benchmark(host: str, port: int, args) -> dict:
+    if args.mode == "streaming" and not await supports_streaming(host, port):
+        raise RuntimeError("Server does not advertise streaming synthesis, use --mode legacy")
+
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+    texts = []
+    for _ in range(args.requests):
+        length = rng.choices(list(weights), weights=list(weights.values()))[0]
+        texts.append(rng.choice(TEXTS[length]))
+
+    # Each request gets a unique suffix unless caching should be exercised
+    if not args.repeat_texts:
+        texts = [f"{text} Request {i}." for i, text in enumerate(texts)]
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for text in texts:
+        queue.put_nowait(text)
+
+    results, errors = [], []
+
+    async def client_loop():
+        while not queue.empty():
+            text = queue.get_nowait()
+            try:
+                results.append(await run_request(host, port, text, args))
+            except Exception as err:
+                errors.append(f"{err.__class__.__name__}: {err}")
+
+    for _ in range(args.warmup):
+        await run_request(host, port, TEXTS["short"][0], args)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    audio_seconds = sum(r["audio_seconds"] for r in results)
+    return {
+        "config": {
+            "server": args.stub or args.uri,
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mix": weights,
+            "voice": args.voice,
+            "server_args": args.server_args,
+        },
+        "completed": len(results),
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(results) / elapsed if elapsed else None,
+        "audio_seconds_per_second": audio_seconds / elapsed if elapsed else None,
+        "time_to_first_audio": summarize([r["ttfa"] for r in results if r["ttfa"] is not None]),
+        "total_time": summarize([r["total"] for r in results]),
+        "real_time_factor": summarize([r["rtf"] for r in results if "rtf" in r]),
+    }
+
+
+# --- Stub model backends -----------------------------------------------------
+
+def install_stubs(server: str, stub_rtf: float) -> None:
+    """Put the stub model packages in benchmark_stubs/ first on the import path.
+
+    Spawned worker processes inherit sys.path and the environment, so they
+    import the stubs as well. The torch stub is only used when PyTorch is
+    not installed.
+    """
+    os.environ["TTS_BENCHMARK_STUB_RTF"] = str(stub_rtf)
+    paths = [STUBS]
+    if server == "kanitts" and importlib.util.find_spec("torch") is None:
+        paths.insert(0, STUBS / "fallback")
+    sys.path[:0] = [str(path) for path in paths]
+
+
+def serve_stub(server: str, uri: str, stub_rtf: float, server_args: list[str]) -> None:
+    """Run a server script in this process with a stub model backend."""
+    import runpy
+
+    install_stubs(server, stub_rtf)
+    script = SERVERS[server]
+    sys.path[:0] = [str(script.parent), str(COMMON)]
+    sys.argv = [str(script), "--uri", uri, *server_args]
+
+    # Model files are loaded relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="tts-benchmark-"))
+    runpy.run_path(str(script), run_name="__main__")
+
+
+def start_stub_server(args) -> tuple[subprocess.Popen, int]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    command = [
+        sys.executable, __file__, "--serve-stub", args.stub,
+        "--uri", f"tcp://127.0.0.1:{port}", "--stub-rtf", str(args.stub_rtf),
+        # Joined so arguments starting with a dash aren't taken for options of this script
+        f"--server-args={args.server_args}",
+    ]
+    output = None if args.verbose else subprocess.DEVNULL
+    process = subprocess.Popen(command, stdout=output, stderr=output)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Stub server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError("Stub server did not start within 30 seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Wyoming TTS servers")
+    parser.add_argument("--uri", help="Benchmark a running server, e.g. tcp://127.0.0.1:10210")
+    parser.add_argument("--stub", choices=sorted(SERVERS),
+                        help="Start a server from this repository with a stub model backend")
+    parser.add_argument("--serve-stub", choices=sorted(SERVERS), help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=["legacy", "streaming"], default="streaming",
+                        help="Send Synthesize or SynthesizeStart/Chunk/Stop (default: streaming)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent clients (default: 1)")
+    parser.add_argument("--requests", type=int, default=20, help="Total requests (default: 20)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests sent first (default: 1)")
+    parser.add_argument("--mix", default="short=0.6,medium=0.3,long=0.1",
+                        help="Text length distribution (default: short=0.6,medium=0.3,long=0.1)")
+    parser.add_argument("--repeat-texts", action="store_true",
+                        help="Reuse identical texts instead of making each request unique")
+    parser.add_argument("--voice", help="Voice name (default depends on --stub)")
+    parser.add_argument("--speaker", help="Voice speaker, e.g. speed_1.2 for Kokoro")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20.0,
+                        help="Delay between streamed text chunks in streaming mode (default: 20)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-event timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for text selection")
+    parser.add_argument("--stub-rtf", type=float, default=0.1,
+                        help="Simulated real-time factor of the stub model (default: 0.1)")
+    parser.add_argument("--server-args", default="",
+                        help="Extra arguments for the stub server, e.g. '--lookahead 2'")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the stub server")
+    args = parser.parse_args()
+
+    if args.serve_stub:
+        serve_stub(args.serve_stub, args.uri, args.stub_rtf, shlex.split(args.server_args))
+        return
+
+    if bool(args.uri) == bool(args.stub):
+        parser.error("exactly one of --uri or --stub is required")
+
+    args.voice = args.voice or DEFAULT_VOICES.get(args.stub)
+
+    process = None
+    if args.stub:
+        process, port = start_stub_server(args)
+        host = "127.0.0.1"
+    else:
+        host, _, port = args.uri.removeprefix("tcp://").rpartition(":")
+        port = int(port)
+
+    try:
+        results = asyncio.run(run_benchmark(host, port, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""Make the server modules of the charts' images and their shared code importable by the tests."""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ("common", "charts/kokoro-wyoming/docker", "charts/wyoming-kanitts/docker"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
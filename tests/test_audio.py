@@ -0,0 +1,156 @@
+"""Audio processing shared by the servers."""
+
+import numpy as np
+import pytest
+
+from wyoming_tts.audio import AudioFramer, Limiter, Resampler, float_to_int16, time_stretch
+
+
+def sine(frequency: float, sample_rate: int, seconds: float = 1.0, amplitude: float = 0.5) -> np.ndarray:
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def resample(resampler: Resampler, chunks) -> np.ndarray:
+    return np.concatenate([resampler.process(chunk) for chunk in chunks] + [resampler.flush()])
+
+
+def test_framer_emits_fixed_size_frames_across_writes():
+    framer = AudioFramer(samples_per_frame=4)
+    audio = np.arange(10, dtype=np.int16)
+
+    frames = list(framer.feed(audio[:3]))
+    assert frames == []
+    frames += framer.feed(audio[3:9])
+    assert [np.frombuffer(frame, dtype=np.int16).tolist() for frame in frames] == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+    frames = list(framer.feed(audio[9:]))
+    assert frames == []
+    assert np.frombuffer(framer.flush(), dtype=np.int16).tolist() == [8, 9]
+
+
+def test_flush_of_an_empty_framer_is_empty_and_resets_it():
+    framer = AudioFramer(samples_per_frame=4)
+    assert framer.flush() == b""
+
+    list(framer.feed(np.ones(2, dtype=np.int16)))
+    framer.flush()
+    frames = list(framer.feed(np.arange(4, dtype=np.int16)))
+    assert [np.frombuffer(frame, dtype=np.int16).tolist() for frame in frames] == [[0, 1, 2, 3]]
+
+
+def test_framer_converts_float_audio_with_saturation():
+    framer = AudioFramer(samples_per_frame=5)
+    (frame,) = framer.feed(np.array([0.0, 0.5, -0.5, 1.5, -2.0], dtype=np.float32))
+    assert np.frombuffer(frame, dtype=np.int16).tolist() == [0, 16383, -16383, 32767, -32768]
+
+
+def test_framer_frames_are_copies():
+    framer = AudioFramer(samples_per_frame=2)
+    first, second = framer.feed(np.array([1, 2, 3, 4], dtype=np.int16))
+    assert np.frombuffer(first, dtype=np.int16).tolist() == [1, 2]
+    assert np.frombuffer(second, dtype=np.int16).tolist() == [3, 4]
+
+
+def test_float_to_int16_passes_int16_through():
+    audio = np.array([1, -2, 3], dtype=np.int16)
+    assert float_to_int16(audio) is audio
+
+
+def test_float_to_int16_saturates_out_of_range_samples():
+    audio = np.array([0.0, 0.5, 1.0, 1.5, -1.0, -3.0], dtype=np.float32)
+    converted = float_to_int16(audio)
+    assert converted.dtype == np.int16
+    assert converted.tolist() == [0, 16383, 32767, 32767, -32767, -32767]
+
+
+@pytest.mark.parametrize("input_rate, output_rate", [(24000, 16000), (24000, 22050), (16000, 24000)])
+def test_output_length_matches_the_rate_ratio(input_rate, output_rate):
+    audio = np.zeros(12345, dtype=np.float32)
+    output = resample(Resampler(input_rate, output_rate), [audio])
+    assert len(output) == -(-len(audio) * output_rate // input_rate)
+
+
+@pytest.mark.parametrize("input_rate, output_rate", [(24000, 16000), (22050, 16000), (16000, 24000)])
+def test_chunked_input_gives_the_same_output(input_rate, output_rate):
+    rng = np.random.default_rng(0)
+    audio = (0.1 * rng.standard_normal(12345)).astype(np.float32)
+    bounds = np.cumsum(rng.integers(1, 700, size=100))
+    chunks = np.split(audio, bounds[bounds < len(audio)])
+
+    one_shot = resample(Resampler(input_rate, output_rate), [audio])
+    chunked = resample(Resampler(input_rate, output_rate), chunks)
+    np.testing.assert_allclose(chunked, one_shot, atol=1e-6)
+
+
+def test_tones_below_the_output_nyquist_frequency_are_kept_in_phase():
+    output = resample(Resampler(24000, 16000), [sine(1000, 24000)])
+    # The filter is centered, so the output lines up with the tone sampled at the output rate
+    np.testing.assert_allclose(output[200:-200], sine(1000, 16000)[200:-200], atol=1e-3)
+
+
+def test_tones_above_the_output_nyquist_frequency_are_removed():
+    output = resample(Resampler(24000, 16000), [sine(10000, 24000)])
+    assert np.sqrt(np.mean(output[200:-200] ** 2)) < 1e-3
+
+
+def test_int16_input_is_scaled_to_float():
+    audio = (sine(1000, 24000) * 32768).astype(np.int16)
+    output = resample(Resampler(24000, 16000), [audio])
+    assert output.dtype == np.float32
+    np.testing.assert_allclose(output[200:-200], sine(1000, 16000)[200:-200], atol=1e-3)
+
+
+def test_equal_rates_pass_audio_through():
+    resampler = Resampler(22050, 22050)
+    audio = sine(440, 22050, seconds=0.1)
+    np.testing.assert_array_equal(resampler.process(audio), audio)
+    assert len(resampler.flush()) == 0
+
+
+@pytest.mark.parametrize("speed", [0.8, 1.25, 1.5])
+def test_time_stretch_changes_the_length_but_not_the_pitch(speed):
+    audio = sine(440, 24000)
+    output = time_stretch(audio, speed, 24000)
+
+    assert len(output) == int(len(audio) / speed)
+    spectrum = np.abs(np.fft.rfft(output * np.hanning(len(output))))
+    assert np.argmax(spectrum) * 24000 / len(output) == pytest.approx(440, abs=2)
+
+
+def test_time_stretch_at_normal_speed_returns_the_input():
+    audio = sine(440, 24000, seconds=0.1)
+    np.testing.assert_array_equal(time_stretch(audio, 1.0, 24000), audio)
+
+
+def test_time_stretch_converts_int16_input():
+    audio = (sine(440, 24000, seconds=0.1) * 32768).astype(np.int16)
+    output = time_stretch(audio, 1.0, 24000)
+    assert output.dtype == np.float32
+    np.testing.assert_allclose(output, sine(440, 24000, seconds=0.1), atol=1e-4)
+
+
+def test_limiter_passes_quiet_audio_unchanged():
+    limiter = Limiter(22050)
+    audio = sine(440, 22050, seconds=0.2)
+    np.testing.assert_array_equal(limiter.process(audio), audio)
+    assert len(limiter.process(np.zeros(0, dtype=np.float32))) == 0
+
+
+def test_limiter_keeps_peaks_below_the_ceiling():
+    limiter = Limiter(22050, ceiling=0.9)
+    audio = np.concatenate((sine(440, 22050, seconds=0.2), sine(440, 22050, seconds=0.2, amplitude=1.5)))
+    output = limiter.process(audio)
+    assert np.abs(output).max() <= 0.9 + 1e-6
+    # Audio before the peak is left alone
+    np.testing.assert_array_equal(output[:2000], audio[:2000])
+
+
+def test_limiter_gain_carries_over_to_the_next_piece():
+    limiter = Limiter(22050, ceiling=0.9)
+    limiter.process(sine(440, 22050, seconds=0.1, amplitude=1.8))
+
+    output = limiter.process(sine(440, 22050, amplitude=0.5))
+    # Still attenuated at the start of the next sentence, recovered by its end
+    assert np.abs(output[:220]).max() < 0.4
+    assert np.abs(output[-2205:]).max() == pytest.approx(0.5, abs=0.01)
@@ -0,0 +1,265 @@
+"""Batched generation of the KaniTTS server against a stub of the kani-tts model classes."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+server = pytest.importorskip("wyoming_kanitts")
+
+START_OF_SPEECH = 1001
+END_OF_SPEECH = 1002
+START_OF_HUMAN = 1003
+END_OF_HUMAN = 1004
+PAD_TOKEN = 1007
+
+
+class StubPlayer:
+    """Token layout and strict decoding of kani_tts.core.NemoAudioPlayer."""
+
+    start_of_speech = START_OF_SPEECH
+    end_of_speech = END_OF_SPEECH
+    pad_token = PAD_TOKEN
+
+    def get_waveform(self, out_ids):
+        out_ids = out_ids.flatten()
+        start = (out_ids == self.start_of_speech).nonzero(as_tuple=True)[0].item()
+        # Raises like the real player if the end of speech appears more than once
+        end = (out_ids == self.end_of_speech).nonzero(as_tuple=True)[0].item()
+        codes = out_ids[start + 1:end]
+        return codes.numpy().astype(np.float32), None
+
+
+class StubKaniModel:
+    """kani_tts.core.KaniModel whose generation replies with scripted audio codes per text."""
+
+    def __init__(self, replies: dict):
+        self.player = StubPlayer()
+        self.replies = replies
+        self.requests = []
+
+    def get_input_ids(self, text, speaker_id=None):
+        words = [len(word) for word in text.split()]
+        input_ids = torch.tensor([[START_OF_HUMAN, *words, END_OF_HUMAN]], dtype=torch.int64)
+        return input_ids, torch.ones_like(input_ids)
+
+    def model_request(self, input_ids, attention_mask):
+        self.requests.append((input_ids.clone(), attention_mask.clone()))
+        rows = []
+        for prompt, mask in zip(input_ids, attention_mask):
+            text_key = tuple(prompt[mask.bool()].tolist())
+            rows.append([START_OF_SPEECH, *self.replies[text_key], END_OF_SPEECH])
+        # Like transformers without a pad token id: finished rows are filled with the eos token
+        longest = max(len(row) for row in rows)
+        generated = torch.tensor([row + [END_OF_SPEECH] * (longest - len(row)) for row in rows])
+        return torch.cat([input_ids, generated], dim=1)
+
+
+class StubKaniTTS:
+    """kani_tts.KaniTTS wrapper, the generation steps live on its KaniModel."""
+
+    def __init__(self, kani_model):
+        self.model = kani_model
+        self.player = kani_model.player
+
+    def __call__(self, text, speaker_id=None):
+        input_ids, attention_mask = self.model.get_input_ids(text, speaker_id)
+        return self.player.get_waveform(self.model.model_request(input_ids, attention_mask))
+
+
+def make_model():
+    replies = {
+        (START_OF_HUMAN, 2, END_OF_HUMAN): [11, 12],
+        (START_OF_HUMAN, 5, 4, 3, END_OF_HUMAN): [21, 22, 23, 24, 25, 26],
+    }
+    return StubKaniTTS(StubKaniModel(replies))
+
+
+def test_supports_batching_looks_at_the_kani_model():
+    model = make_model()
+    assert server.supports_batching(model)
+    assert not server.supports_batching(lambda text, speaker_id=None: None)
+
+
+def test_generate_batch_trims_rows_at_their_end_of_speech():
+    model = make_model()
+    audios = server.generate_batch(model, ["Hi", "Hello dear you"], [None, "david"])
+
+    np.testing.assert_array_equal(audios[0], [11, 12])
+    np.testing.assert_array_equal(audios[1], [21, 22, 23, 24, 25, 26])
+    assert all(audio.dtype == np.float32 for audio in audios)
+
+
+def test_generate_batch_left_pads_with_the_pad_token():
+    model = make_model()
+    server.generate_batch(model, ["Hi", "Hello dear you"], [None, None])
+
+    (input_ids, attention_mask), = model.model.requests
+    assert input_ids[0].tolist() == [PAD_TOKEN, PAD_TOKEN, START_OF_HUMAN, 2, END_OF_HUMAN]
+    assert attention_mask[0].tolist() == [0, 0, 1, 1, 1]
+    assert attention_mask[1].tolist() == [1, 1, 1, 1, 1]
+
+
+class FlakyKaniModel(StubKaniModel):
+    """Fails the first batched generation, like a row that runs out of new tokens."""
+
+    def __init__(self, replies: dict):
+        super().__init__(replies)
+        self.failures = 1
+
+    def model_request(self, input_ids, attention_mask):
+        if input_ids.shape[0] > 1 and self.failures:
+            self.failures -= 1
+            raise ValueError("Special speech tokens not exist!")
+        return super().model_request(input_ids, attention_mask)
+
+
+def test_failed_batch_falls_back_for_that_batch_only():
+    model = StubKaniTTS(FlakyKaniModel(make_model().model.replies))
+    scheduler = server.GenerationScheduler(model, window_ms=50, max_batch=2)
+
+    async def generate_pair():
+        return await asyncio.gather(scheduler.generate("Hi"), scheduler.generate("Hello dear you"))
+
+    async def generate_twice():
+        return [await generate_pair() for _ in range(2)]
+
+    for audios in asyncio.run(generate_twice()):
+        np.testing.assert_array_equal(audios[0], [11, 12])
+        np.testing.assert_array_equal(audios[1], [21, 22, 23, 24, 25, 26])
+
+    assert scheduler.batched
+    batch_sizes = [input_ids.shape[0] for input_ids, _ in model.model.requests]
+    # One-by-one after the failed batch, then batched again
+    assert batch_sizes == [1, 1, 2]
+
+
+def test_failure_outside_the_generation_fails_its_batch_and_the_queue_keeps_running(monkeypatch):
+    scheduler = server.GenerationScheduler(make_model(), max_batch=1)
+    run_batch = scheduler._run_batch
+
+    def broken(loop, batch):
+        monkeypatch.setattr(scheduler, "_run_batch", run_batch)
+        raise RuntimeError("inference mode unavailable")
+
+    monkeypatch.setattr(scheduler, "_run_batch", broken)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="inference mode unavailable"):
+            await asyncio.wait_for(scheduler.generate("Hi"), 5)
+        return await asyncio.wait_for(scheduler.generate("Hi"), 5)
+
+    np.testing.assert_array_equal(asyncio.run(run()), [11, 12])
+    assert scheduler.pending == 0
+
+
+def test_stopped_queue_task_is_restarted():
+    scheduler = server.GenerationScheduler(make_model(), max_batch=1)
+
+    async def run():
+        await asyncio.wait_for(scheduler.generate("Hi"), 5)
+        scheduler._task.cancel()
+        await asyncio.sleep(0)
+        return await asyncio.wait_for(scheduler.generate("Hello dear you"), 5)
+
+    np.testing.assert_array_equal(asyncio.run(run()), [21, 22, 23, 24, 25, 26])
+
+
+class BlockingKaniModel(StubKaniModel):
+    """Runs forward passes of a torch layer until released, like a long generation."""
+
+    def __init__(self, replies: dict):
+        super().__init__(replies)
+        self.layer = torch.nn.Identity()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.stopped = []
+
+    def model_request(self, input_ids, attention_mask):
+        self.started.set()
+        try:
+            while not self.release.wait(0.001):
+                self.layer(input_ids)
+        except server.GenerationCancelled:
+            self.stopped.append(input_ids.shape[0])
+            raise
+        return super().model_request(input_ids, attention_mask)
+
+
+def make_blocking_model():
+    model = StubKaniTTS(BlockingKaniModel(make_model().model.replies))
+    assert server.install_cancel_hooks(model) == 1
+    return model
+
+
+async def wait_started(model) -> None:
+    while not model.model.started.is_set():
+        await asyncio.sleep(0.001)
+    model.model.started.clear()
+
+
+async def wait_stopped(model) -> None:
+    while not model.model.stopped:
+        await asyncio.sleep(0.001)
+
+
+def test_cancelled_request_is_dropped_before_its_generation():
+    model = make_blocking_model()
+    scheduler = server.GenerationScheduler(model, max_batch=1)
+
+    async def run():
+        first = asyncio.create_task(scheduler.generate("Hi"))
+        second = asyncio.create_task(scheduler.generate("Hello dear you"))
+        await asyncio.wait_for(wait_started(model), 5)
+        second.cancel()
+        model.model.release.set()
+        return await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 5)
+
+    audio, cancelled = asyncio.run(run())
+    np.testing.assert_array_equal(audio, [11, 12])
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert [input_ids.shape[-1] for input_ids, _ in model.model.requests] == [3]
+    assert scheduler.pending == 0
+
+
+def test_running_batch_is_stopped_once_all_its_requests_are_cancelled():
+    model = make_blocking_model()
+    scheduler = server.GenerationScheduler(model, window_ms=50, max_batch=2)
+
+    async def run():
+        requests = [asyncio.create_task(scheduler.generate(text)) for text in ("Hi", "Hello dear you")]
+        await asyncio.wait_for(wait_started(model), 5)
+        requests[0].cancel()
+        await asyncio.sleep(0.05)
+        # The other request of the batch still wants its audio
+        assert not model.model.stopped
+        requests[1].cancel()
+        await asyncio.gather(*requests, return_exceptions=True)
+        await asyncio.wait_for(wait_stopped(model), 5)
+
+        # The thread is free again once the generation stopped
+        model.model.release.set()
+        return await asyncio.wait_for(scheduler.generate("Hi"), 5)
+
+    np.testing.assert_array_equal(asyncio.run(run()), [11, 12])
+    assert model.model.stopped == [2]
+    assert [input_ids.shape[0] for input_ids, _ in model.model.requests] == [1]
+
+
+def test_running_generation_of_a_cancelled_request_is_stopped():
+    model = make_blocking_model()
+    scheduler = server.GenerationScheduler(model, max_batch=1)
+
+    async def run():
+        request = asyncio.create_task(scheduler.generate("Hi"))
+        await asyncio.wait_for(wait_started(model), 5)
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        await asyncio.wait_for(wait_stopped(model), 5)
+        model.model.release.set()
+        return await asyncio.wait_for(scheduler.generate("Hello dear you"), 5)
+
+    np.testing.assert_array_equal(asyncio.run(run()), [21, 22, 23, 24, 25, 26])
+    assert model.model.stopped == [1]
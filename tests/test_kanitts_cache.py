@@ -0,0 +1,93 @@
+"""Disk audio cache of the KaniTTS server."""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+server = pytest.importorskip("wyoming_kanitts")
+
+NAMESPACE = "kani-tts-370m/fp32/22050"
+
+
+def audio(samples: int, value: float = 0.25) -> np.ndarray:
+    return np.full(samples, value, dtype=np.float32)
+
+
+def test_key_ignores_whitespace_differences(tmp_path):
+    cache = server.DiskAudioCache(str(tmp_path), 1 << 20, NAMESPACE)
+    assert cache.make_key("david", "Turned on  the\nkitchen light. ") == cache.make_key(
+        "david", "Turned on the kitchen light.")
+    assert cache.make_key(None, "Hello.") == cache.make_key("", "Hello.")
+
+
+def test_key_depends_on_the_speaker_and_the_model(tmp_path):
+    cache = server.DiskAudioCache(str(tmp_path), 1 << 20, NAMESPACE)
+    other_model = server.DiskAudioCache(str(tmp_path), 1 << 20, "kani-tts-370m/int8/22050")
+    keys = {
+        cache.make_key("david", "Hello."),
+        cache.make_key("jenny", "Hello."),
+        cache.make_key("david", "Hello!"),
+        other_model.make_key("david", "Hello."),
+    }
+    assert len(keys) == 4
+
+
+def test_stored_audio_is_read_back_after_a_restart(tmp_path):
+    cache = server.DiskAudioCache(str(tmp_path), 1 << 20, NAMESPACE)
+    key = cache.make_key("david", "Hello.")
+    assert cache.get(key) is None
+    cache.put(key, np.linspace(-1, 1, 100))
+
+    restarted = server.DiskAudioCache(str(tmp_path), 1 << 20, NAMESPACE)
+    cached = restarted.get(key)
+    np.testing.assert_array_equal(cached, np.linspace(-1, 1, 100, dtype=np.float32))
+    assert restarted.size == 400
+    assert (cache.hits, cache.misses, restarted.hits) == (0, 1, 1)
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".tmp")]
+
+
+def test_empty_and_oversized_audio_is_not_stored(tmp_path):
+    cache = server.DiskAudioCache(str(tmp_path), 400, NAMESPACE)
+    cache.put("empty", audio(0))
+    cache.put("large", audio(101))
+    assert cache.get("empty") is None
+    assert cache.get("large") is None
+    assert cache.size == 0
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    cache = server.DiskAudioCache(str(tmp_path), 4000, NAMESPACE)
+    keys = [cache.make_key(None, text) for text in ("One.", "Two.", "Three.")]
+    cache.put(keys[0], audio(400))
+    cache.put(keys[1], audio(400))
+    now = time.time()
+    for age, key in ((100, keys[0]), (50, keys[1])):
+        os.utime(cache._path(key), (now - age, now - age))
+
+    # A hit makes the oldest file the most recently used one
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], audio(400))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.size == 3200
+
+
+def test_stale_temporary_files_are_removed(tmp_path):
+    (tmp_path / "ab").mkdir()
+    stale = tmp_path / "ab" / "ab12.pcm.1.2.tmp"
+    fresh = tmp_path / "ab" / "ab34.pcm.1.3.tmp"
+    stale.write_bytes(bytes(8))
+    fresh.write_bytes(bytes(8))
+    old = time.time() - server.DiskAudioCache.STALE_SECONDS - 60
+    os.utime(stale, (old, old))
+
+    cache = server.DiskAudioCache(str(tmp_path), 1 << 20, NAMESPACE)
+
+    assert not stale.exists()
+    assert fresh.exists()
+    assert cache.size == 0
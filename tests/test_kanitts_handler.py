@@ -0,0 +1,164 @@
+"""Event handling of the KaniTTS server."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from wyoming.info import Info
+from wyoming.tts import Synthesize, SynthesizeChunk, SynthesizeStart, SynthesizeStop
+
+pytest.importorskip("torch")
+server = pytest.importorskip("wyoming_kanitts")
+
+
+class StubModel:
+    """KaniTTS wrapper that generates 0.2 s of audio per text, once released."""
+
+    def __init__(self):
+        self.texts = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, text, speaker_id=None):
+        self.texts.append(text)
+        self.started.set()
+        self.release.wait(5)
+        return np.full(4410, 0.1, dtype=np.float32), text
+
+
+class RecordingHandler(server.KaniTTSEventHandler):
+    """Handler that records the events it writes instead of sending them."""
+
+    def __init__(self, scheduler):
+        super().__init__(Info(), "stub", scheduler=scheduler, reader=None, writer=None)
+        self.written = []
+
+    async def write_event(self, event):
+        await asyncio.sleep(0)
+        self.written.append(event)
+
+    def types(self) -> list:
+        """Types of the written events, with each run of audio chunks shown once."""
+        types = [event.type for event in self.written]
+        return [t for i, t in enumerate(types) if t != "audio-chunk" or types[i - 1] != "audio-chunk"]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = StubModel()
+    monkeypatch.setattr(server, "_shared_model", model)
+    return model
+
+
+async def wait_started(model) -> None:
+    while not model.started.is_set():
+        await asyncio.sleep(0.001)
+    model.started.clear()
+
+
+async def finish(handler) -> None:
+    """Wait for the background synthesis of the handler and for its events to be written."""
+    await asyncio.wait_for(handler._synthesis_task, 5)
+    await handler.send_queue.drain()
+
+
+def test_rejected_request_gets_an_error_and_the_connection_stays_usable(model):
+    scheduler = server.GenerationScheduler(model, max_queue=1)
+
+    async def run():
+        busy = RecordingHandler(scheduler)
+        handler = RecordingHandler(scheduler)
+        model.release.clear()
+        await busy.handle_event(Synthesize(text="Keep the model busy.").event())
+        await asyncio.wait_for(wait_started(model), 5)
+
+        await handler.handle_event(Synthesize(text="Hello there.").event())
+        await finish(handler)
+        (error,) = handler.written
+        assert error.type == "error"
+        assert error.data["code"] == "GenerationRejected"
+
+        # A rejected stream is still confirmed
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello there. ").event())
+        await handler.handle_event(SynthesizeStop().event())
+        await finish(handler)
+        assert handler.types() == ["error", "error", "synthesize-stopped"]
+
+        model.release.set()
+        await finish(busy)
+        handler.written.clear()
+        await handler.handle_event(Synthesize(text="Hello again.").event())
+        await finish(handler)
+        for connection in (busy, handler):
+            await connection.disconnect()
+        return handler.types()
+
+    assert asyncio.run(run()) == ["audio-start", "audio-chunk", "audio-stop"]
+    assert model.texts == ["Keep the model busy.", "Hello again."]
+
+
+def test_stream_is_spoken_sentence_by_sentence_then_confirmed(model):
+    scheduler = server.GenerationScheduler(model)
+
+    async def run():
+        handler = RecordingHandler(scheduler)
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello there. How").event())
+        # The finished sentence is spoken before the stream ends
+        while "audio-chunk" not in handler.types():
+            await asyncio.sleep(0.001)
+        assert model.texts == ["Hello there."]
+
+        await handler.handle_event(SynthesizeChunk(text=" are you?").event())
+        await handler.handle_event(SynthesizeStop().event())
+        await finish(handler)
+        await handler.disconnect()
+        return handler.types()
+
+    assert asyncio.run(run()) == ["audio-start", "audio-chunk", "audio-stop", "synthesize-stopped"]
+    assert model.texts == ["Hello there.", "How are you?"]
+
+
+def test_superseded_stream_is_cancelled_and_not_confirmed(model):
+    scheduler = server.GenerationScheduler(model)
+
+    async def run():
+        handler = RecordingHandler(scheduler)
+        model.release.clear()
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="First sentence. Second").event())
+        await asyncio.wait_for(wait_started(model), 5)
+        stream = handler._streaming_task
+
+        # A new stream replaces the one still being generated
+        await handler.handle_event(SynthesizeStart().event())
+        assert stream.cancelled()
+        model.release.set()
+        await handler.handle_event(SynthesizeChunk(text="Replacement.").event())
+        await handler.handle_event(SynthesizeStop().event())
+        await finish(handler)
+        await handler.disconnect()
+        return handler.types()
+
+    assert asyncio.run(run()) == ["audio-start", "audio-stop",
+                                  "audio-start", "audio-chunk", "audio-stop", "synthesize-stopped"]
+    assert model.texts == ["First sentence.", "Replacement."]
+
+
+def test_stream_without_text_is_only_confirmed(model):
+    scheduler = server.GenerationScheduler(model)
+
+    async def run():
+        handler = RecordingHandler(scheduler)
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="  ").event())
+        await handler.handle_event(SynthesizeStop().event())
+        await finish(handler)
+        await handler.disconnect()
+        return handler.types()
+
+    assert asyncio.run(run()) == ["synthesize-stopped"]
+    assert model.texts == []
@@ -0,0 +1,57 @@
+"""Precision modes of the KaniTTS server on a model shaped like the kani-tts wrapper."""
+
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+server = pytest.importorskip("wyoming_kanitts")
+
+
+def make_model():
+    """KaniTTS wrapper with its language model in bfloat16 and its audio codec in float32, as loaded."""
+    language_model = torch.nn.Sequential(
+        torch.nn.LayerNorm(8), torch.nn.Linear(8, 8), torch.nn.Linear(8, 4)
+    ).to(torch.bfloat16)
+    codec = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    player = types.SimpleNamespace(nemo_codec_model=codec)
+    kani_model = types.SimpleNamespace(model=language_model, player=player)
+    return types.SimpleNamespace(model=kani_model, player=player)
+
+
+def dtypes(module):
+    return {parameter.dtype for parameter in module.parameters()}
+
+
+def test_language_model_is_found_inside_the_kani_model():
+    model = make_model()
+    assert server.language_model(model) is model.model.model
+    assert server.language_model(lambda text: None) is None
+
+
+@pytest.mark.parametrize("precision, dtype", [("fp32", torch.float32), ("bf16", torch.bfloat16)])
+def test_precision_sets_the_language_model_dtype(precision, dtype):
+    model = make_model()
+    assert server.optimize_model(model, precision)
+
+    assert dtypes(model.model.model) == {dtype}
+    assert dtypes(model.player.nemo_codec_model) == {torch.float32}
+
+
+def test_int8_quantizes_only_the_language_model():
+    if "qnnpack" not in torch.backends.quantized.supported_engines \
+            and "fbgemm" not in torch.backends.quantized.supported_engines:
+        pytest.skip("No quantized engine in this torch build")
+    model = make_model()
+    assert server.optimize_model(model, "int8")
+
+    assert not any(type(layer) is torch.nn.Linear for layer in model.model.model)
+    assert dtypes(model.model.model[0]) == {torch.float32}
+    assert type(model.player.nemo_codec_model[0]) is torch.nn.Linear
+    assert dtypes(model.player.nemo_codec_model) == {torch.float32}
+    output = model.model.model(torch.randn(2, 8))
+    assert output.shape == (2, 4) and output.dtype == torch.float32
+
+
+def test_model_without_language_model_is_left_alone():
+    assert not server.optimize_model(types.SimpleNamespace(), "int8", compile_model=True)
@@ -0,0 +1,136 @@
+"""Audio and phoneme caches of the Kokoro server."""
+
+import asyncio
+import threading
+
+import numpy as np
+
+from kokoro_wyoming.caches import AudioCache, PhonemeCache
+
+
+def audio(samples: int) -> np.ndarray:
+    return np.zeros(samples, dtype=np.int16)
+
+
+def test_key_ignores_whitespace_differences():
+    key = AudioCache.make_key("Turned on  the\nkitchen light. ", "af_heart", 1.0, "en-us")
+    assert key == AudioCache.make_key("Turned on the kitchen light.", "af_heart", 1.0, "en-us")
+
+
+def test_key_depends_on_voice_speed_and_language():
+    keys = {
+        AudioCache.make_key("Hello.", "af_heart", 1.0, "en-us"),
+        AudioCache.make_key("Hello.", "am_adam", 1.0, "en-us"),
+        AudioCache.make_key("Hello.", "af_heart", 1.2, "en-us"),
+        AudioCache.make_key("Hello.", "af_heart", 1.0, "en-gb"),
+    }
+    assert len(keys) == 4
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = AudioCache(max_bytes=600)
+    cache.put("a", audio(100))
+    cache.put("b", audio(100))
+    cache.put("c", audio(100))
+    assert cache.get("a") is not None
+
+    cache.put("d", audio(100))
+
+    assert "b" not in cache
+    assert all(key in cache for key in "acd")
+    assert cache.size == 600
+
+
+def test_lookups_are_counted():
+    cache = AudioCache(max_bytes=1000)
+    cache.put("a", audio(10))
+    cache.get("a")
+    cache.get("b")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_larger_than_the_cache_are_not_stored():
+    cache = AudioCache(max_bytes=100)
+    cache.put("a", audio(10))
+    cache.put("b", audio(51))
+    assert "b" not in cache
+    assert "a" in cache
+    assert cache.size == 20
+
+
+def test_replacing_an_entry_updates_the_size():
+    cache = AudioCache(max_bytes=1000)
+    cache.put("a", audio(100))
+    cache.put("a", audio(50))
+    assert len(cache) == 1
+    assert cache.size == 100
+
+
+class StubTokenizer:
+    def __init__(self):
+        self.calls = []
+
+    def phonemize(self, text, lang):
+        self.calls.append(text)
+        return text.upper()
+
+
+def test_known_phrases_are_not_phonemized_again():
+    tokenizer = StubTokenizer()
+    cache = PhonemeCache(tokenizer)
+
+    assert cache.phonemize("Sure, turned on the kitchen light.", "en-us") == "SURE, TURNED ON THE KITCHEN LIGHT."
+    assert cache.phonemize("Sure,  turned off the kitchen light.", "en-us") == "SURE, TURNED OFF THE KITCHEN LIGHT."
+
+    assert tokenizer.calls == ["Sure,", "turned on the kitchen light.", "turned off the kitchen light."]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_phrases_are_not_split_after_abbreviations():
+    tokenizer = StubTokenizer()
+    cache = PhonemeCache(tokenizer)
+    cache.phonemize("Call Dr. Smith now. Then rest.", "en-us")
+    assert tokenizer.calls == ["Call Dr. Smith now. Then rest."]
+
+    cache.phonemize("Turn off the light. Thanks.", "en-us")
+    assert tokenizer.calls[1:] == ["Turn off the light.", "Thanks."]
+
+
+def test_phrases_are_memoized_per_language():
+    tokenizer = StubTokenizer()
+    cache = PhonemeCache(tokenizer)
+    cache.phonemize("Hello.", "en-us")
+    cache.phonemize("Hello.", "en-gb")
+    assert len(tokenizer.calls) == 2
+
+
+def test_least_recently_used_phrases_are_evicted():
+    tokenizer = StubTokenizer()
+    cache = PhonemeCache(tokenizer, max_entries=2)
+    for text in ("one", "two", "one", "three", "one", "two"):
+        cache.phonemize(text, "en-us")
+
+    assert tokenizer.calls == ["one", "two", "three", "two"]
+    assert len(cache) == 2
+
+
+def test_zero_entries_bypasses_the_memo():
+    tokenizer = StubTokenizer()
+    cache = PhonemeCache(tokenizer, max_entries=0)
+    cache.phonemize("Sure, done.", "en-us")
+    cache.phonemize("Sure, done.", "en-us")
+    assert tokenizer.calls == ["Sure, done.", "Sure, done."]
+    assert len(cache) == 0
+
+
+def test_run_phonemizes_on_the_phonemization_thread():
+    threads = []
+
+    class ThreadTokenizer(StubTokenizer):
+        def phonemize(self, text, lang):
+            threads.append(threading.current_thread().name)
+            return super().phonemize(text, lang)
+
+    cache = PhonemeCache(ThreadTokenizer())
+    assert asyncio.run(cache.run("Hello.", "en-us")) == "HELLO."
+    assert threads[0].startswith("phonemize")
@@ -0,0 +1,173 @@
+"""Event handling of the Kokoro server."""
+
+import asyncio
+import types
+
+import numpy as np
+import pytest
+from wyoming.info import Info
+from wyoming.tts import SynthesizeChunk, SynthesizeStart, SynthesizeStop, SynthesizeVoice
+
+pytest.importorskip("kokoro_onnx")
+kokoro_handler = pytest.importorskip("kokoro_wyoming.handler")
+voices = pytest.importorskip("kokoro_wyoming.voices")
+
+
+class StubWorkerPool:
+    """Worker pool that renders every sentence as 0.2 s of silence, blocked ones only once released."""
+
+    def __init__(self, blocked=()):
+        self.sentences = []
+        self.blocked = set(blocked)
+        self.release = asyncio.Event()
+        self.cancelled = []
+
+    async def synthesize(self, sentence, voice, speed, lang):
+        self.sentences.append(sentence)
+        if sentence in self.blocked:
+            try:
+                await self.release.wait()
+            except asyncio.CancelledError:
+                self.cancelled.append(sentence)
+                raise
+        await asyncio.sleep(0)
+        return np.zeros(4800, dtype=np.float32)
+
+
+class RecordingHandler(kokoro_handler.KokoroEventHandler):
+    """Handler that records the events it writes instead of sending them."""
+
+    def __init__(self, worker_pool):
+        kokoro = types.SimpleNamespace(voices={"af_heart": None})
+        cli_args = types.SimpleNamespace(
+            speed=1.0, output_rate=None, chunk_ms=100, lookahead=1, time_stretch=None,
+            first_segment_chars=0, segment_chars=0, max_segment_chars=400,
+            send_high_watermark=1024, send_low_watermark=256,
+        )
+        super().__init__(Info(), kokoro, cli_args, None, None, voices.VoiceTable(kokoro), None,
+                         worker_pool, None, None)
+        self.written = []
+        # Closed to simulate a client that doesn't read
+        self.reading = asyncio.Event()
+        self.reading.set()
+
+    async def write_event(self, event):
+        await self.reading.wait()
+        await asyncio.sleep(0)
+        self.written.append(event.type)
+
+    async def wait_for(self, event_type):
+        while event_type not in self.written:
+            await asyncio.sleep(0.001)
+
+
+def test_streamed_sentences_are_spoken_before_the_stream_stops():
+    async def run():
+        workers = StubWorkerPool()
+        handler = RecordingHandler(workers)
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello there. How").event())
+
+        await asyncio.wait_for(handler.wait_for("audio-chunk"), 5)
+        assert workers.sentences == ["Hello there."]
+        assert "synthesize-stopped" not in handler.written
+
+        await handler.handle_event(SynthesizeChunk(text=" are you?").event())
+        await handler.handle_event(SynthesizeStop().event())
+        await asyncio.wait_for(handler.synthesis_task, 5)
+        await handler.send_queue.drain()
+        await handler.disconnect()
+        return workers.sentences, handler.written
+
+    sentences, written = asyncio.run(run())
+    assert sentences == ["Hello there.", "How are you?"]
+    assert written == ["audio-start"] + ["audio-chunk"] * 4 + ["audio-stop", "synthesize-stopped"]
+
+
+def test_errors_are_sent_after_the_queued_events():
+    async def run():
+        workers = StubWorkerPool()
+        handler = RecordingHandler(workers)
+        handler.reading.clear()
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello there. ").event())
+        while not handler.send_queue.size:
+            await asyncio.sleep(0.001)
+
+        invalid = SynthesizeStart(voice=SynthesizeVoice(name="nobody")).event()
+        failing = asyncio.create_task(handler.handle_event(invalid))
+        await asyncio.sleep(0.01)
+        assert not failing.done()
+        handler.reading.set()
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(failing, 5)
+        await handler.disconnect()
+        return handler.written
+
+    # The audio still queued is dropped, but the stream is ended before the error
+    assert asyncio.run(run()) == ["audio-start", "audio-stop", "error"]
+
+
+def test_new_request_cancels_the_running_one_and_drops_its_queued_audio():
+    async def run():
+        workers = StubWorkerPool(blocked={"Bye now."})
+        handler = RecordingHandler(workers)
+        handler.reading.clear()
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello there. Bye now. ").event())
+        while not handler.send_queue.size or "Bye now." not in workers.sentences:
+            await asyncio.sleep(0.001)
+        synthesis = handler.streaming_task
+
+        await handler.handle_event(SynthesizeStart().event())
+        assert synthesis.cancelled()
+        assert workers.cancelled == ["Bye now."]
+        assert handler.send_queue.size == 0
+
+        handler.reading.set()
+        await handler.send_queue.drain()
+        await handler.disconnect()
+        return handler.written
+
+    # The audio start was already being written, the audio chunks were still queued
+    assert asyncio.run(run()) == ["audio-start", "audio-stop"]
+
+
+def test_audio_stop_is_only_sent_for_open_audio():
+    async def run():
+        handler = RecordingHandler(StubWorkerPool())
+        # Nothing was spoken yet
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello").event())
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.send_queue.drain()
+        assert handler.written == []
+
+        # The audio of a finished request was already stopped
+        await handler.handle_event(SynthesizeChunk(text="Hello there.").event())
+        await handler.handle_event(SynthesizeStop().event())
+        await asyncio.wait_for(handler.synthesis_task, 5)
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.send_queue.drain()
+        await handler.disconnect()
+        return handler.written
+
+    assert asyncio.run(run()) == ["audio-start"] + ["audio-chunk"] * 2 + ["audio-stop", "synthesize-stopped"]
+
+
+def test_disconnect_cancels_synthesis_without_an_audio_stop():
+    async def run():
+        workers = StubWorkerPool(blocked={"Hello there."})
+        handler = RecordingHandler(workers)
+        await handler.handle_event(SynthesizeStart().event())
+        await handler.handle_event(SynthesizeChunk(text="Hello there. ").event())
+        await asyncio.wait_for(handler.wait_for("audio-start"), 5)
+        while not workers.sentences:
+            await asyncio.sleep(0.001)
+        synthesis = handler.streaming_task
+
+        await handler.disconnect()
+        assert synthesis.cancelled()
+        return workers.cancelled, handler.written
+
+    assert asyncio.run(run()) == (["Hello there."], ["audio-start"])
@@ -0,0 +1,141 @@
+"""Pipelined sentence synthesis of the Kokoro server."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from kokoro_wyoming.pipeline import SentencePipeline
+
+
+class StubSynthesis:
+    """Yields one block per sentence once its sentence is released."""
+
+    def __init__(self):
+        self.started = []
+        self.cancelled = []
+        self.release = {}
+
+    async def synthesize(self, sentence, prepared):
+        self.started.append(sentence)
+        gate = self.release.setdefault(sentence, asyncio.Event())
+        try:
+            await gate.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(sentence)
+            raise
+        yield np.array([len(sentence)], dtype=np.float32)
+
+    def open(self, *sentences):
+        for sentence in sentences:
+            self.release.setdefault(sentence, asyncio.Event()).set()
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def collect(pipeline: SentencePipeline) -> list:
+    return [int(audio[0]) async for audio in pipeline]
+
+
+def test_audio_is_played_in_order_with_a_bounded_lookahead():
+    async def run():
+        synthesis = StubSynthesis()
+        pipeline = SentencePipeline(synthesis.synthesize, lookahead=1)
+        for sentence in ("a", "bb", "ccc"):
+            pipeline.add(sentence)
+        pipeline.close()
+
+        playback = asyncio.create_task(collect(pipeline))
+        await settle()
+        assert synthesis.started == ["a", "bb"]
+
+        # The later sentence finishing first doesn't reorder the audio
+        synthesis.open("bb")
+        await settle()
+        assert not playback.done()
+
+        synthesis.open("a", "ccc")
+        return await asyncio.wait_for(playback, 5)
+
+    assert asyncio.run(run()) == [1, 2, 3]
+
+
+def test_prepare_runs_ahead_of_the_lookahead():
+    async def run():
+        prepared = []
+
+        async def prepare(sentence):
+            prepared.append(sentence)
+            return sentence.upper()
+
+        results = []
+
+        async def synthesize(sentence, prepared_result):
+            results.append(prepared_result)
+            yield np.zeros(1, dtype=np.float32)
+
+        pipeline = SentencePipeline(synthesize, lookahead=0, prepare=prepare)
+        for sentence in ("a", "b", "c"):
+            pipeline.add(sentence)
+        await settle()
+        assert prepared == ["a", "b", "c"]
+
+        pipeline.close()
+        await asyncio.wait_for(collect(pipeline), 5)
+        return results
+
+    assert asyncio.run(run()) == ["A", "B", "C"]
+
+
+def test_synthesis_errors_are_raised_in_order():
+    async def run():
+        async def synthesize(sentence, prepared):
+            if sentence == "bad":
+                raise RuntimeError("inference failed")
+            yield np.zeros(1, dtype=np.float32)
+
+        pipeline = SentencePipeline(synthesize, lookahead=2)
+        for sentence in ("ok", "bad", "later"):
+            pipeline.add(sentence)
+        pipeline.close()
+
+        played = 0
+        with pytest.raises(RuntimeError, match="inference failed"):
+            async for _ in pipeline:
+                played += 1
+        return played
+
+    assert asyncio.run(run()) == 1
+
+
+def test_cancel_stops_running_and_drops_pending_sentences():
+    async def run():
+        synthesis = StubSynthesis()
+        prepare_started = asyncio.Event()
+
+        async def prepare(sentence):
+            if sentence == "d":
+                prepare_started.set()
+                await asyncio.Event().wait()
+            return sentence
+
+        pipeline = SentencePipeline(synthesis.synthesize, lookahead=1, prepare=prepare)
+        for sentence in ("a", "bb", "ccc", "d"):
+            pipeline.add(sentence)
+        await asyncio.wait_for(prepare_started.wait(), 5)
+        await settle()
+        assert synthesis.started == ["a", "bb"]
+
+        unfinished = await asyncio.wait_for(pipeline.cancel(), 5)
+        # Iteration ends at once, nothing is synthesized after the cancel
+        played = await asyncio.wait_for(collect(pipeline), 5)
+        return unfinished, played, synthesis
+
+    unfinished, played, synthesis = asyncio.run(run())
+    assert unfinished == 4
+    assert played == []
+    assert synthesis.cancelled == ["a", "bb"]
+    assert synthesis.started == ["a", "bb"]
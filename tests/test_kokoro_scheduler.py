@@ -0,0 +1,103 @@
+"""Inference queue and session pool of the Kokoro server."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("kokoro_onnx")
+inference = pytest.importorskip("kokoro_wyoming.inference")
+
+
+class StubKokoro:
+    def __init__(self):
+        self.order = []
+
+    def _create_audio(self, phonemes, voice_style, speed):
+        self.order.append(phonemes)
+        return np.full(len(phonemes), speed, dtype=np.float32), 24000
+
+
+def test_requests_run_one_at_a_time_in_arrival_order():
+    kokoro = StubKokoro()
+    scheduler = inference.InferenceScheduler(kokoro)
+
+    async def run():
+        return await asyncio.gather(*(scheduler.infer(phonemes, None, 1.0) for phonemes in ("ccc", "a", "bb")))
+
+    audios = asyncio.run(run())
+    assert kokoro.order == ["ccc", "a", "bb"]
+    assert [len(audio) for audio in audios] == [3, 1, 2]
+    assert scheduler.pending == 0
+
+
+def test_failed_request_fails_alone_and_the_queue_keeps_running(monkeypatch):
+    kokoro = StubKokoro()
+    scheduler = inference.InferenceScheduler(kokoro)
+    create_audio = kokoro._create_audio
+
+    def broken(phonemes, voice_style, speed):
+        monkeypatch.setattr(kokoro, "_create_audio", create_audio)
+        raise RuntimeError("inference failed")
+
+    monkeypatch.setattr(kokoro, "_create_audio", broken)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="inference failed"):
+            await asyncio.wait_for(scheduler.infer("a", None, 1.0), 5)
+        return await asyncio.wait_for(scheduler.infer("bb", None, 1.0), 5)
+
+    assert len(asyncio.run(run())) == 2
+
+
+def test_stopped_queue_task_is_restarted():
+    scheduler = inference.InferenceScheduler(StubKokoro())
+
+    async def run():
+        await asyncio.wait_for(scheduler.infer("a", None, 1.0), 5)
+        scheduler._task.cancel()
+        await asyncio.sleep(0)
+        return await asyncio.wait_for(scheduler.infer("bb", None, 1.0), 5)
+
+    assert len(asyncio.run(run())) == 2
+
+
+def test_cancelled_requests_are_not_run():
+    kokoro = StubKokoro()
+    release = threading.Event()
+    create_audio = kokoro._create_audio
+
+    def blocking(phonemes, voice_style, speed):
+        release.wait(5)
+        return create_audio(phonemes, voice_style, speed)
+
+    kokoro._create_audio = blocking
+    scheduler = inference.InferenceScheduler(kokoro)
+
+    async def run():
+        requests = [asyncio.create_task(scheduler.infer(phonemes, None, 1.0)) for phonemes in ("a", "bb", "ccc")]
+        await asyncio.sleep(0.01)
+        requests[1].cancel()
+        await asyncio.sleep(0)
+        release.set()
+        done = await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 5)
+        return [type(result) for result in done]
+
+    assert asyncio.run(run()) == [np.ndarray, asyncio.CancelledError, np.ndarray]
+    assert kokoro.order == ["a", "ccc"]
+
+
+def test_session_pool_dispatches_to_the_least_loaded_session():
+    kokoros = [StubKokoro(), StubKokoro()]
+    pool = inference.SessionPool([inference.InferenceScheduler(kokoro) for kokoro in kokoros])
+
+    async def run():
+        # The first request keeps the first session busy while the second arrives
+        first = asyncio.create_task(pool.infer("aa", None, 1.0))
+        await asyncio.sleep(0)
+        assert [scheduler.pending for scheduler in pool.schedulers] == [1, 0]
+        await asyncio.gather(first, pool.infer("b", None, 1.0))
+
+    asyncio.run(run())
+    assert [kokoro.order for kokoro in kokoros] == [["aa"], ["b"]]
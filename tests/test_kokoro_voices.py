@@ -0,0 +1,101 @@
+"""Voices and voice blends of the Kokoro server."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("kokoro_onnx")
+voices = pytest.importorskip("kokoro_wyoming.voices")
+
+
+class StubKokoro:
+    voices = {"af_heart": None, "bf_emma": None, "am_adam": None}
+    styles = {"af_heart": 1.0, "bf_emma": 2.0, "am_adam": 4.0}
+
+    def __init__(self):
+        self.loaded = []
+
+    def get_voice_style(self, name):
+        self.loaded.append(name)
+        return np.full((510, 1, 256), self.styles[name], dtype=np.float32)
+
+
+def test_blend_specs_are_normalized_heaviest_first():
+    assert voices.VoiceTable.parse("af_heart:1+bf_emma:3") == [("bf_emma", 0.75), ("af_heart", 0.25)]
+    assert voices.VoiceTable.parse(" af_heart + bf_emma ") == [("af_heart", 0.5), ("bf_emma", 0.5)]
+    assert voices.VoiceTable.parse("af_heart:2+af_heart:2+bf_emma:0") == [("af_heart", 1.0)]
+
+
+@pytest.mark.parametrize("spec", ["af_heart:x", "af_heart:-1+bf_emma:2", ":0.5", "af_heart:0+bf_emma:0"])
+def test_invalid_blend_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        voices.VoiceTable.parse(spec)
+
+
+def test_equivalent_specs_resolve_to_one_canonical_name():
+    table = voices.VoiceTable(StubKokoro())
+    canonical = table.resolve("bf_emma:3+af_heart:1")
+    assert canonical == "bf_emma:0.75+af_heart:0.25"
+    assert table.resolve("af_heart:0.25+bf_emma:0.75") == canonical
+    assert table.resolve("af_heart") == "af_heart"
+    assert table.resolve("af_heart:1") == "af_heart"
+
+
+def test_unknown_voices_are_rejected():
+    table = voices.VoiceTable(StubKokoro())
+    with pytest.raises(ValueError, match="xx_nobody"):
+        table.resolve("af_heart:0.5+xx_nobody:0.5")
+    with pytest.raises(ValueError):
+        voices.VoiceTable(StubKokoro(), {"mix": "af_heart+xx_nobody"})
+
+
+def test_named_blend_resolves_to_its_blend():
+    kokoro = StubKokoro()
+    table = voices.VoiceTable(kokoro, {"warm": "af_heart:0.5+bf_emma:0.5"})
+    assert table.resolve("warm") == "af_heart:0.5+bf_emma:0.5"
+    # Named blends are built at startup and not counted as cache lookups
+    assert float(table.style(table.resolve("warm"))[0, 0, 0]) == pytest.approx(1.5)
+    assert (table.hits, table.misses) == (0, 0)
+    with pytest.raises(ValueError, match="shadows"):
+        voices.VoiceTable(kokoro, {"af_heart": "bf_emma"})
+
+
+def test_blended_styles_are_evicted_least_recently_used_first():
+    kokoro = StubKokoro()
+    table = voices.VoiceTable(kokoro, max_entries=2)
+    first, second, third = (table.resolve(spec) for spec in
+                            ("af_heart+bf_emma", "af_heart+am_adam", "bf_emma+am_adam"))
+    table.style(first)
+    table.style(second)
+    table.style(first)
+    table.style(third)
+    assert (table.hits, table.misses) == (1, 3)
+
+    assert table.style(first) is table.style(first)
+    misses = table.misses
+    table.style(second)
+    assert table.misses == misses + 1
+    # Model voices are loaded from the archive once
+    assert sorted(kokoro.loaded) == ["af_heart", "am_adam", "bf_emma"]
+
+
+def test_voice_labels_are_bounded():
+    table = voices.VoiceTable(StubKokoro(), {"heart_emma": "af_heart:0.7+bf_emma:0.3"})
+
+    assert table.label("af_heart") == "af_heart"
+    assert table.label("af_heart:0.7+bf_emma:0.3") == "heart_emma"
+    assert table.label("af_heart:0.5+bf_emma:0.5") == "blend"
+
+
+def test_primary_voice_is_the_heaviest_one():
+    table = voices.VoiceTable(StubKokoro(), {"british": "af_heart:0.3+bf_emma:0.7"})
+    assert table.primary("british") == "bf_emma"
+    assert table.primary(table.resolve("af_heart:0.6+bf_emma:0.4")) == "af_heart"
+    assert table.primary("am_adam") == "am_adam"
+
+
+def test_voice_blend_options_are_parsed():
+    assert voices.parse_voice_blends(["warm = af_heart+bf_emma", "deep=am_adam:2+af_heart"]) == {
+        "warm": "af_heart+bf_emma", "deep": "am_adam:2+af_heart"}
+    for value in ("warm", "=af_heart", "warm="):
+        with pytest.raises(ValueError):
+            voices.parse_voice_blends([value])
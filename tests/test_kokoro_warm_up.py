@@ -0,0 +1,42 @@
+"""Warm-up of the Kokoro server's inference sessions."""
+
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip("kokoro_onnx")
+inference = pytest.importorskip("kokoro_wyoming.inference")
+
+
+class StubKokoro:
+    """Kokoro instance that records inferences and fails on phonemization."""
+
+    voices = {"bf_emma": None, "af_heart": None}
+
+    def __init__(self):
+        self.batches = []
+        self.tokenizer = types.SimpleNamespace(phonemize=self._phonemize)
+
+    def _phonemize(self, text, lang):
+        raise AssertionError("espeak must not run on the warm-up threads")
+
+    def _split_phonemes(self, phonemes):
+        return phonemes.split("|")
+
+    def _create_audio(self, phonemes, voice_style, speed):
+        self.batches.append((phonemes, voice_style, speed))
+        return np.zeros(10, dtype=np.float32), 24000
+
+
+def test_warm_up_runs_inference_on_given_phonemes_only():
+    kokoro = StubKokoro()
+    style = np.ones(4, dtype=np.float32)
+    inference.warm_up(kokoro, "həlˈoʊ|wˈɜːld", style)
+    assert [(batch, speed) for batch, _, speed in kokoro.batches] == [("həlˈoʊ", 1.0), ("wˈɜːld", 1.0)]
+    assert all(voice_style is style for _, voice_style, _ in kokoro.batches)
+
+
+def test_warm_up_voice_prefers_the_default_voice():
+    assert inference.warm_up_voice(StubKokoro()) == "af_heart"
+    assert inference.warm_up_voice(types.SimpleNamespace(voices={"bf_emma": None})) == "bf_emma"
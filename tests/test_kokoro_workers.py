@@ -0,0 +1,58 @@
+"""Worker mode of the Kokoro server: the sessionless front end and the shared memory handover."""
+
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("kokoro_onnx")
+inference = pytest.importorskip("kokoro_wyoming.inference")
+workers = pytest.importorskip("kokoro_wyoming.workers")
+
+
+def test_front_end_loads_voices_and_tokenizer_without_a_session(tmp_path):
+    model_path = tmp_path / "kokoro.onnx"
+    model_path.write_bytes(b"")
+    voices_path = tmp_path / "voices.bin"
+    with open(voices_path, "wb") as file:
+        np.savez(file, af_heart=np.zeros((510, 1, 256), dtype=np.float32))
+
+    kokoro = inference.load_without_session(str(model_path), str(voices_path))
+
+    assert kokoro.sess is None
+    assert "af_heart" in kokoro.voices
+    assert kokoro.get_voice_style("af_heart").shape == (510, 1, 256)
+    assert kokoro.tokenizer.tokenize("hə") != []
+
+
+class StubKokoro:
+    def _split_phonemes(self, phonemes):
+        return phonemes.split("|")
+
+    def _create_audio(self, phonemes, voice_style, speed):
+        return np.full(len(phonemes) * 100, speed, dtype=np.float32), 24000
+
+
+class StubPhonemes:
+    def phonemize(self, text, lang):
+        return text
+
+
+class StubVoices:
+    def style(self, voice):
+        return None
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="POSIX shared memory only")
+def test_worker_audio_is_handed_over_and_unlinked(monkeypatch):
+    monkeypatch.setattr(workers, "_worker_kokoro", StubKokoro())
+    monkeypatch.setattr(workers, "_worker_phonemes", StubPhonemes())
+    monkeypatch.setattr(workers, "_worker_voices", StubVoices())
+    monkeypatch.setattr(workers, "trim_audio", lambda audio: (audio, None))
+
+    name, length = workers._worker_synthesize("ab|c", "af_heart", 1.5, "en-us")
+    assert os.path.exists(os.path.join("/dev/shm", name))
+
+    audio = workers._read_shared_audio(name, length)
+    np.testing.assert_array_equal(audio, np.full(300, 1.5, dtype=np.float32))
+    assert not os.path.exists(os.path.join("/dev/shm", name))
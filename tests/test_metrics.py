@@ -0,0 +1,28 @@
+"""Prometheus metrics shared by the servers."""
+
+from wyoming_tts.metrics import Counter, Gauge
+
+
+def test_labelled_gauge_function_reports_one_sample_per_label():
+    gauge = Gauge("wyoming_tts_session_queue_depth", "Jobs per session", ("session",))
+    depths = [2, 0]
+    gauge.set_function(lambda: {(str(index),): depth for index, depth in enumerate(depths)})
+
+    assert gauge.samples() == [
+        'wyoming_tts_session_queue_depth{session="0"} 2',
+        'wyoming_tts_session_queue_depth{session="1"} 0',
+    ]
+    depths[1] = 3
+    assert gauge.samples()[1] == 'wyoming_tts_session_queue_depth{session="1"} 3'
+
+
+def test_unlabelled_gauge_function_reports_its_value():
+    gauge = Gauge("wyoming_tts_inference_queue_depth", "Jobs")
+    gauge.set_function(lambda: 4)
+    assert gauge.samples() == ["wyoming_tts_inference_queue_depth 4"]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("wyoming_tts_events_sent_total", "Events", ("type",))
+    counter.inc(1, 'a"b\\c\nd')
+    assert counter.samples() == ['wyoming_tts_events_sent_total{type="a\\"b\\\\c\\nd"} 1']
@@ -0,0 +1,128 @@
+"""Send queue shared by the servers."""
+
+import asyncio
+
+import pytest
+from wyoming.event import Event
+
+from wyoming_tts.metrics import Metrics
+from wyoming_tts.streaming import SendQueue
+
+
+def chunk(index: int, size: int = 4) -> Event:
+    return Event(type="audio-chunk", data={"index": index}, payload=bytes(size))
+
+
+class SlowClient:
+    """Writes events only while the gate is open."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.written = []
+
+    async def write(self, event: Event) -> None:
+        await self.gate.wait()
+        self.written.append(event.data["index"])
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def fill(queue: SendQueue) -> None:
+    """Leave event 0 with the writer and queue events 1 to 3, 12 bytes."""
+    await queue.put(chunk(0))
+    await settle()
+    for index in range(1, 4):
+        await queue.put(chunk(index))
+
+
+def test_producer_waits_above_the_high_watermark_until_the_low_watermark():
+    async def run():
+        client = SlowClient()
+        metrics = Metrics()
+        queue = SendQueue(client.write, high_watermark=10, low_watermark=4, metrics=metrics)
+        await fill(queue)
+
+        blocked = asyncio.create_task(queue.put(chunk(4)))
+        await settle()
+        assert not blocked.done()
+        assert metrics.send_stalls.samples() == ["wyoming_tts_send_stalls_total 1"]
+
+        client.gate.set()
+        await asyncio.wait_for(blocked, 5)
+        await asyncio.wait_for(queue.drain(), 5)
+        assert client.written == [0, 1, 2, 3, 4]
+        assert queue.size == 0
+        assert metrics.send_queue_bytes.samples() == ["wyoming_tts_send_queue_bytes 0"]
+
+    asyncio.run(run())
+
+
+def test_oversized_event_is_accepted_into_an_empty_queue():
+    async def run():
+        client = SlowClient()
+        client.gate.set()
+        queue = SendQueue(client.write, high_watermark=10, low_watermark=4, metrics=Metrics())
+        await asyncio.wait_for(queue.put(chunk(0, size=100)), 5)
+        await asyncio.wait_for(queue.drain(), 5)
+        assert client.written == [0]
+
+    asyncio.run(run())
+
+
+def test_discard_drops_selected_events_and_releases_the_producer():
+    async def run():
+        client = SlowClient()
+        queue = SendQueue(client.write, high_watermark=10, low_watermark=4, metrics=Metrics())
+        await fill(queue)
+        blocked = asyncio.create_task(queue.put(chunk(4)))
+        await settle()
+        assert not blocked.done()
+
+        assert queue.discard(lambda event: event.data["index"] >= 2) == 2
+        assert queue.size == 4
+        await asyncio.wait_for(blocked, 5)
+
+        client.gate.set()
+        await asyncio.wait_for(queue.drain(), 5)
+        assert client.written == [0, 1, 4]
+
+    asyncio.run(run())
+
+
+def test_write_error_is_raised_by_the_next_put_and_drain():
+    async def run():
+        async def write(event):
+            raise ConnectionResetError("client went away")
+
+        queue = SendQueue(write, high_watermark=10, low_watermark=4, metrics=Metrics())
+        await queue.put(chunk(0))
+        with pytest.raises(ConnectionResetError):
+            await asyncio.wait_for(queue.drain(), 5)
+        with pytest.raises(ConnectionResetError):
+            await queue.put(chunk(1))
+
+    asyncio.run(run())
+
+
+def test_close_drops_queued_events_and_stops_the_writer():
+    async def run():
+        client = SlowClient()
+        metrics = Metrics()
+        queue = SendQueue(client.write, high_watermark=10, low_watermark=4, metrics=metrics)
+        for index in range(3):
+            await queue.put(chunk(index))
+        await settle()
+
+        await asyncio.wait_for(queue.close(), 5)
+        client.gate.set()
+        await settle()
+
+        assert client.written == []
+        assert queue.size == 0
+        assert metrics.send_queue_bytes.samples() == ["wyoming_tts_send_queue_bytes 0"]
+        await asyncio.wait_for(queue.drain(), 5)
+
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+"""Text splitting and segmentation shared by the servers."""
+
+import pytest
+
+from wyoming_tts.text import SentenceBuffer, TextSegmenter, split_into_sentences
+
+
+def test_text_is_split_after_sentence_punctuation():
+    text = "Hello world!  How are\nyou? I'm doing great. Version 1.5 is out"
+    assert split_into_sentences(text) == ["Hello world!", "How are you?", "I'm doing great.", "Version 1.5 is out"]
+
+
+def test_blank_text_has_no_sentences():
+    assert split_into_sentences(" \n ") == []
+
+
+def test_first_segment_is_cut_at_a_clause_and_the_rest_merged():
+    segmenter = TextSegmenter(first_chars=30, target_chars=80)
+    segments = segmenter.segment(["Sure, here is the forecast for today.", "Ok.", "Sunny."])
+    assert segments == ["Sure,", "here is the forecast for today. Ok. Sunny."]
+
+
+def test_segments_never_exceed_the_maximum():
+    segmenter = TextSegmenter(first_chars=0, target_chars=40, max_chars=50)
+    text = "word " * 60 + "and then, after a pause; some clauses: more words - and an end."
+    segments = segmenter.segment([text.strip()])
+    assert all(len(segment) <= 50 for segment in segments)
+    assert " ".join(segments).split() == text.split()
+
+
+def test_standalone_sentences_are_neither_merged_nor_cut():
+    cached = {"Turned on the kitchen light.", "Sure, here is the forecast for today."}
+    segmenter = TextSegmenter(first_chars=30, target_chars=200)
+    segments = segmenter.segment(
+        ["Sure, here is the forecast for today.", "Ok.", "Turned on the kitchen light.", "Sunny.", "Warm."],
+        standalone=cached.__contains__)
+    assert segments == ["Sure, here is the forecast for today.", "Ok.", "Turned on the kitchen light.",
+                        "Sunny. Warm."]
+
+
+def test_zero_target_keeps_sentences():
+    segmenter = TextSegmenter(first_chars=0, target_chars=0)
+    assert segmenter.segment(["Ok.", "Sunny."]) == ["Ok.", "Sunny."]
+
+
+@pytest.mark.parametrize("first_chars, target_chars, max_chars", [
+    (60, 0, 0), (60, 200, -1), (-1, 200, 400), (60, -1, 400), (60, 500, 400),
+])
+def test_invalid_sizes_are_rejected(first_chars, target_chars, max_chars):
+    with pytest.raises(ValueError):
+        TextSegmenter(first_chars, target_chars, max_chars)
+
+
+def test_short_first_sentence_is_spoken_on_its_own():
+    segmenter = TextSegmenter(first_chars=30, target_chars=80)
+    assert segmenter.segment(["Ok.", "Sunny.", "Warm."]) == ["Ok.", "Sunny. Warm."]
+    assert segmenter.segment(["Dry."]) == ["Dry."]
+
+
+def test_first_sentence_without_a_clause_is_cut_at_a_word():
+    segmenter = TextSegmenter(first_chars=20, target_chars=80)
+    segments = segmenter.segment(["The quick brown fox jumps over the lazy dog.", "Ok."])
+    assert segments == ["The quick brown fox", "jumps over the lazy dog. Ok."]
+
+
+def test_long_text_without_clauses_is_split_at_words_within_the_target():
+    segmenter = TextSegmenter(first_chars=0, target_chars=200, max_chars=400)
+    text = ("word " * 300).strip()
+    segments = segmenter.segment([text])
+    assert all(len(segment) <= 200 for segment in segments)
+    assert " ".join(segments) == text
+
+
+def test_sentence_buffer_holds_partial_text():
+    buffer = SentenceBuffer()
+    assert buffer.feed("Hello world") == []
+    assert buffer.feed("! Version 3.") == ["Hello world!"]
+    assert buffer.feed("5 is") == []
+
+
+def test_sentence_buffer_releases_finished_sentences():
+    buffer = SentenceBuffer()
+    assert buffer.feed("One. Two! Three") == ["One.", "Two!"]
+    assert buffer.feed("? ") == ["Three?"]
+    assert buffer.flush() == []
+
+
+def test_sentence_buffer_flush_returns_the_rest():
+    buffer = SentenceBuffer()
+    buffer.feed("Done. And the")
+    assert buffer.flush() == ["And the"]
+    assert buffer.flush() == []
+
+
+def test_sentence_buffer_gives_up_a_leading_clause():
+    buffer = SentenceBuffer()
+    segmenter = TextSegmenter(first_chars=30)
+    buffer.feed("Sure thing")
+    assert buffer.take_first_clause(segmenter) is None
+    buffer.feed(",  here is\nthe forecast")
+    assert buffer.take_first_clause(segmenter) == "Sure thing,"
+    assert buffer.feed(" for today. ") == ["here is the forecast for today."]
@@ -0,0 +1,138 @@
+"""Request tracing, profiling and event loop monitoring shared by the servers."""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from wyoming_tts import tracing
+from wyoming_tts.metrics import Metrics
+from wyoming_tts.tracing import RequestTrace, SamplingProfiler, monitor_event_loop
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_trace_logs_stage_timings_as_one_json_line(monkeypatch, caplog):
+    clock = Clock()
+    monkeypatch.setattr(tracing.time, "perf_counter", clock)
+    monkeypatch.setattr(RequestTrace, "enabled", True)
+    caplog.set_level(logging.INFO, logger="wyoming_tts.trace")
+
+    trace = RequestTrace("synthesize", voice="af_heart")
+    for seconds in (0.25, 0.5):
+        with trace.span("inference"):
+            clock.now += seconds
+    trace.add("phonemize", 0.01)
+    trace.mark("first_audio")
+    clock.now += 1.0
+    trace.mark("first_audio")
+    trace.finish()
+    trace.finish("cancelled")
+
+    (record,) = caplog.records
+    line = json.loads(record.getMessage())
+    assert line == {
+        "trace_id": trace.id,
+        "request": "synthesize",
+        "status": "ok",
+        "total_ms": 1750.0,
+        "voice": "af_heart",
+        "first_audio_ms": 750.0,
+        "spans": {"inference": {"ms": 750.0, "count": 2}, "phonemize": {"ms": 10.0, "count": 1}},
+    }
+
+
+def test_trace_is_not_logged_when_tracing_is_disabled(caplog):
+    caplog.set_level(logging.INFO, logger="wyoming_tts.trace")
+    trace = RequestTrace("synthesize")
+    with trace.span("inference"):
+        pass
+    trace.finish()
+    assert not caplog.records
+    assert trace.spans["inference"][1] == 1
+
+
+def wait_for_profile(profiler: SamplingProfiler, thread: threading.Thread) -> None:
+    thread.join(5)
+    assert not thread.is_alive()
+    assert profiler._thread is None
+
+
+def test_profiler_writes_the_stacks_of_the_profiled_requests(tmp_path):
+    profiler = SamplingProfiler()
+    profiler.configure(str(tmp_path), requests=2, interval_ms=1)
+    assert profiler.request_started() == 0
+
+    profiler.arm()
+    first = profiler.request_started()
+    second = profiler.request_started()
+    assert first == second == 1
+    thread = profiler._thread
+
+    def busy():
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+
+    worker = threading.Thread(target=busy, name="synthesis")
+    worker.start()
+    worker.join()
+    profiler.request_finished(first)
+    assert thread.is_alive()
+    profiler.request_finished(second)
+    wait_for_profile(profiler, thread)
+
+    (profile,) = tmp_path.glob("profile-*.txt")
+    lines = profile.read_text().splitlines()
+    assert lines
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    assert any(line.startswith("synthesis;") and "busy (test_tracing.py:" in line for line in lines)
+    # Requests that start after profiling stopped are not profiled
+    assert profiler.request_started() == 0
+
+
+def test_trigger_file_arms_the_profiler(tmp_path):
+    profiler = SamplingProfiler()
+    profiler.configure(str(tmp_path), requests=1, interval_ms=1)
+    (tmp_path / "profile-now").touch()
+
+    window = profiler.request_started()
+    assert window == 1
+    assert not (tmp_path / "profile-now").exists()
+    thread = profiler._thread
+    profiler.request_finished(window)
+    wait_for_profile(profiler, thread)
+    assert len(list(tmp_path.glob("profile-*.txt"))) == 1
+
+
+def test_profiler_without_an_output_directory_stays_off():
+    profiler = SamplingProfiler()
+    profiler.arm()
+    assert profiler.request_started() == 0
+    assert profiler._thread is None
+
+
+def test_blocked_event_loop_is_measured_and_logged(caplog):
+    metrics = Metrics()
+
+    async def run():
+        monitor = asyncio.create_task(monitor_event_loop(metrics, interval=0.01, warn_seconds=0.02))
+        await asyncio.sleep(0)
+        time.sleep(0.05)
+        await asyncio.sleep(0.03)
+        monitor.cancel()
+        await asyncio.gather(monitor, return_exceptions=True)
+
+    with caplog.at_level(logging.WARNING, logger="wyoming_tts.tracing"):
+        asyncio.run(run())
+
+    assert "Event loop was blocked" in caplog.text
+    samples = dict(line.rsplit(" ", 1) for line in metrics.event_loop_lag.samples())
+    assert int(samples["wyoming_tts_event_loop_lag_seconds_count"]) >= 1